@@ -1,363 +1,22 @@
 import streamlit as st
-import json
-import base64
-import urllib.parse
 import os
-import requests
+import time
 import uuid
 
-# ... [Previous imports and ALLOWED_PREFIXES remain unchanged] ...
-ALLOWED_PREFIXES = ("vmess://", "vless://", "hysteria2://", "tuic://")
-
-# --- NEW: Mandatory rules to be placed at the top ---
-MANDATORY_RULES = """
-- IP-CIDR,45.192.106.85/32,DIRECT
-- DOMAIN-SUFFIX,padaro.top,DIRECT
-"""
-
-
-def safe_base64_decode(s: str) -> str:
-    # ... [Function remains unchanged] ...
-    if not s:
-        return ""
-    s = s.strip().replace("-", "+").replace("_", "/")
-    missing_padding = len(s) % 4
-    if missing_padding:
-        s += "=" * (4 - missing_padding)
-    try:
-        return base64.urlsafe_b64decode(s).decode("utf-8")
-    except Exception:
-        try:
-            return base64.b64decode(s).decode("utf-8")
-        except Exception:
-            return s
-
-
-# ... [safe_name_decode, normalize_nodes_text, filter_valid_nodes_lines, dedupe_lines_keep_first remain unchanged] ...
-
-def safe_name_decode(name: str) -> str:
-    if not name:
-        return "Unknown_Node"
-    try:
-        decoded = urllib.parse.unquote(name)
-        decoded = urllib.parse.unquote(decoded)
-        return decoded
-    except Exception:
-        return name
-
-
-def normalize_nodes_text(text: str) -> str:
-    if not text:
-        return ""
-    return text.replace("|", "\n")
-
-
-def filter_valid_nodes_lines(text: str):
-    valid_lines = []
-    invalids = []
-    total_nonempty = 0
-    proto_count = {"vmess": 0, "vless": 0, "hysteria2": 0, "tuic": 0}
-
-    for idx, raw in enumerate(text.splitlines(), start=1):
-        line = raw.strip()
-        if not line:
-            continue
-        total_nonempty += 1
-
-        if line.startswith("vmess://"):
-            proto_count["vmess"] += 1
-            valid_lines.append(line)
-        elif line.startswith("vless://"):
-            proto_count["vless"] += 1
-            valid_lines.append(line)
-        elif line.startswith("hysteria2://"):
-            proto_count["hysteria2"] += 1
-            valid_lines.append(line)
-        elif line.startswith("tuic://"):
-            proto_count["tuic"] += 1
-            valid_lines.append(line)
-        else:
-            invalids.append((idx, line))
-
-    stats = {
-        "total_nonempty": total_nonempty,
-        "valid": len(valid_lines),
-        "invalid": len(invalids),
-        "proto_count": proto_count,
-    }
-    return valid_lines, invalids, stats
-
-
-def dedupe_lines_keep_first(lines):
-    seen = set()
-    deduped = []
-    dup_count = 0
-    for line in lines:
-        key = line.strip()
-        if not key:
-            continue
-        if key in seen:
-            dup_count += 1
-            continue
-        seen.add(key)
-        deduped.append(line)
-    return deduped, dup_count
-
-
-# --- NEW: Function to enforce strictly 2 spaces indentation ---
-def normalize_rules_text(text: str) -> str:
-    """
-    Normalizes rule lines:
-    1. Splits into lines.
-    2. Strips ALL existing whitespace (handling 0, 1, 3+ spaces).
-    3. Adds exactly 2 spaces indentation.
-    4. Ensures trailing newline.
-    """
-    if not text:
-        return ""
-
-    normalized_lines = []
-    for line in text.splitlines():
-        stripped = line.strip()
-        if not stripped:
-            continue
-        # Enforce "  " prefix
-        normalized_lines.append(f"  {stripped}")
-
-    if not normalized_lines:
-        return ""
-
-    return "\n".join(normalized_lines) + "\n"
-
-
-# ... [parse_vmess, parse_vless, parse_hysteria2, parse_tuic, generate_yaml remain unchanged] ...
-
-def parse_vmess(url_body: str):
-    try:
-        json_str = safe_base64_decode(url_body)
-        data = json.loads(json_str)
-        raw_name = data.get("ps", "vmess")
-        name = safe_name_decode(raw_name)
-        proxy = {
-            "name": name,
-            "type": "vmess",
-            "server": data.get("add"),
-            "port": int(data.get("port")),
-            "uuid": data.get("id"),
-            "alterId": int(data.get("aid", 0)),
-            "cipher": data.get("scy", "auto"),
-            "network": data.get("net", "ws"),
-            "tls": True if data.get("tls") == "tls" or data.get("tls") is True else False,
-            "udp": True,
-            "skip-cert-verify": True if data.get("verify_cert") is False else False,
-        }
-        if proxy["network"] == "ws":
-            proxy["ws-opts"] = {
-                "path": data.get("path", "/"),
-                "headers": {"Host": data.get("host", data.get("add"))},
-            }
-        return proxy
-    except Exception:
-        return None
-
-
-def parse_vless(parsed_url):
-    params = urllib.parse.parse_qs(parsed_url.query)
-    network = params.get("type", ["tcp"])[0]
-    raw_name = parsed_url.fragment
-    name = safe_name_decode(raw_name) if raw_name else "vless_node"
-    proxy = {
-        "name": name,
-        "type": "vless",
-        "server": parsed_url.hostname,
-        "port": parsed_url.port,
-        "uuid": parsed_url.username,
-        "udp": True,
-        "tls": True,
-        "network": network,
-        "servername": params.get("sni", [""])[0],
-        "skip-cert-verify": True if params.get("allowInsecure", ["0"])[0] == "1" else False,
-    }
-    if network == "ws":
-        host = params.get("host", [""])[0]
-        if not host:
-            host = proxy["servername"] or proxy["server"]
-        proxy["ws-opts"] = {
-            "path": params.get("path", ["/"])[0],
-            "headers": {"Host": host},
-        }
-    if network == "tcp":
-        flow = params.get("flow", [""])[0]
-        if flow:
-            proxy["flow"] = flow
-    if "fp" in params:
-        proxy["client-fingerprint"] = params["fp"][0]
-    else:
-        proxy["client-fingerprint"] = "chrome"
-    if params.get("security", [""])[0] == "reality":
-        proxy["reality-opts"] = {"public-key": params.get("pbk", [""])[0]}
-        sid = params.get("sid", params.get("shortId", params.get("short-id", [])))
-        if sid:
-            proxy["reality-opts"]["short-id"] = sid[0]
-        if not proxy["servername"]:
-            proxy["servername"] = params.get("sni", [""])[0]
-    return proxy
-
-
-def parse_hysteria2(parsed_url):
-    params = urllib.parse.parse_qs(parsed_url.query)
-    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "hysteria2_node"
-    return {
-        "name": name,
-        "type": "hysteria2",
-        "server": parsed_url.hostname,
-        "port": parsed_url.port,
-        "password": parsed_url.username,
-        "sni": params.get("sni", [""])[0],
-        "skip-cert-verify": True if params.get("insecure", ["0"])[0] == "1" else False,
-        "udp": True,
-    }
-
-
-def parse_tuic(parsed_url):
-    params = urllib.parse.parse_qs(parsed_url.query)
-    raw_user_info = parsed_url.username if parsed_url.username else ""
-    decoded_info = urllib.parse.unquote(raw_user_info)
-    if ":" in decoded_info:
-        user_parts = decoded_info.split(":", 1)
-        uuid_val = user_parts[0]
-        password_val = user_parts[1]
-    else:
-        uuid_val = decoded_info
-        password_val = urllib.parse.unquote(parsed_url.password) if parsed_url.password else ""
-    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "tuic_node"
-    sni_val = params.get("sni", [""])[0]
-
-    proxy = {
-        "name": name,
-        "type": "tuic",
-        "server": parsed_url.hostname,
-        "port": parsed_url.port,
-        "uuid": uuid_val,
-        "password": password_val,
-        "sni": sni_val,
-        "udp-relay-mode": "native",
-        "congestion-controller": params.get("congestion_control", ["bbr"])[0],
-        "skip-cert-verify": True if params.get("insecure", ["0"])[0] == "1" else False,
-        "udp": True,
-    }
-    if sni_val:
-        proxy["disable-sni"] = False
-    else:
-        proxy["disable-sni"] = True
-    if "alpn" in params:
-        proxy["alpn"] = [params["alpn"][0]]
-    return proxy
-
-
-def generate_yaml(proxies, rules_content, source_url=""):
-    proxy_names = []
-    for p in proxies:
-        safe_n = p["name"].replace('"', "").replace("'", "").strip()
-        p["name"] = safe_n
-        proxy_names.append(safe_n)
-
-    header_info = f"# Source Subscription: {source_url}\n" if source_url else ""
-    yaml_content = f"""{header_info}mixed-port: 7890
-allow-lan: true
-mode: Rule
-log-level: info
-external-controller: :9090
-proxies:
-"""
-    for p in proxies:
-        yaml_content += f'  - name: "{p["name"]}"\n'
-        yaml_content += f"    type: {p['type']}\n"
-        yaml_content += f"    server: {p['server']}\n"
-        yaml_content += f"    port: {p['port']}\n"
-        for key in [
-            "uuid",
-            "password",
-            "udp",
-            "tls",
-            "flow",
-            "servername",
-            "sni",
-            "client-fingerprint",
-            "network",
-            "alterId",
-            "cipher",
-            "skip-cert-verify",
-            "udp-relay-mode",
-            "congestion-controller",
-            "disable-sni",
-        ]:
-            if key in p:
-                val = str(p[key]).lower() if isinstance(p[key], bool) else p[key]
-                yaml_content += f"    {key}: {val}\n"
-
-        if "ws-opts" in p:
-            yaml_content += (
-                "    ws-opts:\n"
-                f'      path: "{p["ws-opts"]["path"]}"\n'
-                "      headers:\n"
-                f'        Host: {p["ws-opts"]["headers"]["Host"]}\n'
-            )
-        if "reality-opts" in p:
-            yaml_content += "    reality-opts:\n"
-            yaml_content += f'      public-key: {p["reality-opts"]["public-key"]}\n'
-            if "short-id" in p["reality-opts"]:
-                yaml_content += f'      short-id: {p["reality-opts"]["short-id"]}\n'
-        if "alpn" in p:
-            yaml_content += "    alpn:\n"
-            for a in p["alpn"]:
-                yaml_content += f"      - {a}\n"
-
-    yaml_content += "proxy-groups:\n"
-
-    groups = [
-        {"name": "🚀 节点选择", "type": "select", "special": ["♻️ 自动选择", "DIRECT"]},
-        {
-            "name": "♻️ 自动选择",
-            "type": "url-test",
-            "url": "http://www.gstatic.com/generate_204",
-            "interval": 300,
-            "tolerance": 50,
-            "special": [],
-        },
-        {"name": "🌍 国外媒体", "type": "select", "special": ["🚀 节点选择", "♻️ 自动选择", "🎯 全球直连"]},
-        {"name": "📲 电报信息", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
-        {"name": "Ⓜ️ 微软服务", "type": "select", "special": ["🎯 全球直连", "🚀 节点选择"]},
-        {"name": "🍎 苹果服务", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
-        {"name": "📢 谷歌FCM", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
-        {"name": "🎯 全球直连", "type": "select", "base": ["DIRECT", "🚀 节点选择", "♻️ 自动选择"], "no_proxies": True},
-        {"name": "🛑 全球拦截", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
-        {"name": "🍃 应用净化", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
-        {"name": "🐟 漏网之鱼", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
-    ]
-
-    for g in groups:
-        yaml_content += f'  - name: "{g["name"]}"\n'
-        yaml_content += f"    type: {g['type']}\n"
-        if "url" in g:
-            yaml_content += f"    url: {g['url']}\n"
-            yaml_content += f"    interval: {g['interval']}\n"
-            yaml_content += f"    tolerance: {g['tolerance']}\n"
-
-        yaml_content += "    proxies:\n"
-        if "base" in g:
-            for b in g["base"]:
-                yaml_content += f'      - "{b}"\n'
-        if "special" in g:
-            for s in g["special"]:
-                yaml_content += f'      - "{s}"\n'
-        if not g.get("no_proxies", False):
-            for name in proxy_names:
-                yaml_content += f'      - "{name}"\n'
-
-    yaml_content += "rules:\n" + rules_content
-    return yaml_content
-
+from clashsub.cache import SubscriptionCache
+from clashsub.core import DEFAULT_RULES_FILE, decode_subscription_text
+from clashsub.fetch import FETCH_DEADLINE, FETCH_TIMEOUT
+from clashsub.ingest import max_source_bytes, read_source_text
+from clashsub.jobs import EMITTING, FAILED, FETCHING, PARSING, PROBING, QUEUED, RUNNING, JobQueue, JobRejected
+from clashsub.memo import ParseMemo
+from clashsub.metrics import CONVERSIONS, REGISTRY, serve_metrics, trace
+from clashsub.probe import ProbeCache
+from clashsub.profiles import ProfileScheduler, ProfileStore, make_profile
+from clashsub.publish import saved_ratio
+from clashsub.ruleanalysis import PARTIAL, REDUNDANT, UNREACHABLE, analyze_manual_rules
+from clashsub.rulecompiler import summarize_dropped
+from clashsub.rulematch import match_hosts
+from clashsub.rules import assemble_rules, compile_rules_text, load_default_rules
 
 # ================= 网页界面逻辑 =================
 
@@ -382,12 +41,14 @@ st.markdown("---")
 
 col1, col2 = st.columns(2)
 with col1:
-    nodes_files = st.file_uploader("1. 上传节点文件 (txt，可多选)", type=["txt"], accept_multiple_files=True)
+    nodes_files = st.file_uploader(
+        "1. 上传节点文件 (txt / Clash yaml / SIP008 json，可多选)", type=["txt", "yaml", "yml", "json"], accept_multiple_files=True
+    )
 with col2:
     rules_file = st.file_uploader("2. 上传默认规则文件 (可选，txt)", type=["txt"])
 
 manual_nodes_text = st.text_area(
-    "🧾 手动粘贴节点内容（优先级最高；每行一个链接，仅支持 vmess/vless/hysteria2/tuic）",
+    "🧾 手动粘贴节点内容（优先级最高；每行一个 vmess/vless/hysteria2/tuic 链接，也可以粘贴 Clash 配置或 SIP008 JSON）",
     placeholder="hysteria2://...\ntuic://...\nvmess://...\nvless://...",
     height=180,
 )
@@ -399,6 +60,41 @@ subscription_urls_text = st.text_area(
 )
 subscription_urls = [u.strip() for u in subscription_urls_text.splitlines() if u.strip()]
 
+DEDUPE_OPTIONS = {
+    "保留优先级高的（先出现的）": "first",
+    "保留后出现的": "last",
+    "不合并（只去掉完全相同的行）": "off",
+}
+dedupe_label = st.radio(
+    "♻️ 同一节点（协议、服务器、端口、密码/UUID、传输路径、SNI 都相同）出现多次时",
+    options=list(DEDUPE_OPTIONS),
+    index=0,
+    horizontal=True,
+)
+
+GROUP_OPTIONS = {
+    "每个分组列出全部节点": "inline",
+    "按地区分组（各地区自动测速，节点多时配置更小、测速更少）": "region",
+}
+group_label = st.radio(
+    "🗺️ 策略组",
+    options=list(GROUP_OPTIONS),
+    index=0,
+    horizontal=True,
+)
+
+PROBE_OPTIONS = {
+    "不测试": None,
+    "TCP 连接": "tcp",
+    "TLS 握手（更准，稍慢）": "tls",
+}
+probe_label = st.radio(
+    "📶 生成前测试连通性：去掉连不上的节点，其余按延迟排序（hysteria2 / tuic 走 UDP，不测，保留在最后）",
+    options=list(PROBE_OPTIONS),
+    index=0,
+    horizontal=True,
+)
+
 st.markdown("---")
 st.subheader("📜 规则设置")
 
@@ -419,78 +115,246 @@ manual_rules_text = st.text_area(
     height=180,
 )
 
+optimize_rules = st.checkbox("🧹 精简默认规则（去掉重复 / 被同目标规则覆盖的规则，合并 IP 段）", value=False)
+use_rule_providers = st.checkbox(
+    "📦 大规则块改用 rule-providers（规则集单独下载，客户端可缓存；需要 Clash Meta）",
+    value=False,
+)
+
+use_default_rules = rules_mode != "仅使用手动规则（覆盖默认）"
+if rules_file:
+    default_block = compile_rules_text(rules_file.getvalue().decode("utf-8", errors="ignore"), optimize_rules)
+else:
+    default_block = load_default_rules(DEFAULT_RULES_FILE, optimize_rules)
+
+# 手动规则排在默认规则之后：检查哪些手动规则会被前面的规则抢先命中
+if manual_rules_text.strip():
+    findings = analyze_manual_rules(assemble_rules(default_block, "", use_default_rules).text, manual_rules_text)
+    if findings:
+        with st.expander(f"🔍 手动规则冲突检查：{len(findings)} 条需要注意", expanded=True):
+            for f in findings:
+                if f["status"] == UNREACHABLE:
+                    st.warning(f"`{f['rule']}` 永远不会生效：先被 `{f['by'][0]}` 命中（→ {f['target']}）")
+                elif f["status"] == REDUNDANT:
+                    st.info(f"`{f['rule']}` 是多余的：`{f['by'][0]}` 已经把它发往同一目标")
+                else:
+                    shown = "、".join(f"`{b}`" for b in f["by"])
+                    st.caption(f"`{f['rule']}` 的部分流量会先被 {shown} 接走")
+            if any(f["by"][0].lstrip("- ").startswith("MATCH") for f in findings if f["status"] != PARTIAL):
+                st.caption("提示：默认规则以 MATCH 结尾，追加在它后面的手动规则不会生效；需要覆盖时请选“仅使用手动规则”。")
+
+with st.expander("🧪 规则测试：某个域名 / IP 会命中哪条规则"):
+    test_hosts_text = st.text_area(
+        "每行一个域名或 IP（按当前的默认规则 + 手动规则匹配，不做 DNS 解析）",
+        placeholder="www.google.com\nb23.tv\n1.1.1.1",
+        height=100,
+    )
+    if test_hosts_text.strip():
+        merged_rules = assemble_rules(default_block, manual_rules_text, use_default_rules).text
+        lines = []
+        for res in match_hosts(merged_rules, test_hosts_text.splitlines()):
+            line = f"{res.host}  →  {res.target or '（无）'}    {res.rule.text if res.rule else ''}"
+            if res.uncertain is not None:
+                line += f"    ⚠️ 之前的 {res.uncertain.text} 无法判断"
+            lines.append(line)
+        st.code("\n".join(lines), language="text")
+
 server_host = os.getenv("CLASHSUB_SERVER_HOST", "https://change.padaro.top")
-static_dir = os.getenv("CLASHSUB_STATIC_DIR", "/opt/clashsub-change/static")
 static_url_prefix = os.getenv("CLASHSUB_STATIC_URL_PREFIX", "/static").rstrip("/")
+fetch_timeout = float(os.getenv("CLASHSUB_FETCH_TIMEOUT", FETCH_TIMEOUT))
+fetch_deadline = float(os.getenv("CLASHSUB_FETCH_DEADLINE", FETCH_DEADLINE))
 
-if st.button("开始转换", type="primary", use_container_width=True):
-    sources = []
-    contents = []
 
-    # ... [Node processing logic: manual -> file -> url remains unchanged] ...
-    if manual_nodes_text and manual_nodes_text.strip():
-        text = normalize_nodes_text(manual_nodes_text)
-        sources.append("manual_input")
-        contents.append(text)
+@st.cache_resource
+def get_subscription_cache():
+    # 进程级单例，所有会话共享
+    return SubscriptionCache.from_env()
 
-    if nodes_files:
-        for f in nodes_files:
-            try:
-                text = f.getvalue().decode("utf-8", errors="ignore")
-                text = normalize_nodes_text(text)
-                if text.strip():
-                    sources.append(f.name)
-                    contents.append(text)
-            except Exception as e:
-                st.error(f"❌ 读取文件失败：{f.name}\n原因：{e}")
 
-    for url in subscription_urls:
-        try:
-            with st.spinner(f"🚀 正在请求订阅：{url}"):
-                headers = {
-                    "User-Agent": (
-                        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                        "AppleWebKit/537.36 (KHTML, like Gecko) "
-                        "Chrome/120.0.0.0 Safari/537.36"
-                    )
-                }
-                resp = requests.get(url, headers=headers, timeout=15)
-                resp.raise_for_status()
-                raw_content = resp.text.strip()
-
-                decoded = safe_base64_decode(raw_content)
-                decoded_n = normalize_nodes_text(decoded)
-                raw_n = normalize_nodes_text(raw_content)
-
-                if any(p in decoded_n for p in ALLOWED_PREFIXES):
-                    text = decoded_n
-                else:
-                    text = raw_n
+@st.cache_resource
+def get_parse_memo():
+    # 节点行 -> 解析结果 / 已生成的 YAML 片段，重复转换时只处理变化的行
+    return ParseMemo.from_env()
 
-                if text.strip():
-                    sources.append(url)
-                    contents.append(text)
-        except Exception as e:
-            st.error(f"❌ 获取订阅失败：{url}\n原因：{e}")
 
-    if not contents:
-        st.warning("⚠️ 请至少粘贴节点内容、上传节点文件，或输入订阅链接！")
-        st.stop()
+@st.cache_resource
+def get_probe_cache():
+    # 每个 server:port 的测试结果缓存一段时间（CLASHSUB_PROBE_TTL），重复转换不用重测
+    return ProbeCache.from_env()
+
+
+st.markdown("---")
+st.subheader("🔁 自动刷新")
+REFRESH_OPTIONS = {"不自动刷新": 0, "每小时": 3600, "每 6 小时": 6 * 3600, "每天": 24 * 3600}
+refresh_label = st.selectbox(
+    "自动刷新（定时重新拉取订阅并生成，链接不变）",
+    options=list(REFRESH_OPTIONS),
+    index=0,  # 定时刷新需要主动开启，否则每次转换都会留下一个后台任务
+)
+profile_id_text = st.text_input(
+    "订阅 ID（可选）",
+    placeholder="留空则按输入内容生成；填之前的 ID 会覆盖那个订阅，客户端里的链接不用改",
+).strip()
+edit_token_text = st.text_input(
+    "编辑密钥",
+    type="password",
+    help="覆盖已有的订阅需要它创建时显示的编辑密钥（本页面创建的订阅会自动记住）",
+).strip()
+
+
+@st.cache_resource
+def get_profile_store():
+    return ProfileStore.from_env()
+
+
+@st.cache_resource
+def get_profile_scheduler():
+    # 每个进程一个后台线程：定时重新生成到期的订阅，并清理过期文件
+    return ProfileScheduler(
+        get_profile_store(),
+        cache=get_subscription_cache(),
+        memo=get_parse_memo(),
+        timeout=fetch_timeout,
+        deadline=fetch_deadline,
+        probe_cache=get_probe_cache(),
+    ).start()
+
+
+try:
+    get_profile_scheduler()
+except OSError as e:
+    st.warning(f"⚠️ 订阅目录不可写，自动刷新已停用：{e}")
+
+
+@st.cache_resource
+def get_job_queue():
+    # 转换在后台线程池里跑，页面脚本只提交任务、轮询进度，不会被大订阅卡住
+    queue = JobQueue.from_env()
+    REGISTRY.collect(queue.gauges)
+    return queue
+
+
+@st.cache_resource
+def start_metrics_server():
+    # Streamlit 没法加路由，设置了 CLASHSUB_METRICS_PORT 时单独开一个端口提供 /metrics
+    port = os.getenv("CLASHSUB_METRICS_PORT")
+    if not port:
+        return None
+    return serve_metrics(os.getenv("CLASHSUB_METRICS_HOST", "127.0.0.1"), int(port))
+
 
-    nodes_content_raw = "\n".join(contents).strip()
-    current_source = " | ".join(sources)
+def client_key():
+    # 按来源 IP 限制并发（多开标签页也算同一个人）。X-Forwarded-For 靠左的部分由客户端随便填，
+    # 只认最后 CLASHSUB_TRUSTED_PROXIES 层反向代理追加的那一项；没有代理或拿不到时按浏览器会话
+    ctx = getattr(st, "context", None)
+    hops = int(os.getenv("CLASHSUB_TRUSTED_PROXIES", "1"))
+    ip = ""
+    if ctx is not None and hops > 0:
+        forwarded = [v.strip() for v in (ctx.headers.get("X-Forwarded-For") or "").split(",")]
+        if len(forwarded) >= hops:
+            ip = forwarded[-hops]
+    return ip or st.session_state.setdefault("client_id", uuid.uuid4().hex)
 
-    valid_lines, invalids, stats = filter_valid_nodes_lines(nodes_content_raw)
-    deduped_lines, dup_count = dedupe_lines_keep_first(valid_lines)
 
+def run_conversion(job, profile, store, cache, memo, probe_cache, token=None):
+    """Job body: fetch -> parse -> probe -> emit, then write the profile's stable file."""
+    with trace() as timings:
+        try:
+            conv = store.render(
+                profile,
+                cache=cache,
+                memo=memo,
+                timeout=fetch_timeout,
+                deadline=fetch_deadline,
+                progress=job.set_stage,
+                probe_cache=probe_cache,
+            )
+            if conv.yaml is not None:
+                profile = store.write_output(store.save(profile, token), conv.yaml)
+                if profile is None:
+                    raise RuntimeError("订阅在生成期间被清理，请重新转换")
+        except Exception:
+            CONVERSIONS.inc(entry="web", result="error")
+            raise
+    CONVERSIONS.inc(entry="web", result="ok" if conv.yaml is not None else "empty")
+    return profile, conv, timings
+
+
+# 与 clashsub 里实际打点的 span 一一对应；订阅正文边下载边解码，解码算在“拉取”里
+STAGE_NAMES = {
+    "fetch": "拉取 / 解码订阅",
+    "scan": "筛选 / 逐行去重",
+    "parse": "解析节点",
+    "dedupe": "合并同一节点",
+    "probe": "连通性测试",
+    "rules": "处理规则",
+    "emit": "生成 YAML",
+    "write": "写入文件",
+}
+
+
+def show_timings(timings):
+    with st.expander(f"⏱️ 耗时明细（共 {timings.elapsed * 1000:.0f} ms）"):
+        rows = []
+        for stage, (seconds, n) in timings.totals().items():
+            name = STAGE_NAMES.get(stage, stage)
+            rows.append(f"{name:<12}{seconds * 1000:>9.1f} ms" + (f"  （{n} 次）" if n > 1 else ""))
+        # 订阅是并发拉取的，分别列出每个链接
+        for stage, seconds, detail in timings.spans:
+            if stage == "fetch":
+                rows.append(f"  {seconds * 1000:>9.1f} ms  {detail}")
+        st.code("\n".join(rows), language="text")
+
+
+STAGE_LABELS = {
+    QUEUED: (0.05, "排队中"),
+    RUNNING: (0.1, "准备中"),
+    FETCHING: (0.2, "正在拉取订阅"),
+    PARSING: (0.4, "正在解析节点"),
+    PROBING: (0.6, "正在测试节点连通性"),
+    EMITTING: (0.8, "正在生成配置"),
+}
+
+
+def show_result(profile, conv):
+    for url, err, status in conv.fetched:
+        if err is not None:
+            st.error(f"❌ 获取订阅失败：{url}\n原因：{err}")
+        elif status == "stale":
+            st.warning(f"⚠️ 订阅暂时无法访问，已使用缓存内容：{url}")
+
+    if not conv.source_count:
+        st.warning("⚠️ 请至少粘贴节点内容、上传节点文件，或输入订阅链接！")
+        return
+
+    stats = conv.stats
+    dup_count = stats["dup"]
     st.info(
-        f"📊 节点统计：非空行 {stats['total_nonempty']}，有效 {stats['valid']}，跳过 {stats['invalid']}，去重丢弃 {dup_count}。\n"
-        f"协议分布：vmess {stats['proto_count']['vmess']} / "
-        f"vless {stats['proto_count']['vless']} / "
-        f"hysteria2 {stats['proto_count']['hysteria2']} / "
-        f"tuic {stats['proto_count']['tuic']}"
+        f"📊 节点统计：非空行 {stats['total_nonempty']}，有效 {stats['valid']}，跳过 {stats['invalid']}，去重丢弃 {dup_count}，"
+        f"同一节点合并 {stats['merged']}，解析失败 {stats['failed']}。\n"
+        "协议分布：" + " / ".join(f"{proto} {count}" for proto, count in stats["proto_count"].items())
     )
+    if conv.fetched:
+        cache_status = {}
+        for _, _, status in conv.fetched:
+            cache_status[status] = cache_status.get(status, 0) + 1
+        total_stats = get_subscription_cache().stats
+        st.info(
+            f"🗄️ 订阅缓存：命中 {cache_status.get('hit', 0)}，"
+            f"304 复用 {cache_status.get('revalidated', 0)}，"
+            f"未命中 {cache_status.get('miss', 0)}，"
+            f"过期兜底 {cache_status.get('stale', 0)}。\n"
+            f"累计：命中 {total_stats['hit'] + total_stats['revalidated']} / "
+            f"未命中 {total_stats['miss']} / 过期兜底 {total_stats['stale']}"
+        )
+
+    if stats["reused"]:
+        st.caption(
+            f"🔁 增量转换：{conv.unchanged_sources}/{conv.source_count} 个来源内容未变化，"
+            f"复用 {stats['reused']} 行之前的解析结果，新解析 {stats['parsed']} 行。"
+        )
 
+    invalids = conv.invalids
     if invalids:
         show_n = 20
         preview = "\n".join([f"第 {ln} 行：{txt[:200]}" for ln, txt in invalids[:show_n]])
@@ -502,105 +366,177 @@ if st.button("开始转换", type="primary", use_container_width=True):
     if dup_count > 0:
         st.warning(f"♻️ 已去重：发现并丢弃 {dup_count} 条重复节点行（保留优先级更高的首次出现）。")
 
-    if not deduped_lines:
-        st.error("❌ 没有任何有效节点行（全部被跳过/去重或为空），请检查输入。")
-        st.stop()
-
-    nodes_content = "\n".join(deduped_lines)
-
-    # =========================================================
-    # 规则处理 (UPDATED)
-    # 逻辑：Mandatory Rules (Top) + [Default Rules + Manual Rules]
-    # 所有规则合并后统一清洗：去除原有缩进，统一强制加 2 个空格
-    # =========================================================
-
-    # 1) 读取默认规则
-    default_rules = ""
-    if rules_file:
-        default_rules = rules_file.getvalue().decode("utf-8", errors="ignore")
-    elif os.path.exists("rules.txt"):
-        try:
-            with open("rules.txt", "r", encoding="utf-8") as f:
-                default_rules = f.read()
-        except Exception:
-            default_rules = ""
-
-    # 2) 读取手动规则
-    manual_rules = manual_rules_text.strip() if manual_rules_text.strip() else ""
-
-    # 3) 合并规则 (Top Priority -> Manual Override check -> Default)
-    # 注意：MANDATORY_RULES 永远在最前
-    raw_rules_content = ""
-
-    if rules_mode == "仅使用手动规则（覆盖默认）":
-        raw_rules_content = MANDATORY_RULES + "\n" + manual_rules
-    else:
-        raw_rules_content = MANDATORY_RULES + "\n" + default_rules + "\n" + manual_rules
-
-    # 4) 统一格式化：清洗缩进并强制 2 空格
-    rules_content = normalize_rules_text(raw_rules_content)
-
-    final_lines = len([x for x in rules_content.splitlines() if x.strip()])
-    st.caption(f"规则统计：最终包含 {final_lines} 行规则 (含强制置顶规则)。")
-
-    # --- 解析节点 ---
-    proxies = []
-    name_counter = {}
-
-    for line in nodes_content.splitlines():
-        line = line.strip()
-        if not line:
-            continue
+    if stats["merged"] > 0:
+        show_n = 20
+        st.warning(f"♻️ 已合并 {stats['merged']} 个重复节点（名字或参数顺序不同，但连接的是同一个服务器）。")
+        preview = "\n".join(f"保留「{kept}」，丢弃「{dropped}」" for kept, dropped in stats["merged_nodes"][:show_n])
+        st.code(preview, language="text")
+        if stats["merged"] > show_n:
+            st.caption(f"仅展示前 {show_n} 条，共 {stats['merged']} 条被合并。")
 
-        p = None
-        try:
-            if line.startswith("vmess://"):
-                p = parse_vmess(line[8:])
-            elif line.startswith("vless://"):
-                p = parse_vless(urllib.parse.urlparse(line))
-            elif line.startswith("hysteria2://"):
-                p = parse_hysteria2(urllib.parse.urlparse(line))
-            elif line.startswith("tuic://"):
-                p = parse_tuic(urllib.parse.urlparse(line))
-
-            if p:
-                o_name = p["name"]
-                if o_name in name_counter:
-                    name_counter[o_name] += 1
-                    p["name"] = f"{o_name}_{name_counter[o_name]}"
-                else:
-                    name_counter[o_name] = 0
-                proxies.append(p)
-        except Exception:
-            continue
+    if stats["valid"] == dup_count:
+        st.error("❌ 没有任何有效节点行（全部被跳过/去重或为空），请检查输入。")
+        return
+
+    # 规则：强制置顶规则 -> 默认规则 -> 手动规则（默认规则已预编译，见上方规则设置）
+    st.caption(f"规则统计：最终包含 {conv.rules.line_count} 行规则 (含强制置顶规则)。")
+    if conv.rules.dropped:
+        counts = summarize_dropped(conv.rules.dropped)
+        st.caption(
+            f"规则精简：重复 {counts['duplicate']} 条、被覆盖 {counts['shadowed']} 条、"
+            f"合并 IP 段 {counts['merged']} 条。"
+        )
+    if conv.provider_error is not None:
+        st.error(f"❌ 写入规则集失败，已改回内联规则：{conv.provider_error}")
+    elif conv.providers is not None:
+        st.caption(
+            f"rule-providers：{len(conv.providers)} 个规则集，共 {sum(len(p['payload']) for p in conv.providers.values())} 条规则。"
+        )
 
-    if not proxies:
+    if conv.yaml is None:
         st.error("❌ 未识别到有效节点，请检查链接格式")
+        return
+
+    proxy_count = stats["proxies"]
+    if conv.probe is not None:
+        probe = conv.probe
+        proxy_count -= probe["dropped"]
+        line = (
+            f"📶 连通性测试（{probe['elapsed']:.1f} 秒）：可连接 {probe['reachable']}，去掉 {probe['dropped']}，"
+            f"未测（UDP 协议 / 超时）{probe['unprobed']}"
+        )
+        if probe["fastest_ms"] is not None:
+            line += f"，最快 {probe['fastest_ms']} ms"
+        st.info(line)
+        if probe["unreachable"] and not probe["dropped"]:
+            st.warning("⚠️ 所有节点都连不上，可能是服务器本身的网络问题，已保留全部节点。")
+        elif probe["dropped_nodes"]:
+            show_n = 20
+            st.code("\n".join(probe["dropped_nodes"][:show_n]), language="text")
+            if probe["dropped"] > show_n:
+                st.caption(f"仅展示前 {show_n} 个，共 {probe['dropped']} 个连不上的节点被去掉。")
+
+    download_url = f"{server_host}{static_url_prefix}/{ProfileStore.output_name(profile['id'])}"
+
+    st.success(f"🎉 转换成功！共包含 {proxy_count} 个节点")
+    sizes = profile.get("output_sizes") or {}
+    if sizes:
+        line = f"📦 配置文件 {sizes['raw'] / 1024:.1f} KB"
+        for fmt, label in (("gz", "gzip"), ("br", "brotli")):
+            if fmt in sizes:
+                line += f"，{label} 预压缩 {sizes[fmt] / 1024:.1f} KB（节省 {saved_ratio(sizes, fmt):.0%}）"
+        if not profile.get("output_written", True):
+            line += "；内容与上次相同，没有重写文件"
+        st.caption(line)
+    st.markdown("---")
+
+    st.markdown("### 📋 订阅链接")
+    st.info("请全选下方的链接进行复制：")
+
+    st.text_input("订阅 URL", value=download_url)
+    # 只把编辑密钥给创建者（或已经知道密钥的人），同样内容再次转换的人看不到
+    token = st.session_state.get("edit_tokens", {}).get(profile["id"])
+    if profile.get("edit_token") and (profile["created_at"] == profile["updated_at"] or ProfileStore.owns(profile, token)):
+        st.session_state.setdefault("edit_tokens", {})[profile["id"]] = profile["edit_token"]
+        st.text_input("编辑密钥（修改这个订阅时需要，请妥善保存）", value=profile["edit_token"])
+    if profile["interval"]:
+        every = next((k for k, v in REFRESH_OPTIONS.items() if v == profile["interval"]), f"每 {profile['interval']} 秒")
+        st.caption(f"订阅 ID：`{profile['id']}`，{every}自动重新生成，链接保持不变。")
     else:
-        final_yaml = generate_yaml(proxies, rules_content, current_source)
+        st.caption(f"订阅 ID：`{profile['id']}`，再次转换同样的内容会更新这个链接。")
 
-        if not os.path.exists(static_dir):
-            os.makedirs(static_dir)
+    st.download_button(
+        label="📥 下载 YAML 配置文件",
+        data=conv.yaml,
+        file_name="clash_config.yaml",
+        mime="text/yaml",
+    )
 
-        random_filename = f"config_{uuid.uuid4().hex[:8]}.yaml"
-        file_path = os.path.join(static_dir, random_filename)
 
-        with open(file_path, "w", encoding="utf-8-sig") as f:
-            f.write(final_yaml)
+job_queue = get_job_queue()
+start_metrics_server()
+queue_metrics = job_queue.metrics()
+st.sidebar.caption(
+    f"转换队列：进行中 {queue_metrics['running']} / 排队 {queue_metrics['queued']}"
+    f"（{queue_metrics['workers']} 个工作线程）"
+)
 
-        download_url = f"{server_host}{static_url_prefix}/{random_filename}"
+if st.button("开始转换", type="primary", use_container_width=True):
+    sources = []
+    contents = []
 
-        st.success(f"🎉 转换成功！共包含 {len(proxies)} 个节点")
-        st.markdown("---")
+    # 优先级：手动粘贴 -> 上传文件 -> 订阅链接（订阅在后台任务里拉取）
+    if manual_nodes_text and manual_nodes_text.strip():
+        # 粘贴的 base64 订阅正文直接解码，Clash YAML / SIP008 JSON 原样保留
+        text = decode_subscription_text(manual_nodes_text)
+        sources.append("manual_input")
+        contents.append(text)
 
-        st.markdown("### 📋 订阅链接")
-        st.info("请全选下方的链接进行复制：")
+    if nodes_files:
+        for f in nodes_files:
+            try:
+                # 分块读取并按行切分（base64 / Clash YAML / SIP008 按开头识别），超过 CLASHSUB_MAX_SOURCE_MB 的文件直接拒绝
+                f.seek(0)
+                text = read_source_text(f, max_bytes=max_source_bytes())
+                if text.strip():
+                    sources.append(f.name)
+                    contents.append(text)
+            except Exception as e:
+                st.error(f"❌ 读取文件失败：{f.name}\n原因：{e}")
 
-        st.text_input("订阅 URL", value=download_url)
+    if not contents and not subscription_urls:
+        st.warning("⚠️ 请至少粘贴节点内容、上传节点文件，或输入订阅链接！")
+        st.stop()
 
-        st.download_button(
-            label="📥 下载 YAML 配置文件",
-            data=final_yaml,
-            file_name="clash_config.yaml",
-            mime="text/yaml",
+    # 同样的输入得到同样的 ID，重复转换覆盖同一个文件，而不是每次生成新文件
+    try:
+        profile = make_profile(
+            inputs=list(zip(sources, contents)),
+            urls=subscription_urls,
+            rules_mode="append" if use_default_rules else "manual",
+            manual_rules=manual_rules_text,
+            rules_text=rules_file.getvalue().decode("utf-8", errors="ignore") if rules_file else None,
+            optimize_rules=optimize_rules,
+            rule_providers=use_rule_providers,
+            dedupe=DEDUPE_OPTIONS[dedupe_label],
+            group_mode=GROUP_OPTIONS[group_label],
+            probe=PROBE_OPTIONS[probe_label],
+            interval=REFRESH_OPTIONS[refresh_label],
+            profile_id=profile_id_text or None,
         )
+        # 填了 ID 就是要修改那个订阅：先确认密钥，不用等到后台任务里才失败
+        edit_token = edit_token_text or st.session_state.get("edit_tokens", {}).get(profile["id"])
+        if profile_id_text:
+            get_profile_store().check_edit(profile["id"], edit_token)
+        job = job_queue.submit(
+            client_key(),
+            run_conversion,
+            profile,
+            get_profile_store(),
+            get_subscription_cache(),
+            get_parse_memo(),
+            get_probe_cache(),
+            edit_token,
+        )
+    except (ValueError, JobRejected) as e:
+        st.error(f"❌ {e}")
+        st.stop()
+    st.session_state["job_id"] = job.id
+
+job = job_queue.get(st.session_state.get("job_id", ""))
+if job is not None:
+    if not job.finished:
+        fraction, label = STAGE_LABELS.get(job.state, (0.1, job.state))
+        if job.state == QUEUED:
+            label += f"（前面还有 {job_queue.position(job)} 个）"
+        elif job.detail:
+            label += f"：{job.detail}"
+        st.progress(fraction, text=f"⏳ {label}…")
+        time.sleep(0.5)
+        st.rerun()
+    elif job.state == FAILED:
+        st.error(f"❌ 转换失败：{job.error}")
+    else:
+        profile, conv, timings = job.result
+        show_result(profile, conv)
+        show_timings(timings)
@@ -0,0 +1,76 @@
+"""
+CLI 冷启动耗时：对比空解释器、仅导入 clashsub.core、以及一次完整的本地文件转换。
+同时检查本地转换路径没有导入 requests / streamlit。
+
+    python benchmarks/bench_cli_startup.py --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY_MODULES = ("requests", "streamlit")
+
+
+def timed(cmd, runs):
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run(cmd, cwd=ROOT, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples), min(samples)
+
+
+def imported_heavy(cmd):
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", *cmd[1:]],
+        cwd=ROOT,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+    found = set()
+    for line in out.splitlines():
+        name = line.rsplit("|", 1)[-1].strip()
+        if name.split(".")[0] in HEAVY_MODULES:
+            found.add(name.split(".")[0])
+    return sorted(found)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=20)
+    ap.add_argument("--nodes", type=int, default=1000)
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        nodes = os.path.join(tmp, "nodes.txt")
+        out = os.path.join(tmp, "out.yaml")
+        with open(nodes, "w", encoding="utf-8") as f:
+            for i in range(args.nodes):
+                f.write(f"hysteria2://pw{i}@h{i}.example.com:443?sni=a.com#node{i}\n")
+
+        convert = [sys.executable, "-m", "clashsub", "convert", "--in", nodes, "--rules", "rules.txt", "-o", out]
+        cases = [
+            ("python -c pass", [sys.executable, "-c", "pass"]),
+            ("import clashsub.core", [sys.executable, "-c", "import clashsub.core"]),
+            (f"convert {args.nodes} nodes", convert),
+        ]
+        for label, cmd in cases:
+            median, best = timed(cmd, args.runs)
+            print(f"{label:<24} median {median * 1000:7.1f} ms   min {best * 1000:7.1f} ms")
+
+        heavy = imported_heavy(convert)
+        if heavy:
+            print(f"❌ 本地转换导入了重依赖：{', '.join(heavy)}")
+            sys.exit(1)
+        print("✅ 本地转换未导入 requests / streamlit")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+多格式输出基准：同一份订阅要 clash / sing-box / uri 三种格式时，
+“解析一次、依次生成”（emitters.render_many）vs 每种格式各跑一遍完整流程（解码 -> 解析 -> 生成）。
+报告每种格式单独生成的耗时，即解析之后每多一种格式的边际成本。
+
+    python benchmarks/bench_emit.py --sizes 1000 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import node_text, subscription_body  # noqa: E402
+
+from clashsub.core import DEFAULT_RULES_FILE, build_nodes, decode_subscription_text, iter_nodes  # noqa: E402
+from clashsub.emitters import EMITTERS, render, render_many  # noqa: E402
+from clashsub.rules import assemble_rules, load_default_rules  # noqa: E402
+
+
+def parse(body):
+    proxies, _ = build_nodes(iter_nodes([decode_subscription_text(body)]), workers=1)
+    return proxies
+
+
+def best_of(repeat, fn, *args):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--formats", default=",".join(EMITTERS), help="逗号分隔的输出格式")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    formats = [f.strip() for f in args.formats.split(",") if f.strip()]
+    rules_content = assemble_rules(load_default_rules(DEFAULT_RULES_FILE), "").text
+    for n in args.sizes:
+        body = subscription_body(node_text(n))
+        t_parse, proxies = best_of(args.repeat, parse, body)
+        print(f"{n} 行，输出节点 {len(proxies)}：解码 + 解析 {t_parse * 1e3:.0f} ms")
+
+        marginal = 0.0
+        for fmt in formats:
+            t, text = best_of(args.repeat, render, fmt, proxies, rules_content)
+            marginal += t
+            print(f"  {fmt:<9} 生成 {t * 1e3:7.0f} ms  {len(text.encode()) / 1024:9.0f} KB")
+
+        def once():
+            return render_many(formats, parse(body), rules_content)
+
+        def per_format():
+            return {fmt: render(fmt, parse(body), rules_content) for fmt in formats}
+
+        t_once, a = best_of(args.repeat, once)
+        t_each, b = best_of(args.repeat, per_format)
+        assert a == b, "两种方式的输出不一致"
+        print(
+            f"  {len(formats)} 种格式：解析一次 {t_once * 1e3:.0f} ms，每种格式各跑一遍 {t_each * 1e3:.0f} ms"
+            f"（x{t_each / t_once:.2f}）；解析之后每多一种格式平均 +{marginal / len(formats) * 1e3:.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+增量转换基准：同一批订阅反复转换时，不带 ParseMemo（每次全量解析 + 生成）
+vs 带 ParseMemo（冷启动 / 完全未变 / 1% 的行有变化）。输出必须一致。
+
+    python benchmarks/bench_incremental.py --sizes 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parse import synthetic_text  # noqa: E402
+from clashsub.core import generate_yaml, scan_nodes  # noqa: E402
+from clashsub.memo import ParseMemo  # noqa: E402
+from clashsub.rules import assemble_rules, load_default_rules  # noqa: E402
+
+
+def convert(text, rules_content, memo=None):
+    proxies, _, _ = scan_nodes(text, workers=1, memo=memo)
+    return generate_yaml(proxies, rules_content, "bench", memo=memo)
+
+
+def timed(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - t0
+
+
+def change_some(text, ratio):
+    lines = text.splitlines()
+    step = max(1, int(1 / ratio))
+    for i in range(0, len(lines), step):
+        # 改名字（#fragment）或换 vmess 以外的服务器，模拟订阅里少量节点更新
+        lines[i] = lines[i].replace(".example.com", ".changed.example.com") if "#" in lines[i] else lines[i] + "="
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    ap.add_argument("--changed", type=float, default=0.01, help="变化的行占比")
+    args = ap.parse_args()
+
+    rules_content = assemble_rules(load_default_rules("rules.txt"), "").text
+    for n in args.sizes:
+        text = synthetic_text(n)
+        changed = change_some(text, args.changed)
+        memo = ParseMemo()
+
+        full, t_full = timed(lambda: convert(text, rules_content))
+        cold, t_cold = timed(lambda: convert(text, rules_content, memo))
+        warm, t_warm = timed(lambda: convert(text, rules_content, memo))
+        partial, t_partial = timed(lambda: convert(changed, rules_content, memo))
+        assert full == cold == warm, f"{n} 行时输出不一致"
+        assert partial == convert(changed, rules_content), f"{n} 行（部分变化）时输出不一致"
+        print(
+            f"{n:>7} 行  全量 {t_full * 1000:7.0f} ms   memo 冷启动 {t_cold * 1000:7.0f} ms   "
+            f"未变化 {t_warm * 1000:7.0f} ms   {args.changed:.0%} 变化 {t_partial * 1000:7.0f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+订阅读取的峰值内存（RSS）基准：几个 base64 订阅正文（corpus.py 生成，每个 --nodes 行），
+每种读取方式在单独的子进程里跑到 scan_nodes 结束，比较 ru_maxrss 减去只导入模块时的基线。
+
+- legacy：整体读入 -> str -> strip -> decode_subscription_text -> "\\n".join -> scan_nodes
+- stream：ingest.iter_source_lines 分块解码，每个来源只保留一份文本（订阅缓存 / 网页的做法）
+- direct：各来源的行直接流进 scan_nodes，不保留文本（命令行 --in 的做法）
+
+    python benchmarks/bench_ingest.py --nodes 50000 --sources 3
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import node_text, subscription_body  # noqa: E402
+
+from clashsub.core import decode_subscription_text, iter_nodes, scan_nodes  # noqa: E402
+from clashsub.ingest import iter_chunks, iter_source_lines  # noqa: E402
+
+MODES = ("legacy", "stream", "direct")
+
+
+def legacy(paths):
+    contents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            content = f.read()
+        text = str(content, "utf-8", errors="replace").strip()
+        contents.append(decode_subscription_text(text))
+    return scan_nodes("\n".join(contents).strip(), workers=1)
+
+
+def stream(paths):
+    contents = []
+    for path in paths:
+        with open(path, "rb") as f:
+            contents.append("\n".join(iter_source_lines(iter_chunks(f), max_bytes=None)))
+    return scan_nodes(iter_nodes(contents), workers=1)
+
+
+def direct(paths):
+    def lines():
+        for path in paths:
+            with open(path, "rb") as f:
+                yield from iter_source_lines(iter_chunks(f), max_bytes=None)
+
+    return scan_nodes(lines(), workers=1)
+
+
+def child(mode, paths):
+    t0 = time.perf_counter()
+    if mode == "idle":
+        proxies = []
+    else:
+        proxies, _, _ = globals()[mode](paths)
+    elapsed = time.perf_counter() - t0
+    # Linux 上 ru_maxrss 单位是 KB
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, len(proxies), elapsed)
+
+
+def run_child(mode, paths):
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", mode, *paths],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout.split()
+    return int(out[0]) / 1024, int(out[1]), float(out[2])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=50000, help="每个订阅的行数")
+    ap.add_argument("--sources", type=int, default=3)
+    ap.add_argument("--child", nargs="+", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.child:
+        child(args.child[0], args.child[1:])
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        total = 0
+        for i in range(args.sources):
+            body = subscription_body(node_text(args.nodes, seed=i)).encode()
+            total += len(body)
+            paths.append(os.path.join(tmp, f"sub_{i}.b64"))
+            with open(paths[-1], "wb") as f:
+                f.write(body)
+            del body
+
+        idle, _, _ = run_child("idle", paths)
+        print(f"{args.sources} 个订阅 x {args.nodes} 行，正文共 {total / 1024 / 1024:.1f} MB；导入后基线 RSS {idle:.1f} MB")
+        counts = set()
+        for mode in MODES:
+            rss, n, elapsed = run_child(mode, paths)
+            counts.add(n)
+            print(f"  {mode:<7} 峰值 RSS +{rss - idle:7.1f} MB  {elapsed * 1e3:8.0f} ms  输出节点 {n}")
+        assert len(counts) == 1, f"各方式的输出节点数不一致：{counts}"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+本地规则匹配微基准：编译 rules.txt 的耗时，以及单次查询的耗时（与逐条顺序匹配对比）。
+
+    python benchmarks/bench_match.py --queries 20000
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clashsub.rulecompiler import parse_rules  # noqa: E402
+from clashsub.rulematch import RuleMatcher  # noqa: E402
+from clashsub.rules import assemble_rules, load_default_rules  # noqa: E402
+
+
+def linear_match(rules, host):
+    """逐条顺序匹配（只看 DOMAIN* / IP-CIDR* / MATCH），作为正确性和速度的参照。"""
+    try:
+        addr = ipaddress.ip_address(host)
+    except ValueError:
+        addr = None
+    for r in rules:
+        if r.target is None:
+            continue
+        if addr is None:
+            if r.kind == "DOMAIN" and host == r.value:
+                return r
+            if r.kind == "DOMAIN-SUFFIX" and (host == r.value or host.endswith("." + r.value)):
+                return r
+            if r.kind == "DOMAIN-KEYWORD" and r.value in host:
+                return r
+        elif r.net is not None and addr.version == r.net.version and addr in r.net:
+            return r
+        if r.kind == "MATCH":
+            return r
+    return None
+
+
+def sample_hosts(rules, n, seed=1):
+    rnd = random.Random(seed)
+    domains = [r.value for r in rules if r.kind.startswith("DOMAIN")]
+    nets = [r.net for r in rules if r.net is not None and r.net.version == 4]
+    hosts = []
+    for i in range(n):
+        if i % 4 == 3 and nets:
+            net = rnd.choice(nets)
+            hosts.append(str(net.network_address + rnd.randrange(net.num_addresses)))
+        else:
+            d = rnd.choice(domains)
+            hosts.append(rnd.choice([d, "www." + d, d + ".example", "x" + d]))
+    return hosts
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", default="rules.txt")
+    ap.add_argument("--queries", type=int, default=20000)
+    args = ap.parse_args()
+
+    text = assemble_rules(load_default_rules(args.rules), "").text
+    rules = [r for r in parse_rules(text) if not isinstance(r, str)]
+    hosts = sample_hosts(rules, args.queries)
+
+    t0 = time.perf_counter()
+    matcher = RuleMatcher(text)
+    t_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    fast = [matcher.match_host(h).rule for h in hosts]
+    t_fast = (time.perf_counter() - t0) / len(hosts)
+
+    subset = hosts[: max(1, len(hosts) // 20)]
+    t0 = time.perf_counter()
+    slow = [linear_match(rules, h) for h in subset]
+    t_slow = (time.perf_counter() - t0) / len(subset)
+    assert fast[: len(subset)] == slow, "索引匹配与逐条匹配结果不一致"
+
+    print(f"{len(rules)} 条规则，编译 {t_build * 1e3:.1f} ms")
+    print(f"  逐条顺序匹配: {t_slow * 1e6:9.1f} µs/次")
+    print(f"  索引匹配:     {t_fast * 1e6:9.1f} µs/次  (x{t_slow / t_fast:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""
+节点内存基准（tracemalloc）：旧的每节点 dict vs 带 __slots__ 的协议记录（重复的
+server / sni / host 等字符串共享一份）。统计解析过程的峰值和解析结果常驻的内存。
+
+    python benchmarks/bench_memory.py --sizes 10000 100000
+"""
+import argparse
+import base64
+import gc
+import json
+import os
+import sys
+import tracemalloc
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_yaml import synthetic_lines  # noqa: E402
+from clashsub.core import build_proxies, safe_base64_decode, safe_name_decode  # noqa: E402
+
+
+# 旧的 dict 版解析函数原样保留（parse_qs 不带缓存）
+def legacy_parse_vmess(url_body: str):
+    try:
+        json_str = safe_base64_decode(url_body)
+        data = json.loads(json_str)
+        raw_name = data.get("ps", "vmess")
+        name = safe_name_decode(raw_name)
+        proxy = {
+            "name": name,
+            "type": "vmess",
+            "server": data.get("add"),
+            "port": int(data.get("port")),
+            "uuid": data.get("id"),
+            "alterId": int(data.get("aid", 0)),
+            "cipher": data.get("scy", "auto"),
+            "network": data.get("net", "ws"),
+            "tls": True if data.get("tls") == "tls" or data.get("tls") is True else False,
+            "udp": True,
+            "skip-cert-verify": True if data.get("verify_cert") is False else False,
+        }
+        if proxy["network"] == "ws":
+            proxy["ws-opts"] = {
+                "path": data.get("path", "/"),
+                "headers": {"Host": data.get("host", data.get("add"))},
+            }
+        return proxy
+    except Exception:
+        return None
+
+
+def legacy_parse_vless(parsed_url):
+    params = urllib.parse.parse_qs(parsed_url.query)
+    network = params.get("type", ["tcp"])[0]
+    raw_name = parsed_url.fragment
+    name = safe_name_decode(raw_name) if raw_name else "vless_node"
+    proxy = {
+        "name": name,
+        "type": "vless",
+        "server": parsed_url.hostname,
+        "port": parsed_url.port,
+        "uuid": parsed_url.username,
+        "udp": True,
+        "tls": True,
+        "network": network,
+        "servername": params.get("sni", [""])[0],
+        "skip-cert-verify": True if params.get("allowInsecure", ["0"])[0] == "1" else False,
+    }
+    if network == "ws":
+        host = params.get("host", [""])[0]
+        if not host:
+            host = proxy["servername"] or proxy["server"]
+        proxy["ws-opts"] = {
+            "path": params.get("path", ["/"])[0],
+            "headers": {"Host": host},
+        }
+    if network == "tcp":
+        flow = params.get("flow", [""])[0]
+        if flow:
+            proxy["flow"] = flow
+    if "fp" in params:
+        proxy["client-fingerprint"] = params["fp"][0]
+    else:
+        proxy["client-fingerprint"] = "chrome"
+    if params.get("security", [""])[0] == "reality":
+        proxy["reality-opts"] = {"public-key": params.get("pbk", [""])[0]}
+        sid = params.get("sid", params.get("shortId", params.get("short-id", [])))
+        if sid:
+            proxy["reality-opts"]["short-id"] = sid[0]
+        if not proxy["servername"]:
+            proxy["servername"] = params.get("sni", [""])[0]
+    return proxy
+
+
+def legacy_parse_hysteria2(parsed_url):
+    params = urllib.parse.parse_qs(parsed_url.query)
+    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "hysteria2_node"
+    return {
+        "name": name,
+        "type": "hysteria2",
+        "server": parsed_url.hostname,
+        "port": parsed_url.port,
+        "password": parsed_url.username,
+        "sni": params.get("sni", [""])[0],
+        "skip-cert-verify": True if params.get("insecure", ["0"])[0] == "1" else False,
+        "udp": True,
+    }
+
+
+def legacy_parse_tuic(parsed_url):
+    params = urllib.parse.parse_qs(parsed_url.query)
+    raw_user_info = parsed_url.username if parsed_url.username else ""
+    decoded_info = urllib.parse.unquote(raw_user_info)
+    if ":" in decoded_info:
+        user_parts = decoded_info.split(":", 1)
+        uuid_val = user_parts[0]
+        password_val = user_parts[1]
+    else:
+        uuid_val = decoded_info
+        password_val = urllib.parse.unquote(parsed_url.password) if parsed_url.password else ""
+    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "tuic_node"
+    sni_val = params.get("sni", [""])[0]
+
+    proxy = {
+        "name": name,
+        "type": "tuic",
+        "server": parsed_url.hostname,
+        "port": parsed_url.port,
+        "uuid": uuid_val,
+        "password": password_val,
+        "sni": sni_val,
+        "udp-relay-mode": "native",
+        "congestion-controller": params.get("congestion_control", ["bbr"])[0],
+        "skip-cert-verify": True if params.get("insecure", ["0"])[0] == "1" else False,
+        "udp": True,
+    }
+    if sni_val:
+        proxy["disable-sni"] = False
+    else:
+        proxy["disable-sni"] = True
+    if "alpn" in params:
+        proxy["alpn"] = [params["alpn"][0]]
+    return proxy
+
+
+def legacy_build_proxies(lines):
+    proxies = []
+    name_counter = {}
+    for line in lines:
+        try:
+            if line.startswith("vmess://"):
+                p = legacy_parse_vmess(line[8:])
+            else:
+                parser = legacy_parse_vless if line.startswith("vless://") else (
+                    legacy_parse_hysteria2 if line.startswith("hysteria2://") else legacy_parse_tuic
+                )
+                p = parser(urllib.parse.urlparse(line))
+            if p:
+                o_name = p["name"]
+                if o_name in name_counter:
+                    name_counter[o_name] += 1
+                    p["name"] = f"{o_name}_{name_counter[o_name]}"
+                else:
+                    name_counter[o_name] = 0
+                proxies.append(p)
+        except Exception:
+            continue
+    return proxies
+
+
+def realistic_lines(n):
+    """synthetic_lines 的每个节点 server 都不同；真实订阅里常见同一批入口 / CDN 域名。"""
+    lines = []
+    for i, line in enumerate(synthetic_lines(n)):
+        if line.startswith("vmess://"):
+            data = json.loads(base64.b64decode(line[8:]))
+            data["add"] = f"entry{i % 16}.example.com"
+            line = "vmess://" + base64.b64encode(json.dumps(data).encode()).decode()
+        else:
+            line = line.replace(f"{i}.example.com", f"{i % 16}.example.com")
+        lines.append(line)
+    return lines
+
+
+def measure(fn, lines):
+    gc.collect()
+    tracemalloc.start()
+    result = fn(lines)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, current, peak
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = ap.parse_args()
+
+    mb = 1024 * 1024
+    for n in args.sizes:
+        lines = realistic_lines(n)
+        old, old_cur, old_peak = measure(legacy_build_proxies, lines)
+        new, new_cur, new_peak = measure(build_proxies, lines)
+        assert old == [p.to_dict() for p in new], f"{n} 个节点时解析结果不一致"
+        del old, new
+        print(
+            f"{n:>7} 节点  dict: 常驻 {old_cur / mb:7.1f} MB / 峰值 {old_peak / mb:7.1f} MB   "
+            f"记录: 常驻 {new_cur / mb:7.1f} MB / 峰值 {new_peak / mb:7.1f} MB   "
+            f"({old_cur / n:.0f} -> {new_cur / n:.0f} 字节/节点)"
+        )
+
+
+if __name__ == "__main__":
+    main()
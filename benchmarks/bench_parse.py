@@ -0,0 +1,116 @@
+"""
+节点解析吞吐基准（行/秒）：旧的 filter -> dedupe -> build_proxies（4 次 startswith
+分发 + 每行 urlparse / parse_qs） vs 单次扫描的 scan_nodes，以及 scan_nodes 的进程池模式。
+两者输出必须一致（scan_nodes 关掉按节点身份合并，旧流程没有这一步）。
+
+    python benchmarks/bench_parse.py --sizes 20000 100000 --workers 4
+"""
+import argparse
+import os
+import sys
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_yaml import best_of, synthetic_lines  # noqa: E402
+from clashsub import core  # noqa: E402
+from clashsub.core import dedupe_lines_keep_first, parse_hysteria2, parse_tuic, parse_vless, parse_vmess, scan_nodes  # noqa: E402
+
+
+# 旧的 filter_valid_nodes_lines / build_proxies 原样保留，用于对比
+def legacy_filter(text):
+    valid_lines = []
+    invalids = []
+    total_nonempty = 0
+    proto_count = {"vmess": 0, "vless": 0, "hysteria2": 0, "tuic": 0}
+    for idx, raw in enumerate(text.splitlines(), start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        total_nonempty += 1
+        if line.startswith("vmess://"):
+            proto_count["vmess"] += 1
+            valid_lines.append(line)
+        elif line.startswith("vless://"):
+            proto_count["vless"] += 1
+            valid_lines.append(line)
+        elif line.startswith("hysteria2://"):
+            proto_count["hysteria2"] += 1
+            valid_lines.append(line)
+        elif line.startswith("tuic://"):
+            proto_count["tuic"] += 1
+            valid_lines.append(line)
+        else:
+            invalids.append((idx, line))
+    return valid_lines, invalids
+
+
+def legacy_build_proxies(lines):
+    proxies = []
+    name_counter = {}
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            p = None
+            if line.startswith("vmess://"):
+                p = parse_vmess(line[8:])
+            elif line.startswith("vless://"):
+                p = parse_vless(urllib.parse.urlparse(line))
+            elif line.startswith("hysteria2://"):
+                p = parse_hysteria2(urllib.parse.urlparse(line))
+            elif line.startswith("tuic://"):
+                p = parse_tuic(urllib.parse.urlparse(line))
+            if p:
+                o_name = p.name
+                if o_name in name_counter:
+                    name_counter[o_name] += 1
+                    p.name = f"{o_name}_{name_counter[o_name]}"
+                else:
+                    name_counter[o_name] = 0
+                proxies.append(p)
+        except Exception:
+            continue
+    return proxies
+
+
+def legacy_pipeline(text):
+    # 旧代码每行都重新 parse_qs，这里清掉缓存以免沾新代码的光
+    core.parse_query.cache_clear()
+    valid_lines, _ = legacy_filter(text)
+    deduped, _ = dedupe_lines_keep_first(valid_lines)
+    return legacy_build_proxies(deduped)
+
+
+def synthetic_text(n):
+    lines = synthetic_lines(n)
+    # 混入 5% 的重复行和不支持的行，接近真实的聚合订阅
+    extra = lines[: n // 20] + ["ss://unsupported"] * (n // 20)
+    return "\n".join(lines + extra)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    for n in args.sizes:
+        text = synthetic_text(n)
+        lines = text.count("\n") + 1
+        assert legacy_pipeline(text) == scan_nodes(text, workers=1, dedupe="off")[0], f"{n} 行时输出不一致"
+        assert scan_nodes(text, workers=1, dedupe="off")[0] == scan_nodes(text, workers=args.workers, dedupe="off")[0]
+
+        t_old = best_of(lambda: legacy_pipeline(text), args.repeat)
+        t_new = best_of(lambda: scan_nodes(text, workers=1, dedupe="off"), args.repeat)
+        t_pool = best_of(lambda: scan_nodes(text, workers=args.workers, dedupe="off"), args.repeat)
+        print(
+            f"{lines:>7} 行  旧 {lines / t_old:10,.0f} 行/秒   单次扫描 {lines / t_new:10,.0f} 行/秒   "
+            f"进程池 x{args.workers} {lines / t_pool:10,.0f} 行/秒"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+连通性测试基准：本机开一批监听端口（另有一部分端口关闭），生成指向它们的 vless 节点，
+对比逐个阻塞 connect 与 probe_proxies（asyncio 并发 + 上限），以及命中缓存后的耗时。
+同时检查结果：关闭的端口全部被去掉，监听中的全部保留，hysteria2 节点原样保留在最后。
+
+    python benchmarks/bench_probe.py --nodes 2000 --ports 200
+"""
+import argparse
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clashsub.probe import ProbeCache, probe_proxies  # noqa: E402
+from clashsub.proxies import Hysteria2Proxy, VlessProxy  # noqa: E402
+
+
+def open_ports(n):
+    socks = []
+    for _ in range(n):
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        s.listen(1024)
+        socks.append(s)
+    return socks
+
+
+def closed_ports(n):
+    ports = []
+    for _ in range(n):
+        s = socket.socket()
+        s.bind(("127.0.0.1", 0))
+        ports.append(s.getsockname()[1])
+        s.close()
+    return ports
+
+
+def sequential(proxies, timeout):
+    alive = []
+    for p in proxies:
+        try:
+            socket.create_connection((p.server, p.port), timeout=timeout).close()
+            alive.append(p)
+        except OSError:
+            pass
+    return alive
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--nodes", type=int, default=2000)
+    ap.add_argument("--ports", type=int, default=200)
+    ap.add_argument("--dead", type=float, default=0.1, help="指向关闭端口的节点比例")
+    ap.add_argument("--concurrency", type=int, default=64)
+    args = ap.parse_args()
+
+    listeners = open_ports(args.ports)
+    live = [s.getsockname()[1] for s in listeners]
+    dead = closed_ports(max(1, args.ports // 10))
+    proxies = []
+    for i in range(args.nodes):
+        is_dead = i % int(1 / args.dead) == 0 if args.dead else False
+        port = dead[i % len(dead)] if is_dead else live[i % len(live)]
+        proxies.append(VlessProxy(f"n{i}{'_dead' if is_dead else ''}", "127.0.0.1", port, "u", "tcp", "a.com", False, "chrome"))
+    proxies.append(Hysteria2Proxy("hy", "127.0.0.1", 443, "pw", "a.com", False))
+
+    t0 = time.perf_counter()
+    alive = sequential(proxies[:-1], 3)
+    t_seq = time.perf_counter() - t0
+
+    cache = ProbeCache()
+    t0 = time.perf_counter()
+    ranked, dropped, stats = probe_proxies(proxies, concurrency=args.concurrency, cache=cache)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    probe_proxies(proxies, concurrency=args.concurrency, cache=cache)
+    t_warm = time.perf_counter() - t0
+
+    assert {p.name for p in dropped} == {p.name for p in proxies if p.name.endswith("_dead")}
+    assert {p.name for p in ranked[:-1]} == {p.name for p in alive} and ranked[-1].name == "hy"
+
+    print(f"{len(proxies)} 个节点，{stats['endpoints']} 个端点（{len(dead)} 个关闭）")
+    print(f"  逐个阻塞 connect: {t_seq * 1e3:8.1f} ms")
+    print(f"  asyncio 并发 x{args.concurrency}: {t_cold * 1e3:8.1f} ms  去掉 {stats['dropped']}，最快 {stats['fastest_ms']} ms")
+    print(f"  命中缓存:         {t_warm * 1e3:8.1f} ms")
+    for s in listeners:
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+规则阶段微基准：每次请求重新读取 + 清洗 rules.txt（旧） vs 预编译的规则块（新），
+以及手动规则冲突检查（--manual 条随机手动规则对 rules.txt）的耗时。
+默认规则的索引跨请求缓存，每次检查只遍历手动规则；建好索引之后的最好成绩超过
+--target-ms（默认 50 ms）时以退出码 1 结束。
+
+    python benchmarks/bench_rules.py --rounds 200 --manual 3000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clashsub.core import load_rules_file, merge_rules  # noqa: E402
+from clashsub.ruleanalysis import analyze_manual_rules  # noqa: E402
+from clashsub.rules import assemble_rules, load_default_rules  # noqa: E402
+
+MANUAL_RULES = """
+  # 示例：B站直连
+  - DOMAIN,b23.tv,DIRECT
+  - DOMAIN-SUFFIX,bilibili.com,DIRECT
+"""
+
+
+def old_stage(path):
+    rules_content = merge_rules(load_rules_file(path), MANUAL_RULES)
+    final_lines = len([x for x in rules_content.splitlines() if x.strip()])
+    return rules_content, final_lines
+
+
+def new_stage(path):
+    rules = assemble_rules(load_default_rules(path), MANUAL_RULES)
+    return rules.text, rules.line_count
+
+
+def synthetic_manual_rules(n):
+    kinds = ["DOMAIN-SUFFIX,site{i}.example", "DOMAIN,host{i}.example.net", "DOMAIN-KEYWORD,kw{i}x", "IP-CIDR,10.{a}.{b}.0/24"]
+    return "\n".join(
+        f"  - {kinds[i % 4].format(i=i, a=i // 256 % 256, b=i % 256)},{'DIRECT' if i % 3 else '🚀 节点选择'}" for i in range(n)
+    )
+
+
+def per_call(fn, path, rounds):
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        fn(path)
+    return (time.perf_counter() - t0) / rounds
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rules", default="rules.txt")
+    ap.add_argument("--rounds", type=int, default=200)
+    ap.add_argument("--manual", type=int, default=3000, help="冲突检查用的手动规则条数")
+    ap.add_argument("--target-ms", type=float, default=50.0, help="冲突检查每次的耗时上限")
+    args = ap.parse_args()
+
+    assert old_stage(args.rules) == new_stage(args.rules), "规则输出不一致"
+
+    t_old = per_call(old_stage, args.rules, args.rounds)
+    t_new = per_call(new_stage, args.rules, args.rounds)
+    _, lines = new_stage(args.rules)
+    print(f"{lines} 行规则")
+    print(f"  每次重新读取清洗: {t_old * 1e6:9.1f} µs/次")
+    print(f"  预编译规则块:     {t_new * 1e6:9.1f} µs/次  (x{t_old / t_new:.0f})")
+
+    base = assemble_rules(load_default_rules(args.rules), "").text
+    manual = synthetic_manual_rules(args.manual)
+    t0 = time.perf_counter()
+    analyze_manual_rules(base, manual)
+    t_first = time.perf_counter() - t0
+    checks = [per_call(lambda _: analyze_manual_rules(base, manual), None, 1) for _ in range(max(3, args.rounds // 20))]
+    t_check = min(checks)
+    print(
+        f"  冲突检查 {args.manual} 条手动规则: 首次 {t_first * 1e3:.1f} ms（含建索引），"
+        f"之后最好 {t_check * 1e3:.1f} ms/次，平均 {sum(checks) / len(checks) * 1e3:.1f} ms/次"
+    )
+    if t_check * 1e3 > args.target_ms:
+        print(f"❌ 超过目标 {args.target_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+generate_yaml 基准：旧的 += 拼接实现 vs 新的分块生成器。
+默认模式下两者输出必须逐字节一致。
+
+    python benchmarks/bench_yaml.py --sizes 1000 10000 50000
+"""
+import argparse
+import base64
+import copy
+import io
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from clashsub.core import build_proxies, generate_yaml, write_yaml  # noqa: E402
+from clashsub.rules import assemble_rules, load_default_rules  # noqa: E402
+
+
+# 旧实现原样保留，用于对比输出与耗时
+def legacy_generate_yaml(proxies, rules_content, source_url=""):
+    proxy_names = []
+    for p in proxies:
+        safe_n = p["name"].replace('"', "").replace("'", "").strip()
+        p["name"] = safe_n
+        proxy_names.append(safe_n)
+
+    header_info = f"# Source Subscription: {source_url}\n" if source_url else ""
+    yaml_content = f"""{header_info}mixed-port: 7890
+allow-lan: true
+mode: Rule
+log-level: info
+external-controller: :9090
+proxies:
+"""
+    for p in proxies:
+        yaml_content += f'  - name: "{p["name"]}"\n'
+        yaml_content += f"    type: {p['type']}\n"
+        yaml_content += f"    server: {p['server']}\n"
+        yaml_content += f"    port: {p['port']}\n"
+        for key in [
+            "uuid",
+            "password",
+            "udp",
+            "tls",
+            "flow",
+            "servername",
+            "sni",
+            "client-fingerprint",
+            "network",
+            "alterId",
+            "cipher",
+            "skip-cert-verify",
+            "udp-relay-mode",
+            "congestion-controller",
+            "disable-sni",
+        ]:
+            if key in p:
+                val = str(p[key]).lower() if isinstance(p[key], bool) else p[key]
+                yaml_content += f"    {key}: {val}\n"
+
+        if "ws-opts" in p:
+            yaml_content += (
+                "    ws-opts:\n"
+                f'      path: "{p["ws-opts"]["path"]}"\n'
+                "      headers:\n"
+                f'        Host: {p["ws-opts"]["headers"]["Host"]}\n'
+            )
+        if "reality-opts" in p:
+            yaml_content += "    reality-opts:\n"
+            yaml_content += f'      public-key: {p["reality-opts"]["public-key"]}\n'
+            if "short-id" in p["reality-opts"]:
+                yaml_content += f'      short-id: {p["reality-opts"]["short-id"]}\n'
+        if "alpn" in p:
+            yaml_content += "    alpn:\n"
+            for a in p["alpn"]:
+                yaml_content += f"      - {a}\n"
+
+    yaml_content += "proxy-groups:\n"
+
+    groups = [
+        {"name": "🚀 节点选择", "type": "select", "special": ["♻️ 自动选择", "DIRECT"]},
+        {
+            "name": "♻️ 自动选择",
+            "type": "url-test",
+            "url": "http://www.gstatic.com/generate_204",
+            "interval": 300,
+            "tolerance": 50,
+            "special": [],
+        },
+        {"name": "🌍 国外媒体", "type": "select", "special": ["🚀 节点选择", "♻️ 自动选择", "🎯 全球直连"]},
+        {"name": "📲 电报信息", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
+        {"name": "Ⓜ️ 微软服务", "type": "select", "special": ["🎯 全球直连", "🚀 节点选择"]},
+        {"name": "🍎 苹果服务", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
+        {"name": "📢 谷歌FCM", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
+        {"name": "🎯 全球直连", "type": "select", "base": ["DIRECT", "🚀 节点选择", "♻️ 自动选择"], "no_proxies": True},
+        {"name": "🛑 全球拦截", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
+        {"name": "🍃 应用净化", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
+        {"name": "🐟 漏网之鱼", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
+    ]
+
+    for g in groups:
+        yaml_content += f'  - name: "{g["name"]}"\n'
+        yaml_content += f"    type: {g['type']}\n"
+        if "url" in g:
+            yaml_content += f"    url: {g['url']}\n"
+            yaml_content += f"    interval: {g['interval']}\n"
+            yaml_content += f"    tolerance: {g['tolerance']}\n"
+
+        yaml_content += "    proxies:\n"
+        if "base" in g:
+            for b in g["base"]:
+                yaml_content += f'      - "{b}"\n'
+        if "special" in g:
+            for s in g["special"]:
+                yaml_content += f'      - "{s}"\n'
+        if not g.get("no_proxies", False):
+            for name in proxy_names:
+                yaml_content += f'      - "{name}"\n'
+
+    yaml_content += "rules:\n" + rules_content
+    return yaml_content
+
+
+
+def synthetic_lines(n):
+    lines = []
+    for i in range(n):
+        kind = i % 4
+        if kind == 0:
+            body = json.dumps({"ps": f"vm{i}", "add": f"v{i}.example.com", "port": "443", "id": f"id-{i}", "net": "ws", "tls": "tls", "path": "/ws", "host": "cdn.example.com"})
+            lines.append("vmess://" + base64.b64encode(body.encode()).decode())
+        elif kind == 1:
+            lines.append(f"vless://uuid-{i}@l{i}.example.com:443?type=tcp&security=reality&sni=a.com&pbk=PBK&sid=ab&flow=xtls-rprx-vision#vl{i}")
+        elif kind == 2:
+            lines.append(f"hysteria2://pw{i}@h{i}.example.com:443?sni=b.com&insecure=1#hy{i}")
+        else:
+            lines.append(f"tuic://uuid-{i}:pw{i}@t{i}.example.com:443?sni=c.com&alpn=h3&congestion_control=bbr#tu{i}")
+    return lines
+
+
+def best_of(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    rules_content = assemble_rules(load_default_rules("rules.txt"), "").text
+    for n in args.sizes:
+        proxies = build_proxies(synthetic_lines(n))
+        # 旧实现吃的是 dict
+        legacy_proxies = [p.to_dict() for p in proxies]
+
+        old = legacy_generate_yaml(copy.deepcopy(legacy_proxies), rules_content, "bench")
+        new = generate_yaml(copy.deepcopy(proxies), rules_content, "bench")
+        assert old == new, f"{n} 个节点时输出不一致"
+
+        t_old = best_of(lambda: legacy_generate_yaml(legacy_proxies, rules_content, "bench"), args.repeat)
+        t_new = best_of(lambda: generate_yaml(proxies, rules_content, "bench"), args.repeat)
+        t_stream = best_of(lambda: write_yaml(io.StringIO(), proxies, rules_content, "bench"), args.repeat)
+        provider = generate_yaml(proxies, rules_content, "bench", group_mode="provider")
+        print(
+            f"{n:>6} 节点  旧 {t_old * 1000:8.1f} ms   新 {t_new * 1000:8.1f} ms   流式写入 {t_stream * 1000:8.1f} ms   "
+            f"大小 inline {len(new.encode()) / 1024:8.0f} KB / provider {len(provider.encode()) / 1024:8.0f} KB"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+"""
+并发压测：N 个模拟用户不停请求无界面接口 /sub，看能撑住多少同时转换、延迟从多少人开始失控。
+
+- 本地起一个假的订阅源，每个订阅是 corpus.py 生成的 base64 正文（--nodes 行，--subscriptions 个不同的订阅）
+- 默认起 --workers 个 `python -m clashsub.server` 进程（相当于 gunicorn -w N），用户按序号分到各进程；
+  也可以用 --target 压已有的部署（如 install_service.sh 装好的服务），--pids 指定要采样的进程
+- 每档用户数（--users 1 4 16）先预热 --warmup 秒（不计入结果），再跑 --duration 秒
+- 报告吞吐、延迟 p50 / p95 / p99、错误数，以及每个服务进程的 CPU 占用和 RSS（读 /proc，只支持 Linux）
+- --report 写出 JSON 报告，--compare 和之前的报告逐档比较
+
+Streamlit 网页的转换走的是同一条拉取 -> 解析 -> 生成流程（在 clashsub.jobs 的线程池里），
+网页协议基于 websocket，没法直接模拟，所以压的是 /sub。
+
+    python benchmarks/loadtest.py --users 1 4 16 --workers 2 --nodes 5000 --report /tmp/load.json
+    python benchmarks/loadtest.py --users 1 4 16 --workers 2 --nodes 5000 --compare /tmp/load.json
+    python benchmarks/loadtest.py --target http://127.0.0.1:8502 --pids 1234 --users 8
+"""
+import argparse
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import ROOT, node_text, subscription_body  # noqa: E402
+
+import requests  # noqa: E402
+
+
+# ---- 假订阅源 ----------------------------------------------------------------
+
+
+def upstream(bodies, delay):
+    """ThreadingHTTPServer serving bodies[i] at /sub/<i>, after `delay` seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            try:
+                body = bodies[int(self.path.rsplit("/", 1)[-1])]
+            except (ValueError, IndexError):
+                self.send_error(404)
+                return
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ---- 服务进程 ----------------------------------------------------------------
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_workers(n, cache_dir, cache_ttl):
+    env = dict(os.environ, CLASHSUB_CACHE_DIR=cache_dir, CLASHSUB_CACHE_TTL=str(cache_ttl))
+    procs = []
+    for _ in range(n):
+        port = free_port()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "clashsub.server", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=ROOT,
+            env=env,
+            # wsgiref 每个请求都往 stderr 打一行访问日志
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        procs.append((proc, f"http://127.0.0.1:{port}"))
+    deadline = time.monotonic() + 30
+    for proc, base in procs:
+        while True:
+            try:
+                if requests.get(f"{base}/healthz", timeout=1).ok:
+                    break
+            except requests.RequestException:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                stop_workers(procs)
+                raise SystemExit(f"服务进程没能启动：{base}")
+            time.sleep(0.1)
+    return procs
+
+
+def stop_workers(procs):
+    for proc, _ in procs:
+        proc.terminate()
+    for proc, _ in procs:
+        try:
+            proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+# ---- 进程采样 ----------------------------------------------------------------
+
+CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+
+
+def proc_sample(pid):
+    """(cpu seconds, rss bytes) of a process from /proc, or None."""
+    try:
+        with open(f"/proc/{pid}/stat", "r") as f:
+            # comm 里可能有空格，从最后一个 ")" 之后开始数：utime / stime 是第 14 / 15 个字段
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open(f"/proc/{pid}/status", "r") as f:
+            rss = next((int(line.split()[1]) * 1024 for line in f if line.startswith("VmRSS:")), 0)
+    except (OSError, IndexError, ValueError):
+        return None
+    return (int(fields[11]) + int(fields[12])) / CLK_TCK, rss
+
+
+class Sampler:
+    """Samples CPU time and RSS of `pids` every `interval` seconds in a thread."""
+
+    def __init__(self, pids, interval=0.2):
+        self.pids = pids
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.start_cpu = {}
+        self.end = {}
+        self.peak_rss = {}
+
+    def _sample(self):
+        for pid in self.pids:
+            s = proc_sample(pid)
+            if s is None:
+                continue
+            self.start_cpu.setdefault(pid, s[0])
+            self.end[pid] = s
+            self.peak_rss[pid] = max(self.peak_rss.get(pid, 0), s[1])
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self.started = time.monotonic()
+        self._sample()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        self.elapsed = time.monotonic() - self.started
+
+    def report(self):
+        out = []
+        for pid in self.pids:
+            if pid not in self.end:
+                out.append({"pid": pid, "cpu_seconds": None, "cpu_percent": None, "rss_mb": None, "rss_mb_peak": None})
+                continue
+            cpu = self.end[pid][0] - self.start_cpu[pid]
+            out.append(
+                {
+                    "pid": pid,
+                    "cpu_seconds": round(cpu, 3),
+                    "cpu_percent": round(cpu / self.elapsed * 100, 1),
+                    "rss_mb": round(self.end[pid][1] / 1024 / 1024, 1),
+                    "rss_mb_peak": round(self.peak_rss[pid] / 1024 / 1024, 1),
+                }
+            )
+        return out
+
+
+# ---- 模拟用户 ----------------------------------------------------------------
+
+
+def percentile(sorted_values, q):
+    """Nearest-rank percentile of an already sorted list, or None when empty."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-len(sorted_values) * q // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def user_loop(session, url, think, stop, record, timeout):
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        try:
+            resp = session.get(url, timeout=timeout)
+            size = len(resp.content)
+            status = resp.status_code
+        except requests.RequestException as e:
+            size = 0
+            status = type(e).__name__
+        record(t0, time.perf_counter() - t0, status, size)
+        if think:
+            stop.wait(think)
+
+
+def start_users(users, targets, sub_urls, query, args):
+    """
+    Starts `users` user threads and returns after the warmup; samples of
+    requests started after the warmup are appended to the returned list
+    until the returned event is set.
+    """
+    samples = []
+    lock = threading.Lock()
+    measure_from = time.perf_counter() + args.warmup
+
+    def record(t0, latency, status, size):
+        if t0 >= measure_from:
+            with lock:
+                samples.append((latency, status, size))
+
+    stop = threading.Event()
+    threads = []
+    sessions = []
+    for i in range(users):
+        params = dict(query, url=sub_urls[i % len(sub_urls)])
+        url = f"{targets[i % len(targets)]}/sub?{urllib.parse.urlencode(params)}"
+        session = requests.Session()
+        sessions.append(session)
+        t = threading.Thread(target=user_loop, args=(session, url, args.think, stop, record, args.timeout), daemon=True)
+        threads.append(t)
+        t.start()
+    time.sleep(args.warmup)
+    return stop, threads, sessions, samples, lock
+
+
+def summarize(users, samples, elapsed, workers):
+    latencies = sorted(s[0] for s in samples)
+    ok = [s for s in samples if s[1] == 200]
+    errors = {}
+    for _, status, _ in samples:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    def ms(v):
+        return None if v is None else round(v * 1e3, 1)
+
+    return {
+        "users": users,
+        "requests": len(samples),
+        "ok": len(ok),
+        "errors": errors,
+        "seconds": round(elapsed, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "mb_per_second": round(sum(s[2] for s in ok) / elapsed / 1024 / 1024, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "mean": ms(sum(latencies) / len(latencies)) if latencies else None,
+            "p50": ms(percentile(latencies, 50)),
+            "p95": ms(percentile(latencies, 95)),
+            "p99": ms(percentile(latencies, 99)),
+            "max": ms(latencies[-1]) if latencies else None,
+        },
+        "workers": workers,
+    }
+
+
+def print_step(step, base=None):
+    lat = step["latency_ms"]
+
+    def fmt(v):
+        return "-" if v is None else f"{v:.0f}"
+
+    change = ""
+    if base is not None and base["throughput_rps"] and base["latency_ms"]["p95"] and lat["p95"]:
+        change = (
+            f"  vs 上次：吞吐 {(step['throughput_rps'] / base['throughput_rps'] - 1) * 100:+.0f}%"
+            f"，p95 {(lat['p95'] / base['latency_ms']['p95'] - 1) * 100:+.0f}%"
+        )
+    errors = sum(step["errors"].values())
+    print(
+        f"{step['users']:>5}{step['throughput_rps']:>9.2f}{fmt(lat['p50']):>9}{fmt(lat['p95']):>9}{fmt(lat['p99']):>9}"
+        f"{fmt(lat['max']):>9}{errors:>7}{change}"
+    )
+    for w in step["workers"]:
+        if w["cpu_percent"] is None:
+            print(f"        pid {w['pid']}: 无法读取 /proc")
+        else:
+            print(f"        pid {w['pid']}: CPU {w['cpu_percent']:5.1f}%  RSS {w['rss_mb']:.0f} MB（峰值 {w['rss_mb_peak']:.0f} MB）")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, nargs="+", default=[1, 4, 16], help="每档同时在线的用户数")
+    ap.add_argument("--duration", type=float, default=20.0, help="每档计时的秒数")
+    ap.add_argument("--warmup", type=float, default=3.0, help="每档开始后不计入结果的秒数")
+    ap.add_argument("--think", type=float, default=0.0, help="每个用户两次请求之间的间隔（秒）")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--nodes", type=int, default=5000, help="每个订阅的行数")
+    ap.add_argument("--subscriptions", type=int, default=4, help="不同订阅的个数，用户轮流分到各订阅")
+    ap.add_argument("--upstream-delay", type=float, default=0.0, help="假订阅源每次响应前等待的秒数")
+    ap.add_argument("--workers", type=int, default=2, help="本地启动的服务进程数")
+    ap.add_argument("--cache-ttl", type=float, default=300, help="服务进程的订阅缓存有效期（CLASHSUB_CACHE_TTL），0 表示每次都重新拉取")
+    ap.add_argument("--target", nargs="+", help="压已有的服务（如 http://127.0.0.1:8502），不启动本地进程")
+    ap.add_argument("--pids", type=int, nargs="+", default=[], help="配合 --target：要采样 CPU / RSS 的进程")
+    ap.add_argument("--query", default="", help="追加到 /sub 的参数，如 format=sing-box&groups=region")
+    ap.add_argument("--report", metavar="PATH", help="把结果写成 JSON 报告")
+    ap.add_argument("--compare", metavar="PATH", help="和之前的 JSON 报告逐档比较")
+    args = ap.parse_args()
+
+    base_steps = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            base_steps = {s["users"]: s for s in json.load(f)["steps"]}
+
+    bodies = [subscription_body(node_text(args.nodes, seed=i)).encode() for i in range(args.subscriptions)]
+    source = upstream(bodies, args.upstream_delay)
+    host, port = source.server_address
+    sub_urls = [f"http://{host}:{port}/sub/{i}" for i in range(args.subscriptions)]
+    query = dict(urllib.parse.parse_qsl(args.query))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        procs = []
+        if args.target:
+            targets = [t.rstrip("/") for t in args.target]
+            pids = args.pids
+        else:
+            procs = start_workers(args.workers, os.path.join(tmp, "cache"), args.cache_ttl)
+            targets = [base for _, base in procs]
+            pids = [proc.pid for proc, _ in procs]
+
+        print(
+            f"{len(targets)} 个服务地址，{args.subscriptions} 个订阅 x {args.nodes} 行（{len(bodies[0]) / 1024:.0f} KB），"
+            f"每档预热 {args.warmup:g} 秒 + 计时 {args.duration:g} 秒"
+        )
+        print(f"{'users':>5}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>7}")
+        steps = []
+        try:
+            for users in args.users:
+                stop, threads, sessions, samples, lock = start_users(users, targets, sub_urls, query, args)
+                with Sampler(pids) as sampler:
+                    time.sleep(args.duration)
+                    # 计时窗口结束时还没返回的请求不计入
+                    with lock:
+                        measured = list(samples)
+                stop.set()
+                for t in threads:
+                    t.join()
+                for s in sessions:
+                    s.close()
+                step = summarize(users, measured, sampler.elapsed, sampler.report())
+                steps.append(step)
+                print_step(step, base_steps.get(users))
+        finally:
+            stop_workers(procs)
+            source.shutdown()
+
+    if args.report:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "args": {k: v for k, v in vars(args).items() if k not in ("report", "compare")},
+        }
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "steps": steps}, f, indent=2, ensure_ascii=False)
+            f.write("\n")
+        print(f"报告已写入 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+分阶段基准套件：用 corpus.py 的合成语料（默认 1k / 10k / 100k 行节点，rules.txt 的 1x / 4x）
+分别计时解码、筛选、解析、合并、单遍扫描、生成 YAML、端到端，以及规则规范化 / 精简 / 匹配器构建。
+
+每项先预热一次，再跑 --repeat 次（单项总耗时超过 --budget 秒且至少跑了 3 次就提前停），
+报告最小值和中位数。--save 把结果存成基线 JSON；--compare 读基线，任一项的最小值
+比基线慢超过 --threshold（且绝对差超过 --min-delta-ms）时列出来并以退出码 1 结束。
+基线和机器相关，换机器、换 Python 版本后请重新 --save。仓库里的 benchmarks/baseline.json
+是用下面第一条命令生成的（机器和 Python 版本记在文件的 meta 里），在别的机器上先用它 --save 一份自己的。
+
+    python benchmarks/suite.py --save benchmarks/baseline.json
+    python benchmarks/suite.py --compare benchmarks/baseline.json --threshold 0.2
+    python benchmarks/suite.py --sizes 1000 10000 --only scan emit
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import node_lines, rules_text, subscription_body  # noqa: E402
+
+from clashsub.core import (  # noqa: E402
+    build_proxies,
+    decode_subscription_text,
+    dedupe_lines_keep_first,
+    dedupe_proxies,
+    filter_valid_nodes_lines,
+    generate_yaml,
+    normalize_rules_text,
+    scan_nodes,
+)
+from clashsub.rulecompiler import compile_rules  # noqa: E402
+from clashsub.rulematch import build_matcher  # noqa: E402
+from clashsub.rules import assemble_rules, compile_rules_text  # noqa: E402
+
+
+def node_cases(n, seed):
+    text = "\n".join(node_lines(n, seed))
+    body = subscription_body(text)
+    valid, _, _ = filter_valid_nodes_lines(text)
+    unique, _ = dedupe_lines_keep_first(valid)
+    parsed = build_proxies(unique)
+    proxies, _, _ = scan_nodes(text, workers=1, dedupe="first")
+    rules = compile_rules_text(rules_text(1))
+
+    def end_to_end():
+        decoded = decode_subscription_text(body)
+        found, _, _ = scan_nodes(decoded, workers=1, dedupe="first")
+        return generate_yaml(found, assemble_rules(rules, "").text)
+
+    return [
+        (f"decode:{n}", lambda: decode_subscription_text(body)),
+        (f"filter:{n}", lambda: filter_valid_nodes_lines(text)),
+        (f"parse:{n}", lambda: build_proxies(unique)),
+        (f"dedupe:{n}", lambda: dedupe_proxies(parsed, "first")),
+        (f"scan:{n}", lambda: scan_nodes(text, workers=1, dedupe="first")),
+        (f"emit:{n}", lambda: generate_yaml(proxies, rules.text)),
+        (f"e2e:{n}", end_to_end),
+    ]
+
+
+def rule_cases(scale):
+    text = rules_text(scale)
+    # compile_rules / build_matcher 带 lru_cache，计时要绕过缓存
+    return [
+        (f"rules-normalize:x{scale}", lambda: normalize_rules_text(text)),
+        (f"rules-compile:x{scale}", lambda: compile_rules.__wrapped__(text)),
+        (f"rules-matcher:x{scale}", lambda: build_matcher.__wrapped__(text)),
+    ]
+
+
+def measure(fn, repeat, budget):
+    fn()
+    times = []
+    started = time.perf_counter()
+    for i in range(repeat):
+        gc.collect()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+        if i >= 2 and time.perf_counter() - started > budget:
+            break
+    return {"min": min(times), "median": statistics.median(times), "runs": len(times)}
+
+
+def compare(results, baseline, threshold, min_delta):
+    """Cases whose best time regressed by more than `threshold` (and `min_delta` seconds)."""
+    regressions = []
+    for name, r in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        delta = r["min"] - base["min"]
+        if delta > min_delta and r["min"] > base["min"] * (1 + threshold):
+            regressions.append((name, base["min"], r["min"]))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--rules-scale", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--only", nargs="+", help="只跑名字以这些前缀开头的项，如 scan emit rules-compile")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--budget", type=float, default=3.0, help="单项计时的时间上限（秒）")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--save", metavar="PATH", help="把结果写成基线 JSON")
+    ap.add_argument("--compare", metavar="PATH", help="和基线 JSON 比较")
+    ap.add_argument("--threshold", type=float, default=0.2, help="允许的变慢比例，默认 0.2（20%%）")
+    ap.add_argument("--min-delta-ms", type=float, default=0.5, help="小于这个绝对差的变慢不算回归")
+    args = ap.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["cases"]
+
+    cases = []
+    for n in args.sizes:
+        cases.extend(node_cases(n, args.seed))
+    for scale in args.rules_scale:
+        cases.extend(rule_cases(scale))
+    if args.only:
+        cases = [(name, fn) for name, fn in cases if name.startswith(tuple(args.only))]
+
+    results = {}
+    print(f"{'case':<22}{'min ms':>11}{'median ms':>12}{'runs':>6}{'vs base':>10}")
+    for name, fn in cases:
+        r = results[name] = measure(fn, args.repeat, args.budget)
+        base = baseline.get(name)
+        change = f"{(r['min'] / base['min'] - 1) * 100:+8.1f}%" if base else ""
+        print(f"{name:<22}{r['min'] * 1e3:11.2f}{r['median'] * 1e3:12.2f}{r['runs']:6d}{change:>10}")
+
+    if args.save:
+        meta = {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "machine": platform.machine(),
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "seed": args.seed,
+        }
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"meta": meta, "cases": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"基线已写入 {args.save}")
+
+    if args.compare:
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms / 1e3)
+        if regressions:
+            print(f"\n{len(regressions)} 项比基线慢超过 {args.threshold:.0%}：")
+            for name, before, after in regressions:
+                print(f"  {name}: {before * 1e3:.2f} ms -> {after * 1e3:.2f} ms")
+            sys.exit(1)
+        print(f"\n没有超过 {args.threshold:.0%} 的回归")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+"""clashsub: V2Ray 订阅转 Clash Meta 配置的核心逻辑（不依赖 Streamlit）。"""
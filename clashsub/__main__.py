@@ -0,0 +1,5 @@
+import sys
+
+from clashsub.cli import main
+
+sys.exit(main())
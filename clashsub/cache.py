@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+CACHE_TTL = 300
+CACHE_MAX_ENTRIES = 256
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class SubscriptionCache:
+    """
+    URL -> decoded node text, kept in memory (LRU) and mirrored to disk.
+    Each entry also keeps ETag / Last-Modified for conditional revalidation.
+    Entries are evicted least-recently-used first once either
+    `max_entries` or `max_bytes` is exceeded.
+    """
+
+    def __init__(self, cache_dir=None, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.stats = {"hit": 0, "revalidated": 0, "miss": 0, "stale": 0}
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                self._sweep_disk()
+            except OSError:
+                # 目录不可写时退化为纯内存缓存
+                self.cache_dir = None
+
+    @classmethod
+    def from_env(cls):
+        """Builds a cache from CLASHSUB_CACHE_DIR / _TTL / _MAX_MB."""
+        return cls(
+            cache_dir=os.getenv("CLASHSUB_CACHE_DIR", "/opt/clashsub-change/cache"),
+            ttl=float(os.getenv("CLASHSUB_CACHE_TTL", CACHE_TTL)),
+            max_bytes=int(float(os.getenv("CLASHSUB_CACHE_MAX_MB", CACHE_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+        )
+
+    # ---------- 磁盘 ----------
+    def _path(self, url):
+        return os.path.join(self.cache_dir, hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _sweep_disk(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                st = os.stat(path)
+                files.append((st.st_mtime, st.st_size, path))
+        files.sort(reverse=True)
+        total = 0
+        for i, (_, size, path) in enumerate(files):
+            total += size
+            if i >= self.max_entries or total > self.max_bytes:
+                os.remove(path)
+
+    def _load(self, url):
+        try:
+            with open(self._path(url), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("url") != url:
+            return None
+        return entry
+
+    def _save(self, entry):
+        path = self._path(entry["url"])
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except OSError:
+            pass
+
+    def _drop_disk(self, url):
+        try:
+            os.remove(self._path(url))
+        except OSError:
+            pass
+
+    # ---------- 内存 LRU ----------
+    def _insert(self, entry):
+        old = self._entries.pop(entry["url"], None)
+        if old is not None:
+            self._bytes -= old["size"]
+        self._entries[entry["url"]] = entry
+        self._bytes += entry["size"]
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            url, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted["size"]
+            if self.cache_dir:
+                self._drop_disk(url)
+
+    def get(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+        if not self.cache_dir:
+            return None
+        entry = self._load(url)
+        if entry is None:
+            return None
+        with self._lock:
+            self._insert(entry)
+        return entry
+
+    def put(self, url, text, etag=None, last_modified=None):
+        entry = {
+            "url": url,
+            "text": text,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": time.time(),
+            "size": len(text.encode("utf-8")),
+        }
+        with self._lock:
+            self._insert(entry)
+        if self.cache_dir:
+            self._save(entry)
+        return entry
+
+    def touch(self, url):
+        """Marks an entry as freshly validated (after a 304)."""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return
+            entry["fetched_at"] = time.time()
+        if self.cache_dir:
+            self._save(entry)
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def record(self, status):
+        with self._lock:
+            self.stats[status] += 1
+
+    def __len__(self):
+        return len(self._entries)
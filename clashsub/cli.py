@@ -0,0 +1,462 @@
+"""
+Command line entry point, e.g. for cron-driven batch regeneration:
+
+    clashsub convert --in nodes.txt --rules rules.txt -o out.yaml
+    python -m clashsub convert --url https://example.com/sub -o out.yaml
+    clashsub match www.google.com 1.1.1.1
+    clashsub refresh-profiles          # 重新生成到期的已保存订阅并清理静态目录
+
+Only stdlib, clashsub.core and clashsub.ingest are imported up front; the
+rule compiler / matcher / analysis, the output emitters, publishing and
+requests (--url) are imported inside the subcommands that use them.
+"""
+import argparse
+import os
+import sys
+
+from clashsub.core import (
+    DEDUPE_MODES,
+    DEFAULT_RULES_FILE,
+    GROUP_MODES,
+    build_nodes,
+    iter_nodes,
+)
+from clashsub.ingest import SourceTooLarge, iter_chunks, iter_source_lines, iter_source_nodes, max_source_bytes
+
+
+def _format_list(value):
+    from clashsub.emitters import emitter_formats
+
+    try:
+        return emitter_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _compress_list(value):
+    from clashsub.publish import compress_formats
+
+    try:
+        return compress_formats(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _read_text(path):
+    if path == "-":
+        return sys.stdin.buffer.read().decode("utf-8", errors="ignore")
+    with open(path, "rb") as f:
+        return f.read().decode("utf-8", errors="ignore")
+
+
+def _open_source(path, max_bytes):
+    """Binary file object of a node input ("-" is stdin); regular files over `max_bytes` are refused up front."""
+    if path == "-":
+        return sys.stdin.buffer
+    f = open(path, "rb")
+    size = os.fstat(f.fileno()).st_size
+    if size > max_bytes:
+        f.close()
+        raise SourceTooLarge(f"超过单个来源大小上限 {max_bytes / 1024 / 1024:.3g} MB（{size} 字节）")
+    return f
+
+
+def _source_nodes(files, texts, max_bytes):
+    # 本地文件边读边解析，不整体读进内存（base64 / Clash YAML / SIP008 按开头识别）；订阅已经是解码后的文本
+    for f in files:
+        with f:
+            yield from iter_source_nodes(iter_chunks(f), max_bytes=max_bytes, errors="ignore")
+    yield from iter_nodes(texts)
+
+
+def cmd_convert(args):
+    from clashsub.emitters import EMITTERS, missing_fields, render, write_format
+    from clashsub.publish import content_digest, publish
+    from clashsub.rulecompiler import render_rule_providers, split_rule_providers, write_rule_provider_files
+    from clashsub.rules import EMPTY_BLOCK, assemble_rules, load_default_rules
+
+    sources = []
+    files = []
+    contents = []
+    max_bytes = int(args.max_source_mb * 1024 * 1024)
+    if len(args.formats) > 1 and args.output == "-":
+        print("❌ 同时输出多种格式时需要用 -o 指定文件名", file=sys.stderr)
+        return 2
+
+    # 与网页一致的优先级：本地文件在前，订阅链接在后
+    for path in args.inputs:
+        try:
+            files.append(_open_source(path, max_bytes))
+        except (OSError, SourceTooLarge) as e:
+            print(f"❌ 读取文件失败：{path}（{e}）", file=sys.stderr)
+            continue
+        sources.append("stdin" if path == "-" else path)
+
+    if args.urls:
+        from clashsub.fetch import fetch_subscriptions
+
+        for url, text, err, _ in fetch_subscriptions(
+            args.urls, timeout=args.timeout, decode=iter_source_lines, max_bytes=max_bytes
+        ):
+            if err is not None:
+                print(f"❌ 获取订阅失败：{url}（{err}）", file=sys.stderr)
+            elif text.strip():
+                sources.append(url)
+                contents.append(text)
+
+    if not files and not contents:
+        print("⚠️ 没有任何节点输入（--in / --url）", file=sys.stderr)
+        return 1
+
+    use_default = args.rules_mode == "append"
+    default_block = load_default_rules(args.rules, args.optimize_rules) if use_default else EMPTY_BLOCK
+    manual_rules = _read_text(args.manual_rules) if args.manual_rules else ""
+    rules_content = assemble_rules(default_block, manual_rules, use_default).text
+    # sing-box / URI 输出不认识 RULE-SET，用拆分 rule-providers 之前的完整规则
+    full_rules = rules_content
+    if default_block.dropped:
+        _print_dropped_summary(default_block.dropped)
+    if manual_rules.strip():
+        from clashsub.ruleanalysis import analyze_manual_rules
+
+        _print_manual_findings(analyze_manual_rules(assemble_rules(default_block, "", use_default).text, manual_rules))
+
+    rule_providers = ""
+    if args.rule_providers_dir:
+        if not args.rule_providers_url:
+            print("❌ --rule-providers-dir 需要同时指定 --rule-providers-url", file=sys.stderr)
+            return 2
+        providers, rules_content = split_rule_providers(rules_content)
+        written = write_rule_provider_files(providers, args.rule_providers_dir, args.precompress)
+        rule_providers = render_rule_providers(providers, args.rule_providers_url)
+        print(f"📦 rule-providers：{len(providers)} 个（新写入 {written} 个）", file=sys.stderr)
+
+    try:
+        proxies, stats = build_nodes(_source_nodes(files, contents, max_bytes), args.workers, args.dedupe)
+    except (OSError, SourceTooLarge) as e:
+        print(f"❌ 读取输入失败：{e}", file=sys.stderr)
+        return 1
+    if not stats["total_nonempty"]:
+        print("⚠️ 没有任何节点输入（--in / --url）", file=sys.stderr)
+        return 1
+    print(
+        f"📊 非空行 {stats['total_nonempty']}，有效 {stats['valid']}，跳过 {stats['invalid']}，"
+        f"去重丢弃 {stats['dup']}，同一节点合并 {stats['merged']}，解析失败 {stats['failed']}，输出节点 {stats['proxies']}",
+        file=sys.stderr,
+    )
+    if args.verbose:
+        for kept, dropped in stats["merged_nodes"]:
+            print(f"♻️ 合并：保留 {kept}，丢弃 {dropped}", file=sys.stderr)
+    if not proxies:
+        print("❌ 未识别到有效节点，请检查链接格式", file=sys.stderr)
+        return 1
+    if args.probe:
+        from clashsub.probe import probe_proxies
+
+        proxies, dropped, probe_stats = probe_proxies(
+            proxies, args.probe, timeout=args.probe_timeout, deadline=args.probe_deadline
+        )
+        _print_probe_summary(probe_stats)
+        if args.verbose:
+            for p in dropped:
+                print(f"📶 连不上，已去掉：{p.name}（{p.server}:{p.port}）", file=sys.stderr)
+    if args.group_mode == "region":
+        from clashsub.regions import group_by_region
+
+        regions = group_by_region([p.name for p in proxies])
+        print("🗺️ 地区分组：" + "，".join(f"{name} {len(members)}" for name, members in regions), file=sys.stderr)
+
+    options = {"source_url": " | ".join(sources), "group_mode": args.group_mode}
+    # 解析一次，同一份节点记录依次生成每种格式
+    for fmt in args.formats:
+        rules = rules_content if fmt == "clash" else full_rules
+        extra = {"rule_providers": rule_providers} if fmt == "clash" else {}
+        path = args.output
+        if len(args.formats) > 1:
+            path = os.path.splitext(args.output)[0] + EMITTERS[fmt].suffix
+            print(f"🧾 {fmt}：{path}", file=sys.stderr)
+        if fmt != "clash":
+            incomplete = [p for p in proxies if missing_fields(p)]
+            if incomplete:
+                print(f"⚠️ {fmt}：{len(incomplete)} 个节点缺少凭据，未输出", file=sys.stderr)
+                if args.verbose:
+                    for p in incomplete:
+                        print(f"⚠️ 缺少 {' / '.join(missing_fields(p))}：{p.name}", file=sys.stderr)
+        if path == "-":
+            write_format(fmt, sys.stdout, proxies, rules, **options, **extra)
+        elif args.precompress:
+            data = render(fmt, proxies, rules, **options, **extra).encode(args.encoding)
+            try:
+                with open(path, "rb") as f:
+                    previous = content_digest(f.read())
+            except OSError:
+                previous = None
+            result = publish(path, data, args.precompress, previous)
+            _print_publish_summary(result)
+        else:
+            with open(path, "w", encoding=args.encoding) as f:
+                write_format(fmt, f, proxies, rules, **options, **extra)
+    return 0
+
+
+def _print_dropped_summary(dropped):
+    from clashsub.rulecompiler import summarize_dropped
+
+    counts = summarize_dropped(dropped)
+    print(
+        f"🧹 规则精简：重复 {counts['duplicate']}，被覆盖 {counts['shadowed']}，合并 IP 段 {counts['merged']}",
+        file=sys.stderr,
+    )
+
+
+def _print_publish_summary(result):
+    from clashsub.publish import saved_ratio
+
+    sizes = result.sizes
+    line = f"📦 {sizes['raw']} 字节"
+    for fmt in ("gz", "br"):
+        if fmt in sizes:
+            line += f"，.{fmt} {sizes[fmt]} 字节（节省 {saved_ratio(sizes, fmt):.0%}）"
+    if not result.written:
+        line += "；内容未变，没有重写"
+    print(line, file=sys.stderr)
+
+
+def _print_probe_summary(stats):
+    line = (
+        f"📶 连通性测试（{stats['elapsed']:.1f}s）：可连接 {stats['reachable']}，去掉 {stats['dropped']}，"
+        f"未测（UDP 协议 / 超时）{stats['unprobed']}"
+    )
+    if stats["fastest_ms"] is not None:
+        line += f"，最快 {stats['fastest_ms']} ms"
+    if stats["unreachable"] and not stats["dropped"]:
+        line += "；全部连不上，可能是本机网络问题，未删除节点"
+    print(line, file=sys.stderr)
+
+
+def _print_manual_findings(findings):
+    from clashsub.ruleanalysis import PARTIAL, REDUNDANT, UNREACHABLE
+
+    labels = {UNREACHABLE: "不会生效", REDUNDANT: "多余", PARTIAL: "部分被抢先"}
+    for f in findings:
+        print(f"⚠️ 手动规则{labels[f['status']]}：{f['rule']}  <=  {'; '.join(f['by'])}", file=sys.stderr)
+
+
+def cmd_match(args):
+    from clashsub.rulematch import build_matcher
+    from clashsub.rules import EMPTY_BLOCK, assemble_rules, load_default_rules
+
+    use_default = args.rules_mode == "append"
+    default_block = load_default_rules(args.rules, args.optimize_rules) if use_default else EMPTY_BLOCK
+    manual_rules = _read_text(args.manual_rules) if args.manual_rules else ""
+    rules_content = assemble_rules(default_block, manual_rules, use_default).text
+
+    # 每行 "host" 或 "host,期望的策略组"（策略组名里可能有空格，所以用逗号分隔）
+    queries = [(h, None) for h in args.hosts]
+    if args.hosts_file:
+        for line in _read_text(args.hosts_file).splitlines():
+            line = line.strip()
+            if line and not line.startswith("#"):
+                host, _, expected = line.partition(",")
+                queries.append((host.strip(), expected.strip() or None))
+    if not queries:
+        print("⚠️ 没有要查询的主机（HOST / --hosts-file）", file=sys.stderr)
+        return 2
+
+    matcher = build_matcher(rules_content)
+    failed = 0
+    for host, expected in queries:
+        result = matcher.match_host(host, args.ip)
+        line = f"{host}\t{result.target or '-'}\t{result.rule.text if result.rule else '-'}"
+        if result.uncertain is not None:
+            line += f"\t(之前的 {result.uncertain.text} 无法判断)"
+        if expected is not None and expected != result.target:
+            failed += 1
+            line = f"✗ {line}\t(期望 {expected})"
+        print(line)
+    if failed:
+        print(f"❌ {failed} 条与期望不符", file=sys.stderr)
+        return 1
+    return 0
+
+
+def cmd_compile_rules(args):
+    from clashsub.rulecompiler import render_rule_providers, split_rule_providers, write_rule_provider_files
+    from clashsub.rules import compile_rules_text
+
+    try:
+        text = _read_text(args.rules)
+    except OSError as e:
+        print(f"❌ 读取规则失败：{args.rules}（{e}）", file=sys.stderr)
+        return 1
+    block = compile_rules_text(text, optimize=True)
+    if args.verbose:
+        for d in block.dropped:
+            print(f"[{d['reason']}] {d['rule']}  <=  {d['by']}", file=sys.stderr)
+    _print_dropped_summary(block.dropped)
+
+    rules_content = block.text
+    if args.rule_providers_dir:
+        providers, rules_content = split_rule_providers(rules_content)
+        written = write_rule_provider_files(providers, args.rule_providers_dir)
+        print(f"📦 rule-providers：{len(providers)} 个（新写入 {written} 个）", file=sys.stderr)
+        if args.rule_providers_url:
+            sys.stderr.write(render_rule_providers(providers, args.rule_providers_url))
+
+    if args.output == "-":
+        sys.stdout.write(rules_content)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(rules_content)
+    return 0
+
+
+def cmd_refresh_profiles(args):
+    from clashsub.profiles import ProfileStore
+    from clashsub.publish import saved_ratio
+
+    try:
+        store = ProfileStore.from_env()
+    except OSError as e:
+        print(f"❌ 订阅目录不可用：{e}", file=sys.stderr)
+        return 1
+    profiles = store.list() if args.all else store.due()
+    failed = unchanged = 0
+    totals = {}
+    for profile in profiles:
+        profile = store.refresh(profile, timeout=args.timeout)
+        if profile.get("error"):
+            failed += 1
+            print(f"❌ {profile['id']}：{profile['error']}", file=sys.stderr)
+            continue
+        written = profile.get("output_written", True)
+        unchanged += not written
+        for fmt, size in (profile.get("output_sizes") or {}).items():
+            totals[fmt] = totals.get(fmt, 0) + size
+        note = "" if written else "（内容未变，未重写）"
+        print(f"✅ {profile['id']} -> {store.output_path(profile['id'])}{note}", file=sys.stderr)
+    if totals.get("raw"):
+        line = f"📦 {len(profiles) - failed} 个配置共 {totals['raw'] / 1024:.1f} KB，其中 {unchanged} 个内容未变"
+        for fmt in ("gz", "br"):
+            if fmt in totals:
+                line += f"；.{fmt} 共 {totals[fmt] / 1024:.1f} KB（节省 {saved_ratio(totals, fmt):.0%}）"
+        print(line, file=sys.stderr)
+    swept = store.sweep()
+    print(
+        f"🧹 清理：过期 {swept['expired']} 个文件 / {swept['profiles_expired']} 个订阅，"
+        f"超出配额淘汰 {swept['evicted']} 个文件 / {swept['profiles_evicted']} 个订阅，"
+        f"剩余 {swept['bytes'] / 1024 / 1024:.1f} MB",
+        file=sys.stderr,
+    )
+    return 1 if failed else 0
+
+
+def build_parser():
+    ap = argparse.ArgumentParser(prog="clashsub", description="V2Ray 链接转 Clash Meta 配置")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    convert = sub.add_parser("convert", help="转换节点文件 / 订阅链接为 Clash YAML")
+    convert.add_argument("--in", dest="inputs", action="append", default=[], metavar="FILE", help="节点文件，可多次指定，- 表示 stdin")
+    convert.add_argument("--url", dest="urls", action="append", default=[], help="订阅链接，可多次指定（优先级低于 --in）")
+    convert.add_argument("--rules", default=DEFAULT_RULES_FILE, help="默认规则文件（默认 rules.txt）")
+    convert.add_argument("--manual-rules", metavar="FILE", help="手动规则文件，追加在默认规则之后")
+    convert.add_argument(
+        "--rules-mode",
+        choices=["append", "manual"],
+        default="append",
+        help="append：默认规则 + 手动规则；manual：仅手动规则",
+    )
+    convert.add_argument("--optimize-rules", action="store_true", help="精简默认规则：去重、去掉被覆盖的规则、合并 IP 段")
+    convert.add_argument("--rule-providers-dir", metavar="DIR", help="把大规则块拆成 rule-providers 文件写到这个目录")
+    convert.add_argument("--rule-providers-url", metavar="URL", help="rule-providers 文件对外的 URL 前缀")
+    convert.add_argument(
+        "--group-mode",
+        choices=GROUP_MODES,
+        default="inline",
+        help=(
+            "inline：每个分组列出全部节点；provider：节点放进 inline proxy-provider，分组用 use: 引用；"
+            "region：按节点名分成各地区的测速分组，其它分组只列地区分组"
+        ),
+    )
+    convert.add_argument(
+        "--format",
+        dest="formats",
+        type=_format_list,
+        default=("clash",),
+        metavar="clash[,sing-box,uri]",
+        help=(
+            "输出格式，逗号分隔：clash（Clash Meta YAML）、sing-box（JSON）、uri（base64 节点链接列表）；"
+            "多种格式时文件名取 -o 去掉扩展名再加 .yaml / .json / .txt"
+        ),
+    )
+    convert.add_argument("-o", "--output", default="-", help="输出文件，默认 stdout")
+    convert.add_argument("--encoding", default="utf-8", help="输出文件编码（默认 utf-8，与网页版静态文件一致）")
+    convert.add_argument(
+        "--precompress",
+        type=_compress_list,
+        default=(),
+        metavar="gz[,br]",
+        help="同时写出 .gz / .br 预压缩文件（供 nginx gzip_static 使用；br 需要安装 brotli），内容没变时不重写",
+    )
+    convert.add_argument("--timeout", type=float, default=15, help="单个订阅的时限（秒）")
+    convert.add_argument(
+        "--max-source-mb",
+        type=float,
+        default=max_source_bytes() / 1024 / 1024,
+        help="单个文件 / 订阅的大小上限（MB），默认 32 或 CLASHSUB_MAX_SOURCE_MB",
+    )
+    convert.add_argument(
+        "--dedupe",
+        choices=DEDUPE_MODES,
+        default=None,
+        help="同一节点（服务器、端口、凭据等相同）出现多次时保留哪个：first / last / off（默认取 CLASHSUB_NODE_DEDUPE，即 first）",
+    )
+    convert.add_argument("-v", "--verbose", action="store_true", help="逐条列出被合并的节点")
+    convert.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="解析节点的进程数（节点很多时才有用，默认取 CLASHSUB_PARSE_WORKERS，即 1）",
+    )
+    convert.add_argument(
+        "--probe",
+        choices=["tcp", "tls"],
+        default=None,
+        help="输出前并发测试每个节点（TCP 连接 / TLS 握手，没开 TLS 的节点只测连接），去掉连不上的并按延迟排序；hysteria2 / tuic 走 UDP，不测",
+    )
+    convert.add_argument("--probe-timeout", type=float, default=3, help="单个节点的测试时限（秒）")
+    convert.add_argument("--probe-deadline", type=float, default=10, help="测试的整体时限（秒），超时未测完的节点保留")
+    convert.set_defaults(func=cmd_convert)
+
+    match = sub.add_parser("match", help="本地查询主机名 / IP 会命中哪条规则、哪个策略组")
+    match.add_argument("hosts", nargs="*", metavar="HOST", help="域名或 IP")
+    match.add_argument("--hosts-file", metavar="FILE", help="批量查询，每行 host 或 host,期望策略组；有不符时退出码为 1")
+    match.add_argument("--ip", help="域名解析出的 IP（不带 no-resolve 的 IP 规则会用到；不会自己做 DNS 查询）")
+    match.add_argument("--rules", default=DEFAULT_RULES_FILE, help="默认规则文件（默认 rules.txt）")
+    match.add_argument("--manual-rules", metavar="FILE", help="手动规则文件，追加在默认规则之后")
+    match.add_argument("--rules-mode", choices=["append", "manual"], default="append")
+    match.add_argument("--optimize-rules", action="store_true", help="先精简默认规则（结果应与不精简时一致）")
+    match.set_defaults(func=cmd_match)
+
+    compile_ = sub.add_parser("compile-rules", help="精简规则文件并报告被丢弃的规则")
+    compile_.add_argument("--rules", default=DEFAULT_RULES_FILE, help="规则文件（默认 rules.txt），- 表示 stdin")
+    compile_.add_argument("-o", "--output", default="-", help="输出文件，默认 stdout")
+    compile_.add_argument("-v", "--verbose", action="store_true", help="逐条列出被丢弃的规则")
+    compile_.add_argument("--rule-providers-dir", metavar="DIR", help="同时拆分 rule-providers 并写到这个目录")
+    compile_.add_argument("--rule-providers-url", metavar="URL", help="打印对应的 rule-providers 配置块")
+    compile_.set_defaults(func=cmd_compile_rules)
+
+    refresh = sub.add_parser("refresh-profiles", help="重新生成到期的已保存订阅，并清理静态目录（适合 cron）")
+    refresh.add_argument("--all", action="store_true", help="不管是否到期，全部重新生成")
+    refresh.add_argument("--timeout", type=float, default=15, help="单个订阅的时限（秒）")
+    refresh.set_defaults(func=cmd_refresh_profiles)
+    return ap
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
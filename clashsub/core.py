@@ -0,0 +1,712 @@
+"""
+Conversion pipeline shared by the Streamlit page and the headless service:
+decode -> filter -> dedupe -> parse -> merge rules -> generate_yaml.
+
+scan_nodes() does filter -> dedupe -> parse in a single pass over the lines.
+"""
+import base64
+import binascii
+import json
+import os
+import urllib.parse
+from collections import namedtuple
+from functools import lru_cache
+
+from clashsub.formats import iter_body_nodes, sniff_format
+from clashsub.metrics import NODES, PARSE_FAILURES, span
+from clashsub.proxies import Hysteria2Proxy, ProxyRecord, RealityOpts, TuicProxy, VlessProxy, VmessProxy, WsOpts
+from clashsub.regions import REGION_GROUP_TYPE, REGION_GROUP_TYPES, group_by_region
+
+DEFAULT_RULES_FILE = "rules.txt"
+
+ALLOWED_PREFIXES = ("vmess://", "vless://", "hysteria2://", "tuic://")
+
+# Mandatory rules, always placed at the top
+MANDATORY_RULES = """
+- IP-CIDR,45.192.106.85/32,DIRECT
+- DOMAIN-SUFFIX,padaro.top,DIRECT
+"""
+
+
+def safe_base64_decode(s: str) -> str:
+    """
+    Decoded UTF-8 text of a base64 string (standard or URL-safe, padding
+    optional, embedded whitespace allowed), or `s` itself if it is not one.
+    """
+    if not s:
+        return ""
+    s = s.strip()
+    try:
+        # 严格模式快速路径：规范的 base64 一次解完，不做替换和补齐
+        return base64.b64decode(s, validate=True).decode("utf-8")
+    except (binascii.Error, ValueError):
+        pass
+    t = s.replace("-", "+").replace("_", "/")
+    missing_padding = len(t) % 4
+    if missing_padding:
+        t += "=" * (4 - missing_padding)
+    try:
+        return base64.b64decode(t).decode("utf-8")
+    except (binascii.Error, ValueError):
+        return s
+
+
+def safe_name_decode(name: str) -> str:
+    if not name:
+        return "Unknown_Node"
+    try:
+        decoded = urllib.parse.unquote(name)
+        decoded = urllib.parse.unquote(decoded)
+        return decoded
+    except Exception:
+        return name
+
+
+def normalize_nodes_text(text: str) -> str:
+    if not text:
+        return ""
+    return text.replace("|", "\n")
+
+
+def iter_nodes(contents):
+    """
+    Node lines and records (Clash YAML / SIP008 sources, see
+    clashsub.formats) of several decoded texts in order, without joining
+    them into one string.
+    """
+    for text in contents:
+        fmt = sniff_format(text)
+        yield from iter_body_nodes(text.splitlines(), fmt)
+
+
+def decode_subscription_text(raw_content: str) -> str:
+    """
+    Node text of a subscription body: base64 bodies are decoded, Clash YAML
+    and SIP008 JSON are returned as they are (see clashsub.formats), node
+    lines are split on "|".
+    """
+    fmt = sniff_format(raw_content)
+    if fmt in ("clash", "sip008"):
+        return raw_content
+    if fmt == "base64":
+        decoded_n = normalize_nodes_text(safe_base64_decode(raw_content))
+        if any(p in decoded_n for p in ALLOWED_PREFIXES):
+            return decoded_n
+    return normalize_nodes_text(raw_content)
+
+
+NODE_SCHEMES = ("vmess", "vless", "hysteria2", "tuic")
+
+
+def classify_line(line: str):
+    """Protocol name of a stripped node line, or None if unsupported."""
+    scheme, sep, _ = line.partition("://")
+    if sep and scheme in NODE_SCHEMES:
+        return scheme
+    return None
+
+
+def filter_valid_nodes_lines(text: str):
+    valid_lines = []
+    invalids = []
+    total_nonempty = 0
+    proto_count = dict.fromkeys(NODE_SCHEMES, 0)
+
+    for idx, raw in enumerate(text.splitlines(), start=1):
+        line = raw.strip()
+        if not line:
+            continue
+        total_nonempty += 1
+
+        proto = classify_line(line)
+        if proto is not None:
+            proto_count[proto] += 1
+            valid_lines.append(line)
+        else:
+            invalids.append((idx, line))
+
+    stats = {
+        "total_nonempty": total_nonempty,
+        "valid": len(valid_lines),
+        "invalid": len(invalids),
+        "proto_count": proto_count,
+    }
+    return valid_lines, invalids, stats
+
+
+def dedupe_lines_keep_first(lines):
+    seen = set()
+    deduped = []
+    dup_count = 0
+    for line in lines:
+        key = line.strip()
+        if not key:
+            continue
+        if key in seen:
+            dup_count += 1
+            continue
+        seen.add(key)
+        deduped.append(line)
+    return deduped, dup_count
+
+
+def normalize_rules_text(text: str) -> str:
+    """
+    Normalizes rule lines:
+    1. Splits into lines.
+    2. Strips ALL existing whitespace (handling 0, 1, 3+ spaces).
+    3. Adds exactly 2 spaces indentation.
+    4. Ensures trailing newline.
+    """
+    if not text:
+        return ""
+
+    normalized_lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        # Enforce "  " prefix
+        normalized_lines.append(f"  {stripped}")
+
+    if not normalized_lines:
+        return ""
+
+    return "\n".join(normalized_lines) + "\n"
+
+
+def merge_rules(default_rules: str, manual_rules: str, use_default: bool = True) -> str:
+    """
+    MANDATORY_RULES always come first, then the default rules (unless
+    `use_default` is False), then the manual rules; all normalized.
+    """
+    manual_rules = manual_rules.strip() if manual_rules else ""
+    if use_default:
+        raw_rules_content = MANDATORY_RULES + "\n" + (default_rules or "") + "\n" + manual_rules
+    else:
+        raw_rules_content = MANDATORY_RULES + "\n" + manual_rules
+    return normalize_rules_text(raw_rules_content)
+
+
+def load_rules_file(path: str) -> str:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except (OSError, UnicodeDecodeError):
+        return ""
+
+
+# 和 urllib.parse.urlparse 结果里解析器用到的那几个属性同名
+NodeURL = namedtuple("NodeURL", ["hostname", "port", "username", "password", "query", "fragment"])
+
+
+@lru_cache(maxsize=4096)
+def parse_query(query: str):
+    """
+    parse_qs, cached: nodes from one provider usually share the whole query
+    string (sni / type / security / ...). The result must not be mutated.
+    """
+    return urllib.parse.parse_qs(query)
+
+
+def split_node_url(line: str):
+    """
+    Same fields as urllib.parse.urlparse(line) for the plain
+    scheme://user@host:port?query#name shape, without the general-purpose
+    overhead. Bracketed IPv6 hosts, non-ASCII hosts and tabs fall back to
+    urlparse. Raises ValueError for a bad port (urlparse's .port does too).
+    """
+    _, _, rest = line.partition("://")
+    end = len(rest)
+    for c in "/?#":
+        i = rest.find(c, 0, end)
+        if i != -1:
+            end = i
+    netloc = rest[:end]
+    if "[" in netloc or "]" in netloc or "\t" in line or not netloc.isascii():
+        return urllib.parse.urlparse(line)
+    tail, _, fragment = rest[end:].partition("#")
+    _, _, query = tail.partition("?")
+
+    userinfo, at, hostinfo = netloc.rpartition("@")
+    username = password = None
+    if at:
+        username, colon, password = userinfo.partition(":")
+        if not colon:
+            password = None
+    host, _, port = hostinfo.partition(":")
+    if port:
+        if not port.isdigit():
+            raise ValueError(f"Port could not be cast to integer value as {port!r}")
+        port = int(port)
+        if port > 65535:
+            raise ValueError("Port out of range 0-65535")
+    else:
+        port = None
+    # 与 urllib 一致：% 之后（IPv6 zone）不转小写
+    host, percent, zone = host.partition("%")
+    return NodeURL((host.lower() + percent + zone) or None, port, username, password, query, fragment)
+
+
+def parse_vmess(url_body: str):
+    try:
+        json_str = safe_base64_decode(url_body)
+        data = json.loads(json_str)
+        raw_name = data.get("ps", "vmess")
+        name = safe_name_decode(raw_name)
+        network = data.get("net", "ws")
+        ws = None
+        if network == "ws":
+            ws = WsOpts(data.get("path", "/"), data.get("host", data.get("add")))
+        return VmessProxy(
+            name,
+            data.get("add"),
+            int(data.get("port")),
+            uuid=data.get("id"),
+            alter_id=int(data.get("aid", 0)),
+            cipher=data.get("scy", "auto"),
+            network=network,
+            tls=True if data.get("tls") == "tls" or data.get("tls") is True else False,
+            skip_cert_verify=True if data.get("verify_cert") is False else False,
+            ws=ws,
+        )
+    except Exception:
+        return None
+
+
+def parse_vless(parsed_url):
+    params = parse_query(parsed_url.query)
+    network = params.get("type", ["tcp"])[0]
+    raw_name = parsed_url.fragment
+    name = safe_name_decode(raw_name) if raw_name else "vless_node"
+    server = parsed_url.hostname
+    servername = params.get("sni", [""])[0]
+
+    ws = None
+    if network == "ws":
+        host = params.get("host", [""])[0]
+        if not host:
+            host = servername or server
+        ws = WsOpts(params.get("path", ["/"])[0], host)
+    flow = None
+    if network == "tcp":
+        flow = params.get("flow", [""])[0] or None
+    security = params.get("security", [""])[0]
+    reality = None
+    if security == "reality":
+        sid = params.get("sid", params.get("shortId", params.get("short-id", [])))
+        reality = RealityOpts(params.get("pbk", [""])[0], sid[0] if sid else None)
+
+    return VlessProxy(
+        name,
+        server,
+        parsed_url.port,
+        uuid=parsed_url.username,
+        network=network,
+        servername=servername,
+        skip_cert_verify=True if params.get("allowInsecure", ["0"])[0] == "1" else False,
+        client_fingerprint=params["fp"][0] if "fp" in params else "chrome",
+        flow=flow,
+        ws=ws,
+        reality=reality,
+        # 没写 security 的链接按 TLS 处理（与之前的输出一致），明确写了 none 的是明文
+        tls=security != "none",
+    )
+
+
+def parse_hysteria2(parsed_url):
+    params = parse_query(parsed_url.query)
+    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "hysteria2_node"
+    return Hysteria2Proxy(
+        name,
+        parsed_url.hostname,
+        parsed_url.port,
+        password=parsed_url.username,
+        sni=params.get("sni", [""])[0],
+        skip_cert_verify=True if params.get("insecure", ["0"])[0] == "1" else False,
+    )
+
+
+def parse_tuic(parsed_url):
+    params = parse_query(parsed_url.query)
+    raw_user_info = parsed_url.username if parsed_url.username else ""
+    decoded_info = urllib.parse.unquote(raw_user_info)
+    if ":" in decoded_info:
+        user_parts = decoded_info.split(":", 1)
+        uuid_val = user_parts[0]
+        password_val = user_parts[1]
+    else:
+        uuid_val = decoded_info
+        password_val = urllib.parse.unquote(parsed_url.password) if parsed_url.password else ""
+    name = safe_name_decode(parsed_url.fragment) if parsed_url.fragment else "tuic_node"
+
+    return TuicProxy(
+        name,
+        parsed_url.hostname,
+        parsed_url.port,
+        uuid=uuid_val,
+        password=password_val,
+        sni=params.get("sni", [""])[0],
+        congestion_controller=params.get("congestion_control", ["bbr"])[0],
+        skip_cert_verify=True if params.get("insecure", ["0"])[0] == "1" else False,
+        alpn=[params["alpn"][0]] if "alpn" in params else None,
+    )
+
+
+# scheme -> 解析函数（参数为整行），分类和解析共用这一张表
+NODE_PARSERS = {
+    "vmess": lambda line: parse_vmess(line[8:]),
+    "vless": lambda line: parse_vless(split_node_url(line)),
+    "hysteria2": lambda line: parse_hysteria2(split_node_url(line)),
+    "tuic": lambda line: parse_tuic(split_node_url(line)),
+}
+
+
+def parse_node_line(line: str):
+    proto = classify_line(line)
+    if proto is None:
+        return None
+    return NODE_PARSERS[proto](line)
+
+
+def _try_parse(proto, line):
+    try:
+        return NODE_PARSERS[proto](line)
+    except Exception:
+        return None
+
+
+def _rename_duplicates(proxies):
+    """Duplicate names get a _1, _2... suffix, in order."""
+    name_counter = {}
+    kept = []
+    for p in proxies:
+        o_name = p.name
+        try:
+            seen = o_name in name_counter
+        except TypeError:
+            # vmess 的 ps 可能是任意 JSON（列表 / 对象），这种节点和以前一样丢弃
+            continue
+        if seen:
+            name_counter[o_name] += 1
+            p = p.renamed(f"{o_name}_{name_counter[o_name]}")
+        else:
+            name_counter[o_name] = 0
+        kept.append(p)
+    return kept
+
+
+def build_proxies(lines):
+    """Parses node lines in order; duplicate names get a _1, _2... suffix."""
+    proxies = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        proto = classify_line(line)
+        if proto is not None:
+            p = _try_parse(proto, line)
+            if p:
+                proxies.append(p)
+    return _rename_duplicates(proxies)
+
+
+# 超过这么多行、且 workers > 1 时才用进程池解析；进程间传递结果本身也有开销
+PARALLEL_MIN_LINES = 20000
+PARSE_WORKERS = int(os.getenv("CLASHSUB_PARSE_WORKERS", "1"))
+
+
+def _parse_chunk(chunk):
+    return [_try_parse(proto, line) for proto, line in chunk]
+
+
+def _parse_parallel(items, workers):
+    from concurrent.futures import ProcessPoolExecutor
+
+    size = -(-len(items) // (workers * 4))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return [p for part in pool.map(_parse_chunk, chunks) for p in part]
+
+
+# 同一个节点（identity 相同）出现多次时保留哪一个；off 表示只去掉逐字节相同的行
+DEDUPE_MODES = ("first", "last", "off")
+NODE_DEDUPE = os.getenv("CLASHSUB_NODE_DEDUPE", "first")
+
+
+def dedupe_proxies(proxies, keep="first"):
+    """
+    Merges proxies with the same endpoint identity (see ProxyRecord.identity),
+    in O(n) with one dict. keep="first" keeps the earliest occurrence (inputs
+    are in priority order), "last" the latest. Returns (kept, merged) where
+    merged is a list of (kept_proxy, dropped_proxy).
+    """
+    if keep not in DEDUPE_MODES:
+        raise ValueError(f"unknown dedupe mode: {keep}")
+    if keep == "off":
+        return proxies, []
+    ordered = proxies if keep == "first" else proxies[::-1]
+    index = {}
+    kept = []
+    merged = []
+    for p in ordered:
+        try:
+            winner = index.setdefault(p.identity(), p)
+        except TypeError:
+            # vmess 字段可能是任意 JSON，算不出 key 的节点不合并
+            winner = p
+        if winner is p:
+            kept.append(p)
+        else:
+            merged.append((winner, p))
+    if keep == "last":
+        kept.reverse()
+        merged.reverse()
+    return kept, merged
+
+
+def scan_nodes(text, workers: int = None, dedupe: str = None, memo=None):
+    """
+    filter -> dedupe -> parse in one pass: each line is stripped, classified
+    and parsed once. `text` is decoded node text or any iterable of lines
+    (e.g. clashsub.ingest.iter_source_lines, consumed as it goes); the
+    iterable may also hold ready proxy records (iter_nodes() yields them for
+    Clash YAML / SIP008 sources), which skip classification and parsing and
+    keep their place in the order. Returns (proxies, invalids, stats); stats has the
+    filter_valid_nodes_lines keys plus "dup", "structured" (records given as
+    such) and "proxies", and "merged" /
+    "merged_nodes" (list of (kept name, dropped name)) for nodes merged by
+    dedupe_proxies with `dedupe` as the keep mode, "failed" / "failed_by_proto"
+    (unique lines that did not parse), and "parsed" / "reused" (lines
+    actually parsed vs taken from the memo).
+    With workers > 1 and at least PARALLEL_MIN_LINES unique lines, parsing
+    fans out over a process pool; the output is the same. With a ParseMemo
+    (clashsub.memo), lines parsed by an earlier call are not parsed again.
+    """
+    workers = PARSE_WORKERS if workers is None else workers
+    dedupe = NODE_DEDUPE if dedupe is None else dedupe
+    proto_count = dict.fromkeys(NODE_SCHEMES, 0)
+    invalids = []
+    seen = set()
+    items = []
+    total_nonempty = 0
+    dup_count = 0
+    structured = 0
+
+    lines = text.splitlines() if isinstance(text, str) else text
+    with span("scan"):
+        for idx, raw in enumerate(lines, start=1):
+            if isinstance(raw, ProxyRecord):
+                # 结构化来源已经是记录，不参与按行去重，同一节点交给 dedupe_proxies 合并
+                total_nonempty += 1
+                structured += 1
+                proto_count[raw.type] = proto_count.get(raw.type, 0) + 1
+                items.append((raw.type, raw))
+                continue
+            line = raw.strip()
+            if not line:
+                continue
+            total_nonempty += 1
+            proto = classify_line(line)
+            if proto is None:
+                invalids.append((idx, line))
+                continue
+            proto_count[proto] += 1
+            if line in seen:
+                dup_count += 1
+                continue
+            seen.add(line)
+            items.append((proto, line))
+
+    memo_hits = 0
+    todo = [item for item in items if type(item[1]) is str] if structured else items
+    with span("parse"):
+        if memo is not None:
+            parsed, memo_hits = memo.parse_many(todo)
+        elif workers > 1 and len(todo) >= PARALLEL_MIN_LINES:
+            parsed = _parse_parallel(todo, workers)
+        else:
+            parsed = [_try_parse(proto, line) for proto, line in todo]
+    # 以前解析失败的行被静默丢掉，这里按协议计数
+    failed = dict.fromkeys(NODE_SCHEMES, 0)
+    for (proto, _), p in zip(todo, parsed):
+        if p is None:
+            failed[proto] += 1
+    if structured:
+        done = iter(parsed)
+        parsed = [next(done) if type(item) is str else item for _, item in items]
+    with span("dedupe"):
+        proxies, merged = dedupe_proxies([p for p in parsed if p], dedupe)
+        proxies = _rename_duplicates(proxies)
+
+    for proto, count in proto_count.items():
+        if count:
+            NODES.inc(count, protocol=proto)
+    for proto, count in failed.items():
+        if count:
+            PARSE_FAILURES.inc(count, protocol=proto)
+
+    stats = {
+        "total_nonempty": total_nonempty,
+        "valid": total_nonempty - len(invalids),
+        "invalid": len(invalids),
+        "proto_count": proto_count,
+        "dup": dup_count,
+        "structured": structured,
+        "merged": len(merged),
+        "merged_nodes": [(k.name, d.name) for k, d in merged],
+        "proxies": len(proxies),
+        "failed": sum(failed.values()),
+        "failed_by_proto": failed,
+        "parsed": len(todo) - memo_hits,
+        "reused": memo_hits,
+    }
+    return proxies, invalids, stats
+
+
+PROXY_GROUPS = [
+    {"name": "🚀 节点选择", "type": "select", "special": ["♻️ 自动选择", "DIRECT"]},
+    {
+        "name": "♻️ 自动选择",
+        "type": "url-test",
+        "url": "http://www.gstatic.com/generate_204",
+        "interval": 300,
+        "tolerance": 50,
+        "special": [],
+    },
+    {"name": "🌍 国外媒体", "type": "select", "special": ["🚀 节点选择", "♻️ 自动选择", "🎯 全球直连"]},
+    {"name": "📲 电报信息", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
+    {"name": "Ⓜ️ 微软服务", "type": "select", "special": ["🎯 全球直连", "🚀 节点选择"]},
+    {"name": "🍎 苹果服务", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连"]},
+    {"name": "📢 谷歌FCM", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
+    {"name": "🎯 全球直连", "type": "select", "base": ["DIRECT", "🚀 节点选择", "♻️ 自动选择"], "no_proxies": True},
+    {"name": "🛑 全球拦截", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
+    {"name": "🍃 应用净化", "type": "select", "base": ["REJECT", "DIRECT"], "no_proxies": True},
+    {"name": "🐟 漏网之鱼", "type": "select", "special": ["🚀 节点选择", "🎯 全球直连", "♻️ 自动选择"]},
+]
+
+# group_mode="provider" 时所有节点放进这个 inline proxy-provider，分组用 use: 引用
+PROVIDER_NAME = "全部节点"
+# group_mode="region" 时节点按名字分进各地区的测速分组，上面的分组只引用地区分组
+GROUP_MODES = ("inline", "provider", "region")
+
+
+def emit_proxy(p, indent="  "):
+    """One proxy entry as a single string; `indent` is the list-item indentation."""
+    return p.emit(indent)
+
+
+@lru_cache(maxsize=None)
+def _group_skeleton(group_mode):
+    """Fixed part of each proxy group, rendered once: ((chunk, takes_node_names), ...)."""
+    out = []
+    for g in PROXY_GROUPS:
+        chunk = [f'  - name: "{g["name"]}"\n', f"    type: {g['type']}\n"]
+        if "url" in g:
+            chunk.append(f"    url: {g['url']}\n")
+            chunk.append(f"    interval: {g['interval']}\n")
+            chunk.append(f"    tolerance: {g['tolerance']}\n")
+
+        fixed = g.get("base", []) + g.get("special", [])
+        with_nodes = not g.get("no_proxies", False)
+        if group_mode == "provider" and with_nodes:
+            chunk.append(f'    use:\n      - "{PROVIDER_NAME}"\n')
+        if fixed or group_mode != "provider":
+            chunk.append("    proxies:\n")
+            chunk.extend(f'      - "{name}"\n' for name in fixed)
+        out.append(("".join(chunk), with_nodes))
+    return tuple(out)
+
+
+def _region_group(name, members, group_type):
+    """One regional health-check group; lazy, so only regions in use are probed."""
+    auto = PROXY_GROUPS[1]
+    chunk = f'  - name: "{name}"\n    type: {group_type}\n    url: {auto["url"]}\n    interval: {auto["interval"]}\n'
+    if group_type == "url-test":
+        chunk += f"    tolerance: {auto['tolerance']}\n"
+    chunk += "    lazy: true\n    proxies:\n"
+    return chunk + "".join(f'      - "{m}"\n' for m in members)
+
+
+def iter_yaml(proxies, rules_content, source_url="", group_mode="inline", rule_providers="", memo=None):
+    """
+    Yields the Clash config in chunks; total work is linear in the output size.
+    group_mode="inline" lists every proxy name in each group (the classic output);
+    "provider" moves the proxies into an inline proxy-provider referenced via `use:`;
+    "region" sorts the proxies by name into per-region url-test groups
+    (clashsub.regions) and the other groups list those instead of every node, so
+    each name is written once and "♻️ 自动选择" probes one node per region.
+    `rule_providers` is a pre-rendered `rule-providers:` block, emitted before `rules:`.
+    With a ParseMemo, proxy entries already rendered for an earlier request are reused.
+    """
+    if group_mode not in GROUP_MODES:
+        raise ValueError(f"unknown group_mode: {group_mode}")
+    if group_mode == "region" and REGION_GROUP_TYPE not in REGION_GROUP_TYPES:
+        raise ValueError(f"unknown region group type: {REGION_GROUP_TYPE}")
+    emit = memo.emit if memo is not None else emit_proxy
+
+    # 去掉名字里的引号；记录本身不改，名字变了的换成副本
+    proxies = [p.renamed(p.name.replace('"', "").replace("'", "").strip()) for p in proxies]
+    proxy_names = [p.name for p in proxies]
+
+    if source_url:
+        yield f"# Source Subscription: {source_url}\n"
+    yield "mixed-port: 7890\nallow-lan: true\nmode: Rule\nlog-level: info\nexternal-controller: :9090\n"
+
+    if group_mode == "provider":
+        yield f'proxy-providers:\n  "{PROVIDER_NAME}":\n    type: inline\n    payload:\n'
+        for p in proxies:
+            yield emit(p, "      ")
+        names_block = ""
+    else:
+        yield "proxies:\n"
+        for p in proxies:
+            yield emit(p, "  ")
+        if group_mode == "region":
+            regions = group_by_region(proxy_names)
+            proxy_names = [name for name, _ in regions]
+        # 每个分组的节点名列表完全相同，只拼一次
+        names_block = "".join(f'      - "{name}"\n' for name in proxy_names)
+
+    yield "proxy-groups:\n"
+    for chunk, with_nodes in _group_skeleton(group_mode):
+        yield chunk
+        if with_nodes:
+            yield names_block
+    if group_mode == "region":
+        for name, members in regions:
+            yield _region_group(name, members, REGION_GROUP_TYPE)
+
+    if rule_providers:
+        yield rule_providers
+    yield "rules:\n"
+    yield rules_content
+
+
+def write_yaml(fp, proxies, rules_content, source_url="", group_mode="inline", rule_providers="", memo=None):
+    """Streams the config into a text file / response object."""
+    with span("emit"):
+        for chunk in iter_yaml(proxies, rules_content, source_url, group_mode, rule_providers, memo):
+            fp.write(chunk)
+
+
+def generate_yaml(proxies, rules_content, source_url="", group_mode="inline", rule_providers="", memo=None):
+    with span("emit"):
+        return "".join(iter_yaml(proxies, rules_content, source_url, group_mode, rule_providers, memo))
+
+
+def build_nodes(nodes_text, workers: int = None, dedupe: str = None, memo=None):
+    """filter -> dedupe -> parse on already-decoded text (or lines). Returns (proxies, stats)."""
+    proxies, _, stats = scan_nodes(nodes_text, workers, dedupe, memo)
+    return proxies, stats
+
+
+def convert_nodes_text(nodes_text: str, rules_content: str, source_url: str = "", group_mode: str = "inline"):
+    """
+    Full node pipeline on already-decoded text.
+    Returns (yaml_or_None, stats); yaml is None when no proxy could be parsed.
+    """
+    proxies, stats = build_nodes(nodes_text)
+    if not proxies:
+        return None, stats
+    return generate_yaml(proxies, rules_content, source_url, group_mode), stats
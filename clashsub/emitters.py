@@ -0,0 +1,420 @@
+"""
+Output formats over the parsed proxy records and the rule set.
+
+An Emitter turns (proxies, rules_content, options) into text chunks. The
+records come from one scan_nodes() call and are only read, so any number of
+formats can be rendered from the same list without fetching or parsing
+again (render_many()). Built in:
+
+- "clash": Clash Meta YAML, core.iter_yaml() (the classic output)
+- "sing-box": sing-box JSON config: one outbound per node, the proxy groups
+  as selector / urltest outbounds, Clash rules as route rules
+- "uri": base64 URI list, the usual subscription format for other clients
+
+More formats can be added with register_emitter(). Options an emitter does
+not use are ignored: source_url, group_mode ("inline" / "provider" /
+"region"), rule_providers and memo.
+"""
+import base64
+import json
+import urllib.parse
+from collections import namedtuple
+
+from clashsub.core import PROXY_GROUPS, iter_yaml
+from clashsub.metrics import span
+from clashsub.regions import group_by_region
+from clashsub.rulecompiler import parse_rules
+
+Emitter = namedtuple("Emitter", ["name", "suffix", "content_type", "iter_chunks"])
+Emitter.__doc__ = """
+`iter_chunks(proxies, rules_content, **options)` yields str chunks;
+`suffix` is the file extension, `content_type` the HTTP Content-Type.
+"""
+
+EMITTERS = {}
+
+
+def register_emitter(emitter):
+    EMITTERS[emitter.name] = emitter
+    return emitter
+
+
+def emitter_formats(value):
+    """Parses "clash,sing-box" into a tuple of registered format names."""
+    formats = []
+    for name in (v.strip() for v in value.split(",")):
+        if not name:
+            continue
+        if name not in EMITTERS:
+            raise ValueError(f"输出格式只支持 {' / '.join(EMITTERS)}：{name}")
+        if name not in formats:
+            formats.append(name)
+    return tuple(formats)
+
+
+def render(fmt, proxies, rules_content, **options):
+    with span("emit", fmt):
+        return "".join(EMITTERS[fmt].iter_chunks(proxies, rules_content, **options))
+
+
+def write_format(fmt, fp, proxies, rules_content, **options):
+    """Streams one format into a text file / response object."""
+    with span("emit", fmt):
+        for chunk in EMITTERS[fmt].iter_chunks(proxies, rules_content, **options):
+            fp.write(chunk)
+
+
+def render_many(formats, proxies, rules_content, **options):
+    """{format: text} for each format, all from the same records."""
+    return {fmt: render(fmt, proxies, rules_content, **options) for fmt in formats}
+
+
+# 每种节点类型写成链接 / sing-box outbound 时必需的凭据字段
+REQUIRED_FIELDS = {
+    "vmess": ("uuid",),
+    "vless": ("uuid",),
+    "hysteria2": ("password",),
+    "tuic": ("uuid", "password"),
+    "ss": ("cipher", "password"),
+}
+
+
+def missing_fields(p):
+    """
+    Fields a URI / sing-box entry of `p` needs that the record leaves empty
+    (None or ""). Such records are skipped by those formats instead of
+    writing "None" into the output.
+    """
+    fields = ("server", "port") + REQUIRED_FIELDS.get(p.type, ())
+    return [f for f in fields if getattr(p, f) in (None, "")]
+
+
+# ---- Clash ----------------------------------------------------------------
+
+
+def iter_clash(proxies, rules_content, source_url="", group_mode="inline", rule_providers="", memo=None, **_):
+    return iter_yaml(proxies, rules_content, source_url, group_mode, rule_providers, memo)
+
+
+# ---- sing-box -------------------------------------------------------------
+
+SINGBOX_GEOIP_URL = "https://raw.githubusercontent.com/SagerNet/sing-geoip/rule-set/geoip-{}.srs"
+SINGBOX_GEOSITE_URL = "https://raw.githubusercontent.com/SagerNet/sing-geosite/rule-set/geosite-{}.srs"
+
+# 目标地址类的条件在 sing-box 的同一条规则里是“或”的关系，相邻且目标相同的规则合并成一条
+_SB_DEST = {
+    "DOMAIN": "domain",
+    "DOMAIN-SUFFIX": "domain_suffix",
+    "DOMAIN-KEYWORD": "domain_keyword",
+    "DOMAIN-REGEX": "domain_regex",
+    "IP-CIDR": "ip_cidr",
+    "IP-CIDR6": "ip_cidr",
+}
+_SB_OTHER = {
+    "SRC-IP-CIDR": "source_ip_cidr",
+    "DST-PORT": "port",
+    "SRC-PORT": "source_port",
+    "PROCESS-NAME": "process_name",
+    "PROCESS-PATH": "process_path",
+}
+
+
+def _sb_tls(server_name, insecure, **extra):
+    tls = {"enabled": True, "insecure": bool(insecure)}
+    if server_name:
+        tls["server_name"] = server_name
+    tls.update(extra)
+    return tls
+
+
+def _sb_transport(network, ws):
+    if network == "ws" and ws is not None:
+        return {"type": "ws", "path": ws.path, "headers": {"Host": ws.host}}
+    if network == "grpc":
+        return {"type": "grpc"}
+    return None
+
+
+def _sb_vmess(p):
+    out = {"security": p.cipher, "uuid": p.uuid, "alter_id": p.alter_id}
+    if p.tls:
+        out["tls"] = _sb_tls(p.ws.host if p.ws else None, p.skip_cert_verify)
+    transport = _sb_transport(p.network, p.ws)
+    if transport:
+        out["transport"] = transport
+    return out
+
+
+def _sb_vless(p):
+    out = {"uuid": p.uuid}
+    if p.tls or p.reality is not None:
+        tls = _sb_tls(p.servername, p.skip_cert_verify, utls={"enabled": True, "fingerprint": p.client_fingerprint})
+        if p.reality is not None:
+            tls["reality"] = {"enabled": True, "public_key": p.reality.public_key}
+            if p.reality.short_id is not None:
+                tls["reality"]["short_id"] = str(p.reality.short_id)
+        out["tls"] = tls
+    if p.flow is not None:
+        out["flow"] = p.flow
+    transport = _sb_transport(p.network, p.ws)
+    if transport:
+        out["transport"] = transport
+    return out
+
+
+def _sb_hysteria2(p):
+    return {"password": p.password, "tls": _sb_tls(p.sni, p.skip_cert_verify)}
+
+
+def _sb_tuic(p):
+    tls = _sb_tls(p.sni, p.skip_cert_verify, disable_sni=p.disable_sni)
+    if p.alpn is not None:
+        tls["alpn"] = list(p.alpn)
+    return {
+        "uuid": p.uuid,
+        "password": p.password,
+        "congestion_control": p.congestion_controller,
+        "udp_relay_mode": "native",
+        "tls": tls,
+    }
+
+
+# Clash 插件名 -> SIP003 插件名
+_SS_PLUGINS = {"obfs": ("obfs-local", {"mode": "obfs", "host": "obfs-host"}), "v2ray-plugin": ("v2ray-plugin", {})}
+
+
+def _plugin_opts(opts, rename):
+    parts = []
+    for k, v in opts:
+        k = rename.get(k, k)
+        if v is True:
+            parts.append(k)
+        elif v is not False and v is not None:
+            parts.append(f"{k}={v}")
+    return ";".join(parts)
+
+
+def _sb_ss(p):
+    out = {"method": p.cipher, "password": p.password}
+    if p.plugin is not None:
+        plugin, rename = _SS_PLUGINS.get(p.plugin, (p.plugin, {}))
+        out["plugin"] = plugin
+        out["plugin_opts"] = _plugin_opts(p.plugin_opts, rename)
+    return out
+
+
+SINGBOX_OUTBOUNDS = {
+    "vmess": _sb_vmess,
+    "vless": _sb_vless,
+    "hysteria2": _sb_hysteria2,
+    "tuic": _sb_tuic,
+    "ss": _sb_ss,
+}
+
+
+def singbox_outbound(p):
+    """
+    sing-box outbound dict of a proxy record, or None for a type sing-box
+    output does not cover or a record with missing_fields().
+    """
+    build = SINGBOX_OUTBOUNDS.get(p.type)
+    if build is None or missing_fields(p):
+        return None
+    out = {"type": "shadowsocks" if p.type == "ss" else p.type, "tag": p.name, "server": p.server, "server_port": p.port}
+    out.update(build(p))
+    return out
+
+
+def singbox_route(rules_content):
+    """
+    (rules, rule_sets, final) of a Clash rule list. GEOIP / GEOSITE become
+    remote rule sets; logical rules, RULE-SET and other types sing-box has
+    no direct match for are left out.
+    """
+    rules = []
+    rule_sets = {}
+    final = None
+    last_target = None
+    for r in parse_rules(rules_content):
+        if isinstance(r, str) or r.target is None:
+            continue
+        if r.kind == "MATCH":
+            final = r.target
+            break
+        if r.kind in _SB_DEST:
+            key = _SB_DEST[r.kind]
+            value = str(r.net) if r.net is not None else r.value
+            if last_target == r.target:
+                rules[-1].setdefault(key, []).append(value)
+            else:
+                rules.append({key: [value], "outbound": r.target})
+                last_target = r.target
+            continue
+        last_target = None
+        if r.kind in _SB_OTHER:
+            key = _SB_OTHER[r.kind]
+            value = int(r.value) if key.endswith("port") and r.value.isdigit() else r.value
+            rules.append({key: [value], "outbound": r.target})
+        elif r.kind == "GEOIP" and r.value.upper() in ("LAN", "PRIVATE"):
+            rules.append({"ip_is_private": True, "outbound": r.target})
+        elif r.kind in ("GEOIP", "GEOSITE"):
+            kind = "geoip" if r.kind == "GEOIP" else "geosite"
+            tag = f"{kind}-{r.value.lower()}"
+            url = (SINGBOX_GEOIP_URL if kind == "geoip" else SINGBOX_GEOSITE_URL).format(r.value.lower())
+            rule_sets.setdefault(tag, {"tag": tag, "type": "remote", "format": "binary", "url": url})
+            rules.append({"rule_set": [tag], "outbound": r.target})
+    return rules, list(rule_sets.values()), final
+
+
+def iter_singbox(proxies, rules_content, group_mode="inline", **_):
+    """
+    sing-box config (1.8+ schema, mixed inbound on 7890). The proxy groups
+    follow PROXY_GROUPS like the Clash output; url-test groups become urltest
+    outbounds. group_mode="region" adds the regional groups, "provider" has
+    no sing-box counterpart and is rendered like "inline".
+    """
+    nodes = []
+    for p in proxies:
+        out = singbox_outbound(p)
+        if out is not None:
+            nodes.append(out)
+    members = [n["tag"] for n in nodes]
+    regions = []
+    if group_mode == "region":
+        regions = group_by_region(members)
+        members = [name for name, _ in regions]
+
+    auto = PROXY_GROUPS[1]
+    test = {"url": auto["url"], "interval": f"{auto['interval']}s", "tolerance": auto["tolerance"]}
+    groups = []
+    for g in PROXY_GROUPS:
+        outbounds = g.get("base", []) + g.get("special", [])
+        if not g.get("no_proxies", False):
+            outbounds = outbounds + members
+        if g["type"] == "url-test":
+            groups.append({"type": "urltest", "tag": g["name"], "outbounds": outbounds, **test})
+        else:
+            groups.append({"type": "selector", "tag": g["name"], "outbounds": outbounds})
+    for name, names in regions:
+        groups.append({"type": "urltest", "tag": name, "outbounds": names, **test})
+
+    rules, rule_sets, final = singbox_route(rules_content)
+    route = {"rules": rules, "final": final or PROXY_GROUPS[0]["name"], "auto_detect_interface": True}
+    if rule_sets:
+        route["rule_set"] = rule_sets
+    config = {
+        "log": {"level": "info"},
+        "inbounds": [{"type": "mixed", "tag": "mixed-in", "listen": "127.0.0.1", "listen_port": 7890, "sniff": True}],
+        "outbounds": groups + nodes + [{"type": "direct", "tag": "DIRECT"}, {"type": "block", "tag": "REJECT"}],
+        "route": route,
+    }
+    yield json.dumps(config, ensure_ascii=False, indent=2)
+    yield "\n"
+
+
+# ---- URI list -------------------------------------------------------------
+
+_USERINFO_SAFE = "-._~!$&'()*+,;="
+
+
+def _host(server):
+    return f"[{server}]" if ":" in server else server
+
+
+def _fragment(name):
+    return urllib.parse.quote(name, safe="")
+
+
+def _query(params):
+    return urllib.parse.urlencode([(k, v) for k, v in params if v not in (None, "")], quote_via=urllib.parse.quote)
+
+
+def _uri_vmess(p):
+    body = {
+        "v": "2",
+        "ps": p.name,
+        "add": p.server,
+        "port": str(p.port),
+        "id": p.uuid,
+        "aid": str(p.alter_id),
+        "scy": p.cipher,
+        "net": p.network,
+        "type": "none",
+        "host": p.ws.host if p.ws else "",
+        "path": p.ws.path if p.ws else "",
+        "tls": "tls" if p.tls else "",
+    }
+    if p.skip_cert_verify:
+        body["verify_cert"] = False
+    return "vmess://" + base64.b64encode(json.dumps(body, ensure_ascii=False).encode("utf-8")).decode()
+
+
+def _uri_vless(p):
+    params = [("encryption", "none"), ("type", p.network)]
+    if p.reality is not None:
+        params += [("security", "reality"), ("pbk", p.reality.public_key), ("sid", p.reality.short_id)]
+    else:
+        params.append(("security", "tls" if p.tls else "none"))
+    params += [("sni", p.servername), ("fp", p.client_fingerprint), ("flow", p.flow)]
+    if p.ws is not None:
+        params += [("host", p.ws.host), ("path", p.ws.path)]
+    if p.skip_cert_verify:
+        params.append(("allowInsecure", "1"))
+    return f"vless://{p.uuid}@{_host(p.server)}:{p.port}?{_query(params)}#{_fragment(p.name)}"
+
+
+def _uri_hysteria2(p):
+    params = [("sni", p.sni), ("insecure", "1" if p.skip_cert_verify else None)]
+    password = urllib.parse.quote(p.password, safe=_USERINFO_SAFE)
+    return f"hysteria2://{password}@{_host(p.server)}:{p.port}?{_query(params)}#{_fragment(p.name)}"
+
+
+def _uri_tuic(p):
+    params = [
+        ("sni", p.sni),
+        ("alpn", ",".join(p.alpn) if p.alpn else None),
+        ("congestion_control", p.congestion_controller),
+        ("insecure", "1" if p.skip_cert_verify else None),
+    ]
+    userinfo = f"{urllib.parse.quote(p.uuid, safe=_USERINFO_SAFE)}:{urllib.parse.quote(p.password, safe=_USERINFO_SAFE)}"
+    return f"tuic://{userinfo}@{_host(p.server)}:{p.port}?{_query(params)}#{_fragment(p.name)}"
+
+
+def _uri_ss(p):
+    # SIP002：method:password 用 URL 安全的 base64，插件放在 plugin 参数里
+    userinfo = base64.urlsafe_b64encode(f"{p.cipher}:{p.password}".encode("utf-8")).decode().rstrip("=")
+    query = ""
+    if p.plugin is not None:
+        plugin, rename = _SS_PLUGINS.get(p.plugin, (p.plugin, {}))
+        opts = _plugin_opts(p.plugin_opts, rename)
+        query = "/?" + _query([("plugin", f"{plugin};{opts}" if opts else plugin)])
+    return f"ss://{userinfo}@{_host(p.server)}:{p.port}{query}#{_fragment(p.name)}"
+
+
+URI_WRITERS = {
+    "vmess": _uri_vmess,
+    "vless": _uri_vless,
+    "hysteria2": _uri_hysteria2,
+    "tuic": _uri_tuic,
+    "ss": _uri_ss,
+}
+
+
+def proxy_uri(p):
+    """Share URI of a proxy record, or None for a type without one or a record with missing_fields()."""
+    write = URI_WRITERS.get(p.type)
+    if write is None or missing_fields(p):
+        return None
+    return write(p)
+
+
+def iter_uri(proxies, rules_content=None, **_):
+    """Base64 of the URI list, one node per line; the rules do not apply."""
+    lines = [uri for uri in map(proxy_uri, proxies) if uri is not None]
+    yield base64.b64encode("\n".join(lines).encode("utf-8")).decode()
+    yield "\n"
+
+
+register_emitter(Emitter("clash", ".yaml", "text/yaml; charset=utf-8", iter_clash))
+register_emitter(Emitter("sing-box", ".json", "application/json; charset=utf-8", iter_singbox))
+register_emitter(Emitter("uri", ".txt", "text/plain; charset=utf-8", iter_uri))
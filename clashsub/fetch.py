@@ -0,0 +1,187 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from clashsub.ingest import SOURCE_MAX_BYTES, SourceTooLarge, limit_chunks
+from clashsub.metrics import FETCHES, span
+
+# requests 在首次联网时才导入，纯本地转换（CLI / 批处理）不付这部分启动开销
+
+DEFAULT_HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+        "AppleWebKit/537.36 (KHTML, like Gecko) "
+        "Chrome/120.0.0.0 Safari/537.36"
+    )
+}
+
+# 单个订阅的总耗时上限（秒），以及一次转换里所有订阅的整体上限
+FETCH_TIMEOUT = 15
+FETCH_DEADLINE = 30
+FETCH_MAX_WORKERS = 8
+FETCH_CHUNK_SIZE = 64 * 1024
+
+_session = None
+_session_lock = threading.Lock()
+
+
+class FetchTimeout(Exception):
+    pass
+
+
+def get_session():
+    """Shared keep-alive session, pooled across conversions and threads."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=FETCH_MAX_WORKERS, pool_maxsize=FETCH_MAX_WORKERS)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                s.headers.update(DEFAULT_HEADERS)
+                _session = s
+    return _session
+
+
+def _download(url, timeout, session, headers=None, decode=None, max_bytes=SOURCE_MAX_BYTES):
+    deadline = time.monotonic() + timeout
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as resp:
+        if resp.status_code == 304:
+            return resp, None
+        resp.raise_for_status()
+        length = resp.headers.get("Content-Length")
+        if max_bytes is not None and length and length.isdigit() and int(length) > max_bytes:
+            raise SourceTooLarge(f"超过单个来源大小上限 {max_bytes / 1024 / 1024:.3g} MB（Content-Length {length}）")
+
+        def chunks():
+            for chunk in resp.iter_content(FETCH_CHUNK_SIZE):
+                yield chunk
+                if time.monotonic() > deadline:
+                    raise FetchTimeout(f"超过单个订阅时限 {timeout:g}s")
+
+        if decode is not None:
+            # 边下载边解码成节点行，不保留原始正文
+            return resp, "\n".join(decode(chunks(), resp.encoding, max_bytes))
+        from requests.compat import chardet
+
+        content = b"".join(limit_chunks(chunks(), max_bytes))
+        # 与 resp.text 保持一致的编码推断
+        encoding = resp.encoding
+        if not encoding and chardet is not None:
+            encoding = chardet.detect(content)["encoding"]
+        encoding = encoding or "utf-8"
+        try:
+            text = str(content, encoding, errors="replace")
+        except LookupError:
+            text = str(content, "utf-8", errors="replace")
+    return resp, text.strip()
+
+
+def fetch_one(url: str, timeout: float = FETCH_TIMEOUT, session=None, cache=None, decode=None, max_bytes=SOURCE_MAX_BYTES):
+    """
+    Downloads one subscription body and returns (text, status).
+    `timeout` bounds the whole request (connect + headers + body),
+    not just a single socket read like requests' own timeout.
+    `decode(chunks, encoding, max_bytes)` turns the body, streamed as byte
+    chunks, into node lines (ingest.iter_source_lines); without it the raw
+    body text is returned. With a `cache`, the decoded text is what gets
+    stored, so hits skip decoding as well. Bodies over `max_bytes` fail
+    with ingest.SourceTooLarge.
+    status is one of "hit", "revalidated", "miss", "stale" ("miss" without a cache).
+    """
+    session = session or get_session()
+
+    entry = cache.get(url) if cache is not None else None
+    if entry is not None and cache.is_fresh(entry):
+        cache.record("hit")
+        return entry["text"], "hit"
+
+    headers = {}
+    if entry is not None:
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+
+    try:
+        with span("fetch", url):
+            resp, text = _download(url, timeout, session, headers, decode, max_bytes)
+    except Exception:
+        if entry is None:
+            raise
+        # 上游不可用时返回过期缓存
+        cache.record("stale")
+        return entry["text"], "stale"
+
+    if text is None:
+        if entry is None:
+            # 没发条件请求却收到 304，按失败处理
+            from requests import HTTPError
+
+            raise HTTPError(f"304 Not Modified without cached copy: {url}", response=resp)
+        cache.touch(url)
+        cache.record("revalidated")
+        return entry["text"], "revalidated"
+
+    if cache is not None:
+        cache.put(url, text, resp.headers.get("ETag"), resp.headers.get("Last-Modified"))
+        cache.record("miss")
+    return text, "miss"
+
+
+def fetch_subscriptions(
+    urls,
+    timeout: float = FETCH_TIMEOUT,
+    deadline: float = FETCH_DEADLINE,
+    max_workers: int = FETCH_MAX_WORKERS,
+    session=None,
+    cache=None,
+    decode=None,
+    max_bytes=SOURCE_MAX_BYTES,
+):
+    """
+    Fetches all subscription URLs concurrently.
+    Returns a list of (url, text, error, status) in the SAME order as `urls`,
+    so the caller merges them by the original priority.
+    Exactly one of text / error is None; see fetch_one for status.
+    """
+    urls = list(urls)
+    if not urls:
+        return []
+
+    session = session or get_session()
+    results = [(url, None, None, None) for url in urls]
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(urls)))
+    try:
+        # 每个任务带上调用方的 contextvars（metrics.trace），各自一份拷贝
+        futures = {
+            executor.submit(contextvars.copy_context().run, fetch_one, url, timeout, session, cache, decode, max_bytes): i
+            for i, url in enumerate(urls)
+        }
+        done, not_done = wait(futures, timeout=deadline)
+        for fut in done:
+            i = futures[fut]
+            try:
+                text, status = fut.result()
+                results[i] = (urls[i], text, None, status)
+            except Exception as e:
+                results[i] = (urls[i], None, e, "error")
+        for fut in not_done:
+            i = futures[fut]
+            entry = cache.get(urls[i]) if cache is not None else None
+            if entry is not None:
+                cache.record("stale")
+                results[i] = (urls[i], entry["text"], None, "stale")
+            else:
+                results[i] = (urls[i], None, FetchTimeout(f"超过整体拉取时限 {deadline:g}s"), "error")
+    finally:
+        # 超时的请求会在自身的 per-URL 时限内退出，这里不等待它们
+        executor.shutdown(wait=False, cancel_futures=True)
+    for _, _, _, status in results:
+        FETCHES.inc(status=status)
+    return results
@@ -0,0 +1,643 @@
+"""
+Subscription body formats.
+
+sniff_format() decides from the first few KB of a body what it is:
+
+- "base64": only base64 characters, and the decoded start holds a node URI
+- "clash": a Clash / Clash Meta YAML config (a `proxies:` list)
+- "sip008": Shadowsocks SIP008 JSON ({"version": 1, "servers": [...]})
+- "lines": anything else, read as node URI lines
+
+Clash YAML and SIP008 bodies are turned straight into proxy records
+(clashsub.proxies), without going through URI text; entries that cannot be
+converted come out as a short description string, which scan_nodes() counts
+as an invalid line. The YAML reader only understands the subset Clash
+configs use for proxies (block / flow mappings and sequences, plain and
+quoted scalars, literal `|` and folded `>` block scalars with chomping and
+indentation indicators) and only looks at the top-level `proxies:`
+section, so the rest of a large config (rules, dns, groups) is skipped
+line by line. Anchors, aliases, tags and multi-line plain scalars are not
+supported; such an entry fails to parse instead of yielding wrong values.
+"""
+import base64
+import binascii
+import json
+import re
+
+from clashsub.proxies import (
+    Hysteria2Proxy,
+    RealityOpts,
+    ShadowsocksProxy,
+    TuicProxy,
+    VlessProxy,
+    VmessProxy,
+    WsOpts,
+)
+
+FORMATS = ("base64", "clash", "sip008", "lines")
+SNIFF_CHARS = 4096
+
+_B64_RE = re.compile(r"[A-Za-z0-9+/=_\-\s]+")
+_B64_URLSAFE = str.maketrans("-_", "+/")
+_TOP_KEY_RE = re.compile(r"([A-Za-z][\w-]*):(?:\s|$)")
+_PROXIES_RE = re.compile(r"^proxies:(?:[ \t]|$)", re.M)
+# 行尾的块标量头："key: |"、"key: >-"、"- |2"，返回指示符
+_BLOCK_HEADER_RE = re.compile(r"(?:^(?:-[ \t]+)*|:[ \t]+)([|>])([1-9][+-]?|[+-][1-9]?)?$")
+_ITEM_PREFIX_RE = re.compile(r"(?:-[ \t]+)*")
+
+# 常见的 Clash 顶层键；第一个键是其中之一才当作 Clash 配置，避免把“流量: 100G”一类的说明行误判
+CLASH_TOP_KEYS = frozenset(
+    (
+        "port", "socks-port", "mixed-port", "redir-port", "tproxy-port", "allow-lan", "bind-address",
+        "authentication", "mode", "log-level", "ipv6", "external-controller", "external-ui", "secret",
+        "interface-name", "routing-mark", "unified-delay", "tcp-concurrent", "find-process-mode",
+        "global-client-fingerprint", "geodata-mode", "geox-url", "keep-alive-interval", "profile",
+        "hosts", "dns", "tun", "sniffer", "experimental", "proxies", "proxy-groups", "proxy-providers",
+        "rule-providers", "rules",
+    )
+)
+
+
+def _b64_head(head: str):
+    """Decoded start of a base64-looking head, or None."""
+    data = "".join(head.split()).translate(_B64_URLSAFE)
+    data = data[: len(data) - len(data) % 4]
+    try:
+        # 严格模式一次解完是常见情况；中间夹着填充等不规范写法才走宽松解码
+        return base64.b64decode(data, validate=True)
+    except binascii.Error:
+        try:
+            return binascii.a2b_base64(data)
+        except binascii.Error:
+            return None
+
+
+def sniff_format(head: str) -> str:
+    """Format of a body (one of FORMATS) from its first SNIFF_CHARS characters."""
+    head = head[:SNIFF_CHARS].lstrip("\ufeff \t\r\n")
+    if not head:
+        return "lines"
+    if head[0] == "{":
+        return "sip008"
+    if _B64_RE.fullmatch(head):
+        decoded = _b64_head(head)
+        return "base64" if decoded is not None and b"://" in decoded else "lines"
+    if _PROXIES_RE.search(head):
+        return "clash"
+    for line in head.splitlines():
+        if line and not line.startswith("#"):
+            m = _TOP_KEY_RE.match(line)
+            return "clash" if m is not None and m.group(1) in CLASH_TOP_KEYS else "lines"
+    return "lines"
+
+
+# ---- YAML subset ----------------------------------------------------------
+
+
+def _strip_comment(line: str) -> str:
+    if "#" not in line:
+        return line.rstrip()
+    quote = None
+    for i, c in enumerate(line):
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in "\"'" and (i == 0 or line[i - 1] in " \t:[{,-"):
+            quote = c
+        elif c == "#" and (i == 0 or line[i - 1] in " \t"):
+            return line[:i].rstrip()
+    return line.rstrip()
+
+
+def _flow_depth(text: str) -> int:
+    depth = 0
+    quote = None
+    for c in text:
+        if quote:
+            if c == quote:
+                quote = None
+        elif c in "\"'":
+            quote = c
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+    return depth
+
+
+def _plain(text: str):
+    # 数字保持原文（short-id 0123、纯数字密码），需要整数的字段（port、alterId）再转换
+    if text in ("", "~", "null", "Null", "NULL"):
+        return None
+    if text in ("true", "True", "TRUE"):
+        return True
+    if text in ("false", "False", "FALSE"):
+        return False
+    return text
+
+
+def _quoted(text: str, i: int):
+    """(value, end) of the quoted scalar starting at text[i]."""
+    q = text[i]
+    j = i + 1
+    if q == "'":
+        out = []
+        while True:
+            k = text.index("'", j)
+            out.append(text[j:k])
+            if text.startswith("'", k + 1):
+                out.append("'")
+                j = k + 2
+                continue
+            return "".join(out), k + 1
+    while True:
+        k = text.index('"', j)
+        n = 0
+        while text[k - 1 - n] == "\\":
+            n += 1
+        if n % 2 == 0:
+            break
+        j = k + 1
+    raw = text[i : k + 1]
+    try:
+        return json.loads(raw), k + 1
+    except ValueError:
+        return raw[1:-1], k + 1
+
+
+def _flow(text: str, i: int, stops: str):
+    """(value, end) of the flow node at text[i]; a plain scalar ends at one of `stops`."""
+    n = len(text)
+    while i < n and text[i] in " \t":
+        i += 1
+    if i >= n:
+        return None, i
+    c = text[i]
+    if c in "[{":
+        close = "]" if c == "[" else "}"
+        out = [] if c == "[" else {}
+        i += 1
+        while True:
+            while i < n and text[i] in " \t,":
+                i += 1
+            if i >= n:
+                raise ValueError("flow collection is not closed")
+            if text[i] == close:
+                return out, i + 1
+            if c == "[":
+                value, i = _flow(text, i, ",]")
+                out.append(value)
+                continue
+            key, i = _flow(text, i, ":,}")
+            while i < n and text[i] in " \t":
+                i += 1
+            value = None
+            if i < n and text[i] == ":":
+                value, i = _flow(text, i + 1, ",}")
+            out[key] = value
+    if c in "\"'":
+        return _quoted(text, i)
+    j = i
+    while j < n:
+        ch = text[j]
+        # 裸值里的冒号（IPv6、URL）只有后面跟空白时才是键值分隔
+        if ch in stops and (ch != ":" or j + 1 == n or text[j + 1] in " \t,}]"):
+            break
+        j += 1
+    return _plain(text[i:j].strip()), j
+
+
+def _block_scalar(style, flags, lines, parent_indent):
+    """
+    Value of a `|` / `>` block scalar from its raw content lines. `flags` are
+    the chomping (+ keep, - strip) and indentation indicators of the header.
+    """
+    chomp = "+" if "+" in flags else "-" if "-" in flags else None
+    digits = flags.strip("+-")
+    indent = parent_indent + int(digits) if digits else None
+    if indent is None:
+        indent = min((len(x) - len(x.lstrip(" ")) for x in lines if x.strip()), default=parent_indent + 1)
+    content = [x[indent:] if len(x) > indent else "" for x in lines]
+
+    # 与 YAML 规范一致：folded 时相邻两行普通文本之间的换行变成空格，空行和缩进更深的行保留换行
+    chunks = []
+    i = 0
+    breaks = []
+    while i < len(content) and content[i] == "":
+        breaks.append("\n")
+        i += 1
+    line_break = ""
+    while i < len(content):
+        chunks.extend(breaks)
+        leading_non_space = content[i][:1] not in (" ", "\t")
+        chunks.append(content[i])
+        i += 1
+        line_break = "\n"
+        breaks = []
+        while i < len(content) and content[i] == "":
+            breaks.append("\n")
+            i += 1
+        if i < len(content):
+            if style == ">" and leading_non_space and content[i][:1] not in (" ", "\t"):
+                if not breaks:
+                    chunks.append(" ")
+            else:
+                chunks.append(line_break)
+    if chomp != "-":
+        chunks.append(line_break)
+    if chomp == "+":
+        chunks.extend(breaks)
+    return "".join(chunks)
+
+
+def _value(text: str):
+    if text[0] in "[{\"'":
+        value, end = _flow(text, 0, "")
+        if text[end:].strip():
+            raise ValueError(f"unexpected text after value: {text[end:].strip()}")
+        return value
+    return _plain(text)
+
+
+def _split_key(text: str):
+    """(key, rest) of a `key: value` row, or None if the row is a bare scalar."""
+    if text[0] in "\"'":
+        key, end = _quoted(text, 0)
+        rest = text[end:].lstrip()
+        if not rest.startswith(":"):
+            return None
+        return key, rest[1:].strip()
+    if text[0] in "[{":
+        return None
+    i = text.find(": ")
+    if i < 0:
+        if not text.endswith(":"):
+            return None
+        i = len(text) - 1
+    return text[:i].rstrip(), text[i + 1 :].strip()
+
+
+def _is_item(text: str) -> bool:
+    return text == "-" or text.startswith("- ")
+
+
+def _block(rows, i, indent):
+    """(value, next_row) of the block node whose first row rows[i] sits at `indent`."""
+    text = rows[i][1]
+    if _is_item(text):
+        seq = []
+        while i < len(rows) and rows[i][0] == indent and _is_item(rows[i][1]):
+            rest = rows[i][1][1:].lstrip()
+            if not rest:
+                scalar = rows[i][2]
+                i += 1
+                if scalar is not None:
+                    value = scalar
+                elif i < len(rows) and rows[i][0] > indent:
+                    value, i = _block(rows, i, rows[i][0])
+                else:
+                    value = None
+            else:
+                # "- key: v" 的键和下面几行对齐，当作缩进更深的一个映射
+                sub = indent + len(rows[i][1]) - len(rest)
+                rows[i] = (sub, rest, rows[i][2])
+                value, i = _block(rows, i, sub)
+            seq.append(value)
+        return seq, i
+
+    kv = _split_key(text)
+    if kv is None:
+        return (rows[i][2] if rows[i][2] is not None else _value(text)), i + 1
+    mapping = {}
+    while i < len(rows) and rows[i][0] == indent and not _is_item(rows[i][1]):
+        kv = _split_key(rows[i][1])
+        if kv is None:
+            raise ValueError(f"expected a key: {rows[i][1]}")
+        key, rest = kv
+        scalar = rows[i][2]
+        i += 1
+        if scalar is not None:
+            mapping[key] = scalar
+        elif rest:
+            mapping[key] = _value(rest)
+        elif i < len(rows) and (rows[i][0] > indent or (rows[i][0] == indent and _is_item(rows[i][1]))):
+            mapping[key], i = _block(rows, i, rows[i][0])
+        else:
+            mapping[key] = None
+    return mapping, i
+
+
+def _rows(lines):
+    """
+    (indent, text, block) rows without blank lines and comments; multi-line
+    flow values are joined. `block` is the value of a block scalar started
+    on the row (its content lines are consumed), otherwise None.
+    """
+    rows = []
+    pending = None
+    lines = [line.rstrip("\r\n") for line in lines]
+    n = len(lines)
+    i = 0
+    while i < n:
+        text = _strip_comment(lines[i])
+        i += 1
+        stripped = text.lstrip(" ")
+        if not stripped:
+            continue
+        if pending is not None:
+            pending[1] += " " + stripped
+            if _flow_depth(pending[1]) <= 0:
+                rows.append(tuple(pending))
+                pending = None
+            continue
+        indent = len(text) - len(stripped)
+        m = _BLOCK_HEADER_RE.search(stripped)
+        if m is not None:
+            # 内容是后面缩进比所属节点更深的行（中间的空行、# 开头的行也是内容）；
+            # "- key: |" 属于键所在的映射，"- |" 属于最后一个 "-" 所在的序列
+            prefix = _ITEM_PREFIX_RE.match(stripped).end()
+            if m.start(1) == prefix and prefix:
+                prefix = stripped.rfind("-", 0, prefix)
+            key_indent = indent + prefix
+            start = i
+            while i < n and (not lines[i].strip() or len(lines[i]) - len(lines[i].lstrip(" ")) > key_indent):
+                i += 1
+            block = _block_scalar(m.group(1), m.group(2) or "", lines[start:i], key_indent)
+            rows.append((indent, stripped[: m.start(1)].rstrip(), block))
+            continue
+        row = [indent, stripped, None]
+        if _flow_depth(stripped) > 0:
+            pending = row
+        else:
+            rows.append(tuple(row))
+    if pending is not None:
+        rows.append(tuple(pending))
+    return rows
+
+
+def _parse_item(lines):
+    rows = _rows(lines)
+    if not rows:
+        return None
+    value, _ = _block(rows, 0, rows[0][0])
+    return value[0] if value else None
+
+
+def iter_clash_proxies(lines):
+    """
+    Each entry of the top-level `proxies:` list of a Clash config given as
+    lines, as a dict; an entry the reader cannot make sense of comes out as
+    a str describing it.
+    """
+    in_section = False
+    item = None
+    item_indent = 0
+    for line in lines:
+        if not in_section:
+            if line.startswith("proxies:"):
+                rest = _strip_comment(line[8:]).strip()
+                if rest:
+                    # proxies: [{...}, {...}]，整段写在一行里（或 proxies: []）
+                    try:
+                        yield from _value(rest) or ()
+                    except (ValueError, IndexError) as e:
+                        yield f"Clash proxies 解析失败：{e}"
+                    return
+                in_section = True
+            continue
+        if not line.strip() or line.lstrip().startswith("#"):
+            # 块标量里的空行和 # 开头的行是内容，交给 _rows 处理
+            if item is not None:
+                item.append(line)
+            continue
+        if line[0] not in " \t-":
+            break
+        if line.lstrip(" ").startswith("- ") or line.strip() == "-":
+            indent = len(line) - len(line.lstrip(" "))
+            if item is not None and indent <= item_indent:
+                yield _item(item)
+                item = None
+            if item is None:
+                item = [line]
+                item_indent = indent
+                continue
+        if item is not None:
+            item.append(line)
+    if item is not None:
+        yield _item(item)
+
+
+def _item(lines):
+    try:
+        value = _parse_item(lines)
+    except (ValueError, IndexError) as e:
+        return f"Clash 节点解析失败：{lines[0].strip()}（{e}）"
+    if not isinstance(value, dict):
+        return f"Clash 节点不是映射：{lines[0].strip()}"
+    return value
+
+
+# ---- Clash proxy dicts -> records ------------------------------------------
+
+
+def _required(d, key):
+    """d[key] as a str; a missing or empty (null) value is an error, not "None"."""
+    value = d[key]
+    if value is None:
+        raise ValueError(f"{key} 为空")
+    return str(value)
+
+
+def _ws(d, default_host):
+    opts = d.get("ws-opts") or {}
+    headers = opts.get("headers") or {}
+    return WsOpts(str(opts.get("path", "/")), headers.get("Host") or default_host)
+
+
+def _vmess(d, name, server, port):
+    network = d.get("network", "tcp")
+    return VmessProxy(
+        name,
+        server,
+        port,
+        uuid=_required(d, "uuid"),
+        alter_id=int(d.get("alterId", 0)),
+        cipher=d.get("cipher", "auto"),
+        network=network,
+        tls=d.get("tls") is True,
+        skip_cert_verify=d.get("skip-cert-verify") is True,
+        ws=_ws(d, server) if network == "ws" else None,
+    )
+
+
+def _vless(d, name, server, port):
+    network = d.get("network", "tcp")
+    servername = d.get("servername") or ""
+    reality = None
+    if d.get("reality-opts"):
+        opts = d["reality-opts"]
+        sid = opts.get("short-id")
+        reality = RealityOpts(str(opts["public-key"]), None if sid is None else str(sid))
+    return VlessProxy(
+        name,
+        server,
+        port,
+        uuid=_required(d, "uuid"),
+        network=network,
+        servername=servername,
+        skip_cert_verify=d.get("skip-cert-verify") is True,
+        client_fingerprint=d.get("client-fingerprint", "chrome"),
+        flow=(d.get("flow") or None) if network == "tcp" else None,
+        ws=_ws(d, servername or server) if network == "ws" else None,
+        reality=reality,
+        tls=d.get("tls") is True or reality is not None,
+    )
+
+
+def _hysteria2(d, name, server, port):
+    return Hysteria2Proxy(
+        name,
+        server,
+        port,
+        password=_required(d, "password"),
+        sni=d.get("sni") or "",
+        skip_cert_verify=d.get("skip-cert-verify") is True,
+    )
+
+
+def _tuic(d, name, server, port):
+    alpn = d.get("alpn")
+    return TuicProxy(
+        name,
+        server,
+        port,
+        uuid=_required(d, "uuid"),
+        password=_required(d, "password"),
+        sni=d.get("sni") or "",
+        congestion_controller=d.get("congestion-controller", "bbr"),
+        skip_cert_verify=d.get("skip-cert-verify") is True,
+        alpn=[str(a) for a in alpn] if alpn else None,
+    )
+
+
+def _ss(d, name, server, port):
+    opts = d.get("plugin-opts") or {}
+    if any(isinstance(v, (dict, list)) for v in opts.values()):
+        raise ValueError("plugin-opts 里有嵌套的值")
+    return ShadowsocksProxy(
+        name,
+        server,
+        port,
+        cipher=_required(d, "cipher"),
+        password=_required(d, "password"),
+        plugin=d.get("plugin") or None,
+        plugin_opts=tuple(opts.items()),
+    )
+
+
+CLASH_BUILDERS = {
+    "vmess": _vmess,
+    "vless": _vless,
+    "hysteria2": _hysteria2,
+    "tuic": _tuic,
+    "ss": _ss,
+}
+
+
+def clash_record(d):
+    """Proxy record of one Clash proxy dict, or a str saying why it was skipped."""
+    name = d.get("name")
+    kind = d.get("type")
+    build = CLASH_BUILDERS.get(kind)
+    if build is None:
+        return f"不支持的 Clash 节点类型 {kind}：{name}"
+    try:
+        return build(d, str(d["name"]), str(d["server"]), int(d["port"]))
+    except (KeyError, TypeError, ValueError, AttributeError) as e:
+        return f"Clash 节点字段不完整（{kind}）：{name}（{e}）"
+
+
+def iter_clash_nodes(lines):
+    """Proxy records (or skip descriptions) of a Clash config given as lines."""
+    for d in iter_clash_proxies(lines):
+        if isinstance(d, dict):
+            yield clash_record(d)
+        else:
+            yield d if isinstance(d, str) else f"Clash 节点不是映射：{d}"
+
+
+# ---- SIP008 ---------------------------------------------------------------
+
+
+def _sip003_opts(text):
+    opts = {}
+    for part in (text or "").split(";"):
+        if part:
+            key, eq, value = part.partition("=")
+            opts[key] = value if eq else True
+    return opts
+
+
+def _sip008_plugin(plugin, opts_text):
+    """(clash plugin, plugin_opts) of a SIP003 plugin; raises ValueError for ones Clash has no match for."""
+    opts = _sip003_opts(opts_text)
+    if plugin in ("obfs-local", "simple-obfs"):
+        out = [("mode", opts.get("obfs", "http"))]
+        if "obfs-host" in opts:
+            out.append(("host", opts["obfs-host"]))
+        return "obfs", out
+    if plugin == "v2ray-plugin":
+        out = [("mode", opts.get("mode", "websocket"))]
+        if opts.get("tls"):
+            out.append(("tls", True))
+        for key in ("host", "path"):
+            if key in opts:
+                out.append((key, opts[key]))
+        return "v2ray-plugin", out
+    raise ValueError(f"不支持的插件 {plugin}")
+
+
+def sip008_record(s):
+    """Shadowsocks record of one SIP008 server entry, or a str saying why it was skipped."""
+    if not isinstance(s, dict):
+        return f"SIP008 条目不是对象：{s}"
+    name = s.get("remarks") or s.get("server")
+    try:
+        plugin, opts = None, ()
+        if s.get("plugin"):
+            plugin, opts = _sip008_plugin(s["plugin"], s.get("plugin_opts"))
+        return ShadowsocksProxy(
+            str(name),
+            str(s["server"]),
+            int(s["server_port"]),
+            cipher=_required(s, "method"),
+            password=_required(s, "password"),
+            plugin=plugin,
+            plugin_opts=opts,
+        )
+    except (KeyError, TypeError, ValueError) as e:
+        return f"SIP008 节点字段不完整：{name}（{e}）"
+
+
+def parse_sip008(text):
+    """Shadowsocks records (or skip descriptions) of a SIP008 JSON document."""
+    try:
+        data = json.loads(text)
+    except ValueError as e:
+        return [f"SIP008 JSON 解析失败：{e}"]
+    servers = data.get("servers") if isinstance(data, dict) else None
+    if not isinstance(servers, list):
+        return ["SIP008 JSON 里没有 servers 列表"]
+    return [sip008_record(s) for s in servers]
+
+
+def iter_body_nodes(lines, fmt):
+    """
+    Node lines and records of one decoded body in format `fmt`, given as
+    lines: Clash and SIP008 bodies become records, others pass through.
+    """
+    if fmt == "clash":
+        return iter_clash_nodes(lines)
+    if fmt == "sip008":
+        return parse_sip008("\n".join(lines))
+    return lines
@@ -0,0 +1,159 @@
+"""
+Streaming ingestion of node sources with a per-source size limit.
+
+A source (subscription response, uploaded file, local file) is read as an
+iterable of byte chunks and turned into node lines as it arrives, instead
+of being read whole, decoded to one str, stripped, base64-decoded through
+several intermediate copies, joined with the other sources and split again:
+
+- the first SNIFF_BYTES are sniffed (formats.sniff_format): a base64 body
+  is decoded incrementally, a whole number of 4-character groups per chunk;
+  anything else is read as text
+- bytes go through an incremental decoder and are split on newlines, and
+  node lines also on "|" (the separator normalize_nodes_text() handles);
+  Clash YAML and SIP008 bodies are only split on newlines
+- more than `max_bytes` raw bytes raises SourceTooLarge, before the rest of
+  the source is read
+
+The lines feed scan_nodes() directly; iter_source_nodes() also turns
+Clash YAML and SIP008 bodies into proxy records on the way. Callers that need the decoded text of
+a source (subscription cache, parse memo, saved profiles) join the lines
+once; that text is the only full copy kept.
+"""
+import binascii
+import codecs
+import os
+
+from clashsub.formats import iter_body_nodes, sniff_format
+
+SOURCE_MAX_BYTES = 32 * 1024 * 1024
+READ_CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 4096
+
+_B64_ALPHABET = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/="
+# URL-safe 变体转成标准字母表，其它字符（换行、空格等）全部删掉
+_B64_TABLE = bytes.maketrans(b"-_", b"+/")
+_B64_DELETE = bytes(b for b in range(256) if b not in _B64_ALPHABET + b"-_")
+
+
+class SourceTooLarge(ValueError):
+    """A source is larger than the configured per-source limit."""
+
+
+def max_source_bytes():
+    """Per-source limit from CLASHSUB_MAX_SOURCE_MB (default 32 MB)."""
+    mb = os.getenv("CLASHSUB_MAX_SOURCE_MB")
+    return int(float(mb) * 1024 * 1024) if mb else SOURCE_MAX_BYTES
+
+
+def iter_chunks(fp, chunk_size=READ_CHUNK_SIZE):
+    """Byte chunks of a binary file object, read from the current position."""
+    while True:
+        chunk = fp.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def limit_chunks(chunks, max_bytes):
+    """Passes chunks through, raising SourceTooLarge once more than `max_bytes` went by."""
+    total = 0
+    for chunk in chunks:
+        total += len(chunk)
+        if max_bytes is not None and total > max_bytes:
+            raise SourceTooLarge(f"超过单个来源大小上限 {max_bytes / 1024 / 1024:.3g} MB")
+        yield chunk
+
+
+def _b64_decode_chunks(chunks):
+    carry = b""
+    for chunk in chunks:
+        data = carry + chunk.translate(_B64_TABLE, _B64_DELETE)
+        cut = len(data) - len(data) % 4
+        carry = data[cut:]
+        if cut:
+            try:
+                yield binascii.a2b_base64(data[:cut])
+            except binascii.Error:
+                pass
+    if carry.strip(b"="):
+        try:
+            yield binascii.a2b_base64(carry + b"=" * (-len(carry) % 4))
+        except binascii.Error:
+            pass
+
+
+def _split_lines(chunks, encoding, errors, pipe=True):
+    decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+    tail = ""
+    for chunk in chunks:
+        text = tail + decoder.decode(chunk)
+        cut = max(text.rfind("\n"), text.rfind("\r"), text.rfind("|") if pipe else -1)
+        if cut < 0:
+            tail = text
+            continue
+        tail = text[cut + 1 :]
+        text = text[: cut + 1]
+        yield from (text.replace("|", "\n") if pipe else text).splitlines()
+    text = tail + decoder.decode(b"", final=True)
+    if text:
+        yield from (text.replace("|", "\n") if pipe else text).splitlines()
+
+
+def _sniffed(chunks, encoding, max_bytes, sniff, errors):
+    """(format, lines) of one source; see iter_source_lines()."""
+    chunks = limit_chunks(chunks, max_bytes)
+    encoding = encoding or "utf-8"
+    try:
+        codecs.lookup(encoding)
+    except LookupError:
+        encoding = "utf-8"
+    if not sniff:
+        return "lines", _split_lines(chunks, encoding, errors)
+
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size >= SNIFF_BYTES:
+            break
+    window = b"".join(head)
+    # 格式只看 ASCII 结构，截断的多字节字符直接忽略
+    fmt = sniff_format(window[:SNIFF_BYTES].decode("utf-8", errors="ignore"))
+
+    def replay():
+        yield window
+        yield from chunks
+
+    if fmt == "base64":
+        return fmt, _split_lines(_b64_decode_chunks(replay()), "utf-8", errors)
+    return fmt, _split_lines(replay(), encoding, errors, pipe=fmt == "lines")
+
+
+def iter_source_lines(chunks, encoding=None, max_bytes=SOURCE_MAX_BYTES, sniff=True, errors="replace"):
+    """
+    Lines (unstripped, possibly empty) of one source given as byte chunks.
+    With `sniff`, a base64 body is decoded on the fly, the way
+    core.decode_subscription_text() decodes a whole one, and Clash YAML /
+    SIP008 bodies keep their lines intact. `encoding` applies to plain-text
+    sources (base64 payloads are always UTF-8); None means UTF-8, and
+    `errors` is the handler for undecodable bytes. Raises SourceTooLarge
+    past `max_bytes`.
+    """
+    _, lines = _sniffed(chunks, encoding, max_bytes, sniff, errors)
+    yield from lines
+
+
+def iter_source_nodes(chunks, encoding=None, max_bytes=SOURCE_MAX_BYTES, errors="replace"):
+    """
+    Node lines and proxy records of one source, sniffed like
+    iter_source_lines(); Clash YAML and SIP008 entries come out as records.
+    """
+    fmt, lines = _sniffed(chunks, encoding, max_bytes, True, errors)
+    yield from iter_body_nodes(lines, fmt)
+
+
+def read_source_text(fp, max_bytes=SOURCE_MAX_BYTES, sniff=True):
+    """Decoded text of a binary file object (e.g. an upload), read in chunks."""
+    return "\n".join(iter_source_lines(iter_chunks(fp), max_bytes=max_bytes, sniff=sniff, errors="ignore"))
@@ -0,0 +1,164 @@
+"""
+Bounded background job queue for conversions.
+
+Streamlit runs each session's script in a thread of its own; a conversion
+done inside the script (network fetches, parsing a large aggregation,
+writing the file) keeps that thread busy for its whole duration, and a few
+of them at once make the page unresponsive for everyone. Conversions are
+submitted here instead and run on a small fixed pool of worker threads; the
+page only keeps the job ID and polls the job's stage
+(queued -> running -> fetching -> parsing -> [probing] -> emitting -> done /
+failed).
+
+Admission is bounded twice: at most `max_queue` jobs waiting overall, and
+at most `per_user` unfinished jobs per user key; submit() raises
+JobRejected otherwise. Finished jobs are kept for `keep` seconds so the page
+can pick up the result. Heavy parsing can still fan out to processes through
+CLASHSUB_PARSE_WORKERS.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+FETCHING = "fetching"
+PARSING = "parsing"
+PROBING = "probing"
+EMITTING = "emitting"
+DONE = "done"
+FAILED = "failed"
+
+JOB_WORKERS = 2
+JOB_MAX_QUEUE = 16
+JOB_PER_USER = 1
+JOB_KEEP = 600
+
+
+class JobRejected(Exception):
+    """The queue is full, or the user already has `per_user` unfinished jobs."""
+
+
+class Job:
+    __slots__ = ("id", "user", "state", "detail", "result", "error", "submitted_at", "started_at", "finished_at")
+
+    def __init__(self, user):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.state = QUEUED
+        self.detail = ""
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def set_stage(self, state, detail=""):
+        """Progress callback handed to the job function."""
+        self.state = state
+        self.detail = detail
+
+    @property
+    def finished(self):
+        return self.state in (DONE, FAILED)
+
+    def __repr__(self):
+        return f"Job({self.id[:8]}, {self.user!r}, {self.state})"
+
+
+class JobQueue:
+    """
+    `workers` threads run the jobs; submit(user, fn, *args) runs
+    fn(job, *args) and stores its return value (or exception) on the job.
+    Thread-safe; one instance per process.
+    """
+
+    def __init__(self, workers=JOB_WORKERS, max_queue=JOB_MAX_QUEUE, per_user=JOB_PER_USER, keep=JOB_KEEP):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.per_user = per_user
+        self.keep = keep
+        self.stats = {"submitted": 0, "rejected": 0, "done": 0, "failed": 0, "wait_seconds": 0.0, "run_seconds": 0.0}
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="clashsub-job")
+
+    @classmethod
+    def from_env(cls):
+        """Builds a queue from CLASHSUB_JOB_WORKERS / _JOB_MAX_QUEUE / _JOB_PER_USER."""
+        return cls(
+            workers=int(os.getenv("CLASHSUB_JOB_WORKERS", JOB_WORKERS)),
+            max_queue=int(os.getenv("CLASHSUB_JOB_MAX_QUEUE", JOB_MAX_QUEUE)),
+            per_user=int(os.getenv("CLASHSUB_JOB_PER_USER", JOB_PER_USER)),
+        )
+
+    def submit(self, user, fn, *args, **kwargs):
+        job = Job(user)
+        with self._lock:
+            self._purge()
+            pending = [j for j in self._jobs.values() if not j.finished]
+            if sum(j.user == user for j in pending) >= self.per_user:
+                self.stats["rejected"] += 1
+                raise JobRejected(f"已有 {self.per_user} 个转换在进行中，请等它完成")
+            if sum(j.state == QUEUED for j in pending) >= self.max_queue:
+                self.stats["rejected"] += 1
+                raise JobRejected(f"排队的转换已满（{self.max_queue} 个），请稍后再试")
+            self._jobs[job.id] = job
+            self.stats["submitted"] += 1
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.started_at = time.time()
+        job.set_stage(RUNNING)
+        try:
+            job.result = fn(job, *args, **kwargs)
+            state = DONE
+        except Exception as e:
+            job.error = e
+            state = FAILED
+        job.finished_at = time.time()
+        job.set_stage(state, job.detail)
+        with self._lock:
+            self.stats[state] += 1
+            self.stats["wait_seconds"] += job.started_at - job.submitted_at
+            self.stats["run_seconds"] += job.finished_at - job.started_at
+
+    def _purge(self):
+        now = time.time()
+        for job_id in [i for i, j in self._jobs.items() if j.finished and now - j.finished_at > self.keep]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def position(self, job):
+        """Number of queued jobs submitted before `job` (0 once it runs)."""
+        if job.state != QUEUED:
+            return 0
+        with self._lock:
+            return sum(j.state == QUEUED and j.submitted_at < job.submitted_at for j in self._jobs.values())
+
+    def gauges(self):
+        """metrics.REGISTRY collector: queue depth, running jobs and totals."""
+        m = self.metrics()
+        return [
+            ("clashsub_jobs_queued", "Conversions waiting for a worker", [({}, m["queued"])]),
+            ("clashsub_jobs_running", "Conversions being run", [({}, m["running"])]),
+            ("clashsub_jobs_workers", "Worker threads", [({}, m["workers"])]),
+            (
+                "clashsub_jobs",
+                "Jobs by outcome since start (submitted / rejected / done / failed)",
+                [({"outcome": k}, m[k]) for k in ("submitted", "rejected", "done", "failed")],
+            ),
+            ("clashsub_jobs_wait_seconds", "Total time jobs spent queued", [({}, m["wait_seconds"])]),
+        ]
+
+    def metrics(self):
+        """Queue depth, running jobs and cumulative counters."""
+        with self._lock:
+            queued = sum(j.state == QUEUED for j in self._jobs.values())
+            running = sum(not j.finished and j.state != QUEUED for j in self._jobs.values())
+            return dict(self.stats, queued=queued, running=running, workers=self.workers, max_queue=self.max_queue)
@@ -0,0 +1,117 @@
+"""
+Incremental reconversion memo.
+
+Users re-convert the same subscriptions over and over, and usually only a
+few node lines changed since last time. ParseMemo maps the hash of each
+node line to its parsed record (content-addressed: the same line from any
+source shares one entry) and to the YAML entries already rendered for it,
+so a re-conversion only parses and renders the lines it has not seen. It
+also remembers a hash of each source's decoded text, to report which
+sources changed. The rules block and the group skeleton are cached
+elsewhere (clashsub.rules, core._group_skeleton) and spliced in as-is.
+
+Records are shared as-is between requests: the pipeline never mutates a
+record, renaming returns a copy (ProxyRecord.renamed).
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from clashsub.core import _try_parse
+
+MEMO_MAX_LINES = 200000
+MEMO_MAX_SOURCES = 4096
+
+
+def line_key(line: str) -> bytes:
+    return hashlib.blake2b(line.encode("utf-8"), digest_size=16).digest()
+
+
+class ParseMemo:
+    """
+    line hash -> [record or None, {(name, indent): rendered entry}], LRU
+    bounded to `max_lines` lines; the source hashes are LRU bounded to
+    `max_sources` sources. Thread-safe; one instance per process.
+    """
+
+    def __init__(self, max_lines=MEMO_MAX_LINES, max_sources=MEMO_MAX_SOURCES):
+        self.max_lines = max_lines
+        self.max_sources = max_sources
+        self.stats = {"hit": 0, "miss": 0, "emit_hit": 0, "emit_miss": 0}
+        self._entries = OrderedDict()
+        self._sources = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Builds a memo sized by CLASHSUB_MEMO_MAX_LINES and CLASHSUB_MEMO_MAX_SOURCES."""
+        return cls(
+            max_lines=int(os.getenv("CLASHSUB_MEMO_MAX_LINES", MEMO_MAX_LINES)),
+            max_sources=int(os.getenv("CLASHSUB_MEMO_MAX_SOURCES", MEMO_MAX_SOURCES)),
+        )
+
+    def parse(self, proto, line):
+        """Same result as core._try_parse(proto, line), parsed at most once per distinct line."""
+        return self.parse_many([(proto, line)])[0][0]
+
+    def parse_many(self, items):
+        """
+        parse() for a list of (proto, line); takes the lock twice in total
+        instead of per line. Returns (records, number of lines found in the memo).
+        """
+        keys = [line_key(line) for _, line in items]
+        with self._lock:
+            entries = [self._entries.get(k) for k in keys]
+            for k, entry in zip(keys, entries):
+                if entry is not None:
+                    self._entries.move_to_end(k)
+        missing = [i for i, entry in enumerate(entries) if entry is None]
+        for i in missing:
+            record = _try_parse(*items[i])
+            if record is not None:
+                record.line_key = keys[i]
+            entries[i] = [record, {}]
+        with self._lock:
+            self.stats["hit"] += len(items) - len(missing)
+            self.stats["miss"] += len(missing)
+            for i in missing:
+                self._entries[keys[i]] = entries[i]
+            while len(self._entries) > self.max_lines:
+                self._entries.popitem(last=False)
+
+        return [entry[0] for entry in entries], len(items) - len(missing)
+
+    def emit(self, p, indent="  "):
+        """p.emit(indent), reusing the text rendered for the same line and name earlier."""
+        key = getattr(p, "line_key", None)
+        entry = self._entries.get(key) if key is not None else None
+        if entry is None:
+            return p.emit(indent)
+        rendered = entry[1]
+        text = rendered.get((p.name, indent))
+        if text is None:
+            text = p.emit(indent)
+            if len(rendered) >= 4:
+                # 同一行通常只有一两个名字（重命名后缀 / 两种缩进），防止无限增长
+                rendered.clear()
+            rendered[(p.name, indent)] = text
+            self.stats["emit_miss"] += 1
+        else:
+            self.stats["emit_hit"] += 1
+        return text
+
+    def source_changed(self, source: str, text: str) -> bool:
+        """Records the hash of a source's decoded text; True if it differs from last time."""
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        with self._lock:
+            changed = self._sources.get(source) != digest
+            self._sources[source] = digest
+            self._sources.move_to_end(source)
+            # /sub 可以收到任意链接，和节点行一样按最近使用淘汰
+            while len(self._sources) > self.max_sources:
+                self._sources.popitem(last=False)
+        return changed
+
+    def __len__(self):
+        return len(self._entries)
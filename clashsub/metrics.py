@@ -0,0 +1,231 @@
+"""
+Lightweight timing spans and Prometheus-style metrics.
+
+`with span("parse"):` times a pipeline stage into the clashsub_stage_seconds
+histogram and, when the code runs under `with trace() as t:`, also appends
+(stage, seconds, detail) to t.spans for a per-conversion breakdown. The
+trace is a contextvar, so it follows the code into fetch worker threads
+started with contextvars.copy_context(). A span costs about a microsecond;
+spans wrap whole stages, never per-line work.
+
+Counters and histograms live in one process-wide REGISTRY; render() emits
+the text exposition format served at /metrics. Collectors registered with
+REGISTRY.collect() add gauges computed at scrape time (queue depth, cache
+sizes, ...). Label values are emitted as given, so only low-cardinality
+labels (stage, protocol, status) are used; per-URL detail goes to the
+trace only.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(names, values):
+    if not names:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(k, "") for k in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(k, "") for k in self.labels), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, v in items:
+            lines.append(f"{self.name}{_labels_text(self.labels, key)} {v:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # key -> [每个桶的计数（不累加）..., +Inf 桶, sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(k, "") for k in self.labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    def count(self, **labels):
+        row = self._values.get(tuple(labels.get(k, "") for k in self.labels))
+        return sum(row[:-1]) if row else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        names = self.labels + ("le",)
+        for key, row in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), row[:-1]):
+                cumulative += n
+                le = bound if bound == "+Inf" else f"{bound:g}"
+                lines.append(f"{self.name}_bucket{_labels_text(names, key + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels_text(self.labels, key)} {row[-1]:.6f}")
+            lines.append(f"{self.name}_count{_labels_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def counter(self, name, help_text, labels=()):
+        m = Counter(name, help_text, labels)
+        self._metrics.append(m)
+        return m
+
+    def histogram(self, name, help_text, labels=(), buckets=DEFAULT_BUCKETS):
+        m = Histogram(name, help_text, labels, buckets)
+        self._metrics.append(m)
+        return m
+
+    def collect(self, fn):
+        """
+        Registers fn() -> [(name, help, [(labels dict, value), ...])], evaluated
+        at every render() and emitted as gauges. Returns fn, so it can decorate.
+        """
+        with self._lock:
+            self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for m in self._metrics:
+            lines.extend(m.render())
+        with self._lock:
+            collectors = list(self._collectors)
+        for fn in collectors:
+            try:
+                gauges = fn()
+            except Exception:
+                continue
+            for name, help_text, values in gauges:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} gauge")
+                for labels, v in values:
+                    lines.append(f"{name}{_labels_text(tuple(labels), tuple(labels.values()))} {v:g}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("clashsub_stage_seconds", "Time spent per conversion stage", ["stage"])
+NODES = REGISTRY.counter("clashsub_nodes_total", "Valid node lines seen, by protocol", ["protocol"])
+PARSE_FAILURES = REGISTRY.counter("clashsub_parse_failures_total", "Node lines that failed to parse, by protocol", ["protocol"])
+FETCHES = REGISTRY.counter("clashsub_fetch_total", "Subscription fetches by result (hit / revalidated / miss / stale / error)", ["status"])
+CONVERSIONS = REGISTRY.counter("clashsub_conversions_total", "Finished conversions by entry point and result", ["entry", "result"])
+STATIC_WRITES = REGISTRY.counter("clashsub_static_writes_total", "Static output publishes by result (written / unchanged)", ["result"])
+STATIC_BYTES = REGISTRY.counter("clashsub_static_bytes_written_total", "Bytes written to the static dir, by format (raw / gz / br)", ["format"])
+
+
+class Trace:
+    """Spans recorded during one conversion, in completion order."""
+
+    __slots__ = ("spans", "started")
+
+    def __init__(self):
+        self.spans = []
+        self.started = time.perf_counter()
+
+    def totals(self):
+        """{stage: (seconds, count)} summed over spans of the same stage."""
+        out = {}
+        for stage, seconds, _ in self.spans:
+            total, n = out.get(stage, (0.0, 0))
+            out[stage] = (total + seconds, n + 1)
+        return out
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+
+_current = ContextVar("clashsub_trace", default=None)
+
+
+@contextmanager
+def trace():
+    """Collects the spans of the enclosed code into a Trace."""
+    t = Trace()
+    token = _current.set(t)
+    try:
+        yield t
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(stage, detail=""):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage=stage)
+        t = _current.get()
+        if t is not None:
+            t.spans.append((stage, elapsed, detail))
+
+
+def render_metrics() -> str:
+    return REGISTRY.render()
+
+
+def serve_metrics(host, port):
+    """
+    Serves REGISTRY at http://host:port/metrics from a daemon thread, for
+    processes without a WSGI app of their own (the Streamlit page).
+    """
+    from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_message(self, *args):
+            pass
+
+    def app(environ, start_response):
+        if environ.get("PATH_INFO") != "/metrics":
+            start_response("404 Not Found", [("Content-Type", "text/plain")])
+            return [b"not found\n"]
+        data = render_metrics().encode("utf-8")
+        start_response("200 OK", [("Content-Type", "text/plain; version=0.0.4; charset=utf-8"), ("Content-Length", str(len(data)))])
+        return [data]
+
+    httpd = make_server(host, port, app, handler_class=QuietHandler)
+    threading.Thread(target=httpd.serve_forever, name="clashsub-metrics", daemon=True).start()
+    return httpd
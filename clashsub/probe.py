@@ -0,0 +1,234 @@
+"""
+Optional reachability probe before emission.
+
+Every emitted node lands in the url-test group, so each client re-tests all
+of them every 300 s. probe_proxies() connects once to every distinct
+server:port, concurrently on one asyncio loop (at most `concurrency`
+connections in flight, whatever is still running at `deadline` is
+abandoned), then drops the nodes that refused or timed out and sorts the
+rest by connect time (DNS lookup included).
+
+Only TCP-based nodes (vmess, vless, ss) can be probed this way. hysteria2
+and tuic run over QUIC/UDP, where an unanswered datagram proves nothing,
+so they are kept, after the measured ones, in their original order. With mode="tls" the probe also
+completes a TLS handshake (SNI from the node, certificate not verified) on
+nodes that use TLS, which catches ports that accept TCP but are not the
+proxy; plain vmess / vless (tls off, security=none) and ss nodes only get
+the TCP connect, a handshake would fail on them even when they are up.
+
+Results are cached per (host, port, mode, sni) for `ttl` seconds. Endpoints
+still pending at the deadline are kept and not cached. If no endpoint at
+all answers, nothing is dropped: that is far more likely a network problem
+on this side than a subscription full of dead nodes.
+"""
+import asyncio
+import os
+import ssl
+import threading
+import time
+
+from clashsub.metrics import span
+
+PROBE_MODES = ("tcp", "tls")
+PROBE_TIMEOUT = 3.0
+PROBE_DEADLINE = 10.0
+PROBE_CONCURRENCY = 64
+PROBE_TTL = 300
+PROBE_CACHE_MAX = 100000
+
+# 走 TCP 的协议；hysteria2 / tuic 是 QUIC（UDP），连 TCP 端口测不出什么
+TCP_TYPES = ("vmess", "vless", "ss")
+
+
+class ProbeCache:
+    """(host, port, mode, sni) -> (rtt or None, measured_at); entries older than `ttl` are ignored."""
+
+    def __init__(self, ttl=PROBE_TTL, max_entries=PROBE_CACHE_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stats = {"hit": 0, "miss": 0}
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Builds a cache from CLASHSUB_PROBE_TTL."""
+        return cls(ttl=float(os.getenv("CLASHSUB_PROBE_TTL", PROBE_TTL)))
+
+    def get_many(self, keys):
+        """{key: rtt or None} for the keys with a fresh entry."""
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and now - entry[1] < self.ttl:
+                    found[key] = entry[0]
+            self.stats["hit"] += len(found)
+            self.stats["miss"] += len(keys) - len(found)
+        return found
+
+    def put_many(self, results):
+        now = time.time()
+        with self._lock:
+            for key, rtt in results.items():
+                self._entries[key] = (rtt, now)
+            if len(self._entries) > self.max_entries:
+                # 先丢过期的，还不够就丢最早测的
+                self._entries = {k: v for k, v in self._entries.items() if now - v[1] < self.ttl}
+                while len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def uses_tls(p):
+    """Whether a TCP record talks TLS to its server (reality included)."""
+    if p.type == "vless":
+        return bool(p.tls) or p.reality is not None
+    return p.type == "vmess" and p.tls is True
+
+
+def probe_target(p, mode="tcp"):
+    """
+    (host, port, mode, sni) to probe for a record, or None if it cannot be
+    probed over TCP. mode="tls" falls back to "tcp" for nodes without TLS.
+    """
+    if p.type not in TCP_TYPES or not isinstance(p.server, str) or not p.server:
+        return None
+    try:
+        port = int(p.port)
+    except (TypeError, ValueError):
+        return None
+    if not 0 < port < 65536:
+        return None
+    sni = None
+    if mode == "tls" and not uses_tls(p):
+        mode = "tcp"
+    if mode == "tls":
+        sni = getattr(p, "servername", None) or (p.ws.host if p.ws is not None else None) or p.server
+        if not isinstance(sni, str):
+            sni = p.server
+    return (p.server, port, mode, sni)
+
+
+def _ssl_context():
+    ctx = ssl.create_default_context()
+    # 只测握手是否完成，不校验证书（节点本来就常用自签或借用别人的证书）
+    ctx.check_hostname = False
+    ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
+
+async def _probe_one(target, timeout, ssl_ctx):
+    host, port, mode, sni = target
+    start = time.perf_counter()
+    try:
+        if mode == "tls":
+            conn = asyncio.open_connection(host, port, ssl=ssl_ctx, server_hostname=sni)
+        else:
+            conn = asyncio.open_connection(host, port)
+        _, writer = await asyncio.wait_for(conn, timeout)
+    except (OSError, asyncio.TimeoutError, ssl.SSLError, ValueError, UnicodeError):
+        return None
+    rtt = time.perf_counter() - start
+    # 直接断开，不等对端确认关闭
+    writer.transport.abort()
+    return rtt
+
+
+async def _probe_all(targets, concurrency, timeout, deadline):
+    sem = asyncio.Semaphore(concurrency)
+    ssl_ctx = _ssl_context() if any(t[2] == "tls" for t in targets) else None
+
+    async def run(target):
+        async with sem:
+            return target, await _probe_one(target, timeout, ssl_ctx)
+
+    tasks = [asyncio.ensure_future(run(t)) for t in targets]
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    return dict(task.result() for task in done)
+
+
+def probe_endpoints(
+    targets,
+    concurrency=PROBE_CONCURRENCY,
+    timeout=PROBE_TIMEOUT,
+    deadline=PROBE_DEADLINE,
+    cache=None,
+):
+    """
+    Probes (host, port, mode, sni) targets. Returns {target: rtt seconds, or
+    None if unreachable}; targets not finished by the deadline are missing.
+    Synchronous: runs its own event loop, so call it from a plain thread.
+    """
+    targets = list(dict.fromkeys(targets))
+    results = cache.get_many(targets) if cache is not None else {}
+    todo = [t for t in targets if t not in results]
+    if todo:
+        loop = asyncio.new_event_loop()
+        try:
+            measured = loop.run_until_complete(_probe_all(todo, concurrency, timeout, deadline))
+        finally:
+            loop.close()
+        if cache is not None:
+            cache.put_many(measured)
+        results.update(measured)
+    return results
+
+
+def probe_proxies(
+    proxies,
+    mode="tcp",
+    concurrency=PROBE_CONCURRENCY,
+    timeout=PROBE_TIMEOUT,
+    deadline=PROBE_DEADLINE,
+    cache=None,
+):
+    """
+    Probes the records and returns (ranked, dropped, stats): reachable nodes
+    sorted by RTT, then the ones that could not be measured in their
+    original order; `dropped` are the unreachable ones.
+    """
+    if mode not in PROBE_MODES:
+        raise ValueError(f"probe 只支持 {' / '.join(PROBE_MODES)}：{mode}")
+    start = time.perf_counter()
+    targets = [probe_target(p, mode) for p in proxies]
+    with span("probe"):
+        results = probe_endpoints((t for t in targets if t is not None), concurrency, timeout, deadline, cache)
+
+    measured = []
+    unknown = []
+    dead = []
+    for i, (p, t) in enumerate(zip(proxies, targets)):
+        rtt = results.get(t, False) if t is not None else False
+        if rtt is False:
+            unknown.append(p)
+        elif rtt is None:
+            dead.append(p)
+        else:
+            measured.append((rtt, i, p))
+
+    if not measured and dead:
+        # 一个都连不上，多半是本机网络问题，不删节点
+        ranked, dropped = list(proxies), []
+    else:
+        measured.sort(key=lambda m: (m[0], m[1]))
+        ranked, dropped = [p for _, _, p in measured] + unknown, dead
+
+    stats = {
+        "endpoints": len({t for t in targets if t is not None}),
+        "reachable": len(measured),
+        "unreachable": len(dead),
+        "dropped": len(dropped),
+        "unprobed": len(unknown),
+        "dropped_nodes": [p.name for p in dropped],
+        "fastest_ms": round(measured[0][0] * 1000, 1) if measured else None,
+        "elapsed": time.perf_counter() - start,
+    }
+    return ranked, dropped, stats
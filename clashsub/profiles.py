@@ -0,0 +1,577 @@
+"""
+Saved subscription profiles with stable URLs.
+
+A profile keeps the inputs of one conversion (pasted / uploaded node text,
+subscription URLs, rules mode, manual rules, ...) under a stable ID, and its
+YAML always goes to the same file, `sub_<id>.yaml` in the static dir, so the
+client URL never changes. Converting the same inputs again reuses the same
+ID instead of writing a new file.
+
+The ID is public (it is in the URL), so every profile also gets a secret
+edit token when it is created; replacing a profile's inputs or settings
+requires that token (ProfileStore.save raises ProfileLocked otherwise).
+Converting exactly the same inputs again without the token only rebuilds
+the output and keeps the stored settings.
+
+ProfileScheduler regenerates due profiles in a background thread; every
+write is a temp file + os.replace, so a client never reads a half-written
+config. The janitor (ProfileStore.sweep) removes orphaned outputs (the old
+random `config_*.yaml` files, outputs of deleted profiles, stale temp files)
+once they are older than `max_age`, deletes profiles whose output has not
+been downloaded (nor the profile saved) within `profile_max_age`, and keeps
+the managed files, profile JSON included, under `max_bytes`, evicting
+orphans first, then the least recently saved profiles. Scheduled refresh is
+opt-in: profiles are created with interval 0.
+"""
+import hashlib
+import hmac
+import json
+import os
+import re
+import secrets
+import threading
+import time
+from collections import namedtuple
+
+from clashsub.core import (
+    DEDUPE_MODES,
+    DEFAULT_RULES_FILE,
+    GROUP_MODES,
+    NODE_DEDUPE,
+    generate_yaml,
+    iter_nodes,
+    scan_nodes,
+)
+from clashsub.ingest import iter_source_lines, max_source_bytes
+from clashsub.jobs import EMITTING, FETCHING, PARSING, PROBING
+from clashsub.metrics import CONVERSIONS, span
+from clashsub.probe import PROBE_MODES, probe_proxies
+from clashsub.publish import (
+    OUTPUT_ENCODING,
+    STATIC_COMPRESS,
+    compress_formats,
+    publish,
+    sibling_paths,
+    write_bytes_atomic,
+)
+from clashsub.rulecompiler import render_rule_providers, split_rule_providers, write_rule_provider_files
+from clashsub.rules import EMPTY_BLOCK, assemble_rules, compile_rules_text, load_default_rules
+
+STATIC_MAX_AGE = 7 * 24 * 3600
+PROFILE_MAX_AGE = 30 * 24 * 3600
+STATIC_MAX_BYTES = 512 * 1024 * 1024
+SCHEDULER_TICK = 60
+
+PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{4,32}$")
+OUTPUT_RE = re.compile(r"^(?:sub_(?P<id>[A-Za-z0-9_-]+)|config_[0-9a-f]+)\.yaml(?:\.gz|\.br)?$")
+TMP_MAX_AGE = 3600
+
+# yaml: 生成的配置（没有有效节点时为 None）；fetched: [(url, error, status)]；
+# rules: 合并后的 RuleBlock；providers: 拆出的 rule-providers（未启用或写入失败时为 None）；
+# probe: probe_proxies 的统计（未启用时为 None）
+Conversion = namedtuple(
+    "Conversion",
+    ["yaml", "stats", "invalids", "fetched", "rules", "providers", "provider_error", "source_count", "unchanged_sources", "probe"],
+    defaults=(None,),
+)
+
+# 决定输出内容的字段；相同输入得到相同 ID
+INPUT_FIELDS = (
+    "inputs",
+    "urls",
+    "rules_mode",
+    "manual_rules",
+    "rules_text",
+    "optimize_rules",
+    "rule_providers",
+    "dedupe",
+    "group_mode",
+    "probe",
+)
+
+
+class ProfileLocked(ValueError):
+    """The profile exists and the edit token is missing or wrong."""
+
+
+def make_profile(
+    inputs=(),
+    urls=(),
+    rules_mode="append",
+    manual_rules="",
+    rules_text=None,
+    optimize_rules=False,
+    rule_providers=False,
+    dedupe=None,
+    group_mode="inline",
+    probe=None,
+    interval=0,
+    profile_id=None,
+):
+    """
+    New profile dict. `inputs` is a list of (source name, node text) in
+    priority order; `rules_text` replaces the default rules file when given.
+    `probe` is None or a probe mode ("tcp" / "tls"), see clashsub.probe.
+    `interval` is the refresh period in seconds, 0 for no scheduled refresh.
+    Without `profile_id` the ID is derived from the inputs.
+    """
+    if rules_mode not in ("append", "manual"):
+        raise ValueError(f"rules_mode 只支持 append / manual：{rules_mode}")
+    dedupe = dedupe or NODE_DEDUPE
+    if dedupe not in DEDUPE_MODES:
+        raise ValueError(f"dedupe 只支持 {' / '.join(DEDUPE_MODES)}：{dedupe}")
+    if group_mode not in GROUP_MODES:
+        raise ValueError(f"group_mode 只支持 {' / '.join(GROUP_MODES)}：{group_mode}")
+    if probe is not None and probe not in PROBE_MODES:
+        raise ValueError(f"probe 只支持 {' / '.join(PROBE_MODES)}：{probe}")
+    profile = {
+        "inputs": [[src, text] for src, text in inputs],
+        "urls": list(urls),
+        "rules_mode": rules_mode,
+        "manual_rules": manual_rules or "",
+        "rules_text": rules_text,
+        "optimize_rules": bool(optimize_rules),
+        "rule_providers": bool(rule_providers),
+        "dedupe": dedupe,
+        "group_mode": group_mode,
+        "probe": probe,
+        "interval": interval,
+    }
+    if profile_id is None:
+        profile_id = profile_id_for(profile)
+    elif not PROFILE_ID_RE.match(profile_id):
+        raise ValueError("订阅 ID 只能包含字母、数字、_ 和 -，长度 4-32")
+    profile["id"] = profile_id
+    return profile
+
+
+def profile_id_for(profile) -> str:
+    blob = json.dumps([profile[k] for k in INPUT_FIELDS], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(blob.encode("utf-8"), digest_size=6).hexdigest()
+
+
+def write_atomic(path, text, encoding="utf-8"):
+    """Writes via a temp file in the same directory + os.replace."""
+    write_bytes_atomic(path, text.encode(encoding))
+
+
+class ProfileStore:
+    """
+    Profiles as <profile_dir>/<id>.json, outputs as <static_dir>/sub_<id>.yaml
+    plus precompressed siblings (`compress` formats, see clashsub.publish).
+    `rules_url` is the public URL of <static_dir>/rules, for profiles that
+    split their rules into rule-providers.
+    """
+
+    def __init__(
+        self,
+        profile_dir,
+        static_dir,
+        rules_url="",
+        rules_file=DEFAULT_RULES_FILE,
+        max_age=STATIC_MAX_AGE,
+        max_bytes=STATIC_MAX_BYTES,
+        compress=STATIC_COMPRESS,
+        profile_max_age=PROFILE_MAX_AGE,
+    ):
+        self.profile_dir = profile_dir
+        self.static_dir = static_dir
+        self.rules_url = rules_url
+        self.rules_file = rules_file
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self.compress = tuple(compress)
+        self.profile_max_age = profile_max_age
+        self._lock = threading.Lock()
+        os.makedirs(self.profile_dir, exist_ok=True)
+        os.makedirs(self.static_dir, exist_ok=True)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Builds a store from CLASHSUB_PROFILE_DIR / _STATIC_DIR / _STATIC_MAX_AGE_DAYS /
+        _STATIC_MAX_MB / _STATIC_COMPRESS / _PROFILE_MAX_AGE_DAYS.
+        """
+        server_host = os.getenv("CLASHSUB_SERVER_HOST", "https://change.padaro.top")
+        static_url_prefix = os.getenv("CLASHSUB_STATIC_URL_PREFIX", "/static").rstrip("/")
+        return cls(
+            profile_dir=os.getenv("CLASHSUB_PROFILE_DIR", "/opt/clashsub-change/profiles"),
+            static_dir=os.getenv("CLASHSUB_STATIC_DIR", "/opt/clashsub-change/static"),
+            rules_url=f"{server_host}{static_url_prefix}/rules",
+            rules_file=os.getenv("CLASHSUB_RULES_FILE", DEFAULT_RULES_FILE),
+            max_age=float(os.getenv("CLASHSUB_STATIC_MAX_AGE_DAYS", STATIC_MAX_AGE / 86400)) * 86400,
+            max_bytes=int(float(os.getenv("CLASHSUB_STATIC_MAX_MB", STATIC_MAX_BYTES / 1024 / 1024)) * 1024 * 1024),
+            compress=compress_formats(os.getenv("CLASHSUB_STATIC_COMPRESS", ",".join(STATIC_COMPRESS))),
+            profile_max_age=float(os.getenv("CLASHSUB_PROFILE_MAX_AGE_DAYS", PROFILE_MAX_AGE / 86400)) * 86400,
+        )
+
+    # ---------- 存取 ----------
+    def _path(self, profile_id):
+        return os.path.join(self.profile_dir, f"{profile_id}.json")
+
+    @staticmethod
+    def output_name(profile_id):
+        return f"sub_{profile_id}.yaml"
+
+    def output_path(self, profile_id):
+        return os.path.join(self.static_dir, self.output_name(profile_id))
+
+    def get(self, profile_id):
+        if not PROFILE_ID_RE.match(profile_id or ""):
+            return None
+        try:
+            with open(self._path(profile_id), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def owns(profile, token):
+        """Whether `token` is the profile's edit token."""
+        stored = profile.get("edit_token")
+        return bool(stored and token) and hmac.compare_digest(stored, token)
+
+    def check_edit(self, profile_id, token):
+        """Raises ProfileLocked unless `profile_id` is free or `token` is its edit token."""
+        old = self.get(profile_id)
+        if old is not None and not self.owns(old, token):
+            raise ProfileLocked(f"订阅 {profile_id} 已存在，修改它需要创建时给出的编辑密钥")
+
+    def save(self, profile, token=None):
+        """
+        Stores the profile; keeps created_at / built_at of an existing one with
+        the same ID. A new profile gets a fresh edit token. Overwriting an
+        existing one needs its token, except when the inputs are identical
+        (the same conversion again), which keeps the stored settings.
+        """
+        with self._lock:
+            old = self.get(profile["id"])
+            profile = dict(profile)
+            if old is None:
+                profile["edit_token"] = secrets.token_urlsafe(16)
+            elif self.owns(old, token):
+                profile["edit_token"] = old["edit_token"]
+            elif all(profile.get(k) == old.get(k) for k in INPUT_FIELDS):
+                profile = dict(profile, interval=old.get("interval", 0), edit_token=old.get("edit_token"))
+            else:
+                raise ProfileLocked(f"订阅 {profile['id']} 已存在，修改它需要创建时给出的编辑密钥")
+            old = old or {}
+            now = time.time()
+            profile["created_at"] = old.get("created_at", now)
+            profile["updated_at"] = now
+            profile.setdefault("built_at", old.get("built_at"))
+            # 输出文件还在原处，记住它的摘要，内容没变时就不用重写
+            profile.setdefault("output_digest", old.get("output_digest"))
+            write_atomic(self._path(profile["id"]), json.dumps(profile, ensure_ascii=False))
+            return profile
+
+    def delete(self, profile_id):
+        output = self.output_path(profile_id)
+        for path in (self._path(profile_id), output, *sibling_paths(output).values()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def list(self):
+        profiles = []
+        for name in os.listdir(self.profile_dir):
+            if name.endswith(".json"):
+                profile = self.get(name[:-5])
+                if profile is not None:
+                    profiles.append(profile)
+        return profiles
+
+    def _stored_build(self, profile):
+        """
+        (stored profile, current) for a profile a build was rendered from:
+        the stored one is None when it was deleted meanwhile, and current is
+        False when it was saved again (edited) after `profile` was read.
+        The caller holds self._lock.
+        """
+        stored = self.get(profile["id"])
+        return stored, stored is not None and stored.get("updated_at") == profile.get("updated_at")
+
+    def _record_build(self, stored, **fields):
+        """Writes only the build fields (built_at, error, output_*) onto the stored profile."""
+        profile = dict(stored, **fields)
+        write_atomic(self._path(profile["id"]), json.dumps(profile, ensure_ascii=False))
+        return profile
+
+    def write_output(self, profile, yaml_text):
+        """
+        Publishes the config to the profile's stable file (skipped when the
+        content digest is unchanged) and records the build time, the digest
+        and the raw / compressed sizes. A rewrite keeps the access time of
+        the previous file, so the janitor still sees when it was last read.
+        Nothing is written for a profile deleted (returns None) or edited
+        (returns the stored one) while the config was being generated.
+        """
+        with self._lock:
+            stored, current = self._stored_build(profile)
+            if not current:
+                return stored
+            path = self.output_path(profile["id"])
+            last_read = self._last_read(path)
+            with span("write"):
+                result = publish(path, yaml_text.encode(OUTPUT_ENCODING), self.compress, stored.get("output_digest"))
+            if result.written and last_read is not None:
+                for f in (path, *(sibling_paths(path)[fmt] for fmt in self.compress)):
+                    try:
+                        os.utime(f, (last_read, os.stat(f).st_mtime))
+                    except OSError:
+                        pass
+            return self._record_build(
+                stored,
+                built_at=time.time(),
+                error=None,
+                output_digest=result.digest,
+                output_sizes=result.sizes,
+                output_written=result.written,
+            )
+
+    # ---------- 重新生成 ----------
+    def render(self, profile, cache=None, memo=None, timeout=None, deadline=None, progress=None, probe_cache=None):
+        """
+        Runs the conversion for a profile; `progress(stage, detail)` is called
+        as it moves through FETCHING / PARSING / PROBING / EMITTING. Returns a
+        Conversion whose yaml is None when no node could be parsed.
+        """
+        progress = progress or (lambda stage, detail="": None)
+        sources = [src for src, text in profile["inputs"] if text.strip()]
+        contents = [text for _, text in profile["inputs"] if text.strip()]
+        fetched = []
+        if profile["urls"]:
+            from clashsub.fetch import FETCH_DEADLINE, FETCH_TIMEOUT, fetch_subscriptions
+
+            progress(FETCHING, f"{len(profile['urls'])} 个订阅")
+            results = fetch_subscriptions(
+                profile["urls"],
+                timeout=timeout or FETCH_TIMEOUT,
+                deadline=deadline or FETCH_DEADLINE,
+                cache=cache,
+                decode=iter_source_lines,
+                max_bytes=max_source_bytes(),
+            )
+            for url, text, err, status in results:
+                fetched.append((url, err, status))
+                if err is None and text.strip():
+                    sources.append(url)
+                    contents.append(text)
+
+        unchanged = 0
+        if memo is not None:
+            unchanged = sum(not memo.source_changed(src, text) for src, text in zip(sources, contents))
+        progress(PARSING, f"{len(sources)} 个来源")
+        proxies, invalids, stats = scan_nodes(iter_nodes(contents), dedupe=profile["dedupe"], memo=memo)
+
+        use_default = profile["rules_mode"] == "append"
+        if not use_default:
+            default_block = EMPTY_BLOCK
+        elif profile.get("rules_text") is not None:
+            default_block = compile_rules_text(profile["rules_text"], profile["optimize_rules"])
+        else:
+            default_block = load_default_rules(self.rules_file, profile["optimize_rules"])
+        rules = assemble_rules(default_block, profile["manual_rules"], use_default)
+        rules_content = rules.text
+
+        rule_providers = ""
+        providers = provider_error = None
+        if profile.get("rule_providers"):
+            split, rules_content = split_rule_providers(rules_content)
+            try:
+                write_rule_provider_files(split, os.path.join(self.static_dir, "rules"), self.compress)
+                rule_providers = render_rule_providers(split, self.rules_url)
+                providers = split
+            except OSError as e:
+                # 写不了规则集就退回内联规则
+                provider_error = e
+                rules_content = rules.text
+
+        probe_stats = None
+        if proxies and profile.get("probe"):
+            progress(PROBING, f"{len(proxies)} 个节点")
+            proxies, _, probe_stats = probe_proxies(proxies, profile["probe"], cache=probe_cache)
+
+        yaml_text = None
+        if proxies:
+            progress(EMITTING, f"{len(proxies)} 个节点")
+            yaml_text = generate_yaml(proxies, rules_content, " | ".join(sources), profile["group_mode"], rule_providers, memo)
+        return Conversion(
+            yaml_text, stats, invalids, fetched, rules, providers, provider_error, len(sources), unchanged, probe_stats
+        )
+
+    def refresh(self, profile, **render_kwargs):
+        """
+        Regenerates one profile. On failure the previous file stays in place
+        and the error is recorded on the profile. Returns the updated profile,
+        or None when it was deleted in the meantime (see write_output()).
+        """
+        try:
+            conv = self.render(profile, **render_kwargs)
+            yaml_text = conv.yaml
+            errors = [f"{url}: {err}" for url, err, _ in conv.fetched if err is not None]
+        except Exception as e:
+            yaml_text, errors = None, [str(e)]
+            CONVERSIONS.inc(entry="refresh", result="error")
+        else:
+            CONVERSIONS.inc(entry="refresh", result="ok" if yaml_text is not None else "empty")
+        if yaml_text is None:
+            with self._lock:
+                stored, current = self._stored_build(profile)
+                if not current:
+                    return stored
+                return self._record_build(stored, built_at=time.time(), error="; ".join(errors) or "未识别到有效节点")
+        return self.write_output(profile, yaml_text)
+
+    def due(self, now=None):
+        now = time.time() if now is None else now
+        return [
+            p
+            for p in self.list()
+            if p.get("interval") and now - (p.get("built_at") or 0) >= p["interval"]
+        ]
+
+    def refresh_due(self, **render_kwargs):
+        """Regenerates every profile whose interval has passed; returns how many."""
+        profiles = self.due()
+        for profile in profiles:
+            self.refresh(profile, **render_kwargs)
+        return len(profiles)
+
+    @staticmethod
+    def _last_read(path):
+        """Latest access time of an output and its siblings, or None."""
+        times = []
+        for f in (path, *sibling_paths(path).values()):
+            try:
+                times.append(os.stat(f).st_atime)
+            except OSError:
+                pass
+        return max(times) if times else None
+
+    # ---------- 清理 ----------
+    def sweep(self, now=None):
+        """
+        Janitor pass over the profile and static dirs. Returns
+        {"expired": n, "evicted": n, "profiles_expired": n, "profiles_evicted": n, "bytes": total after}.
+        """
+        now = time.time() if now is None else now
+        result = {"expired": 0, "evicted": 0, "profiles_expired": 0, "profiles_evicted": 0}
+        with self._lock:
+            sizes = {}
+            for name in os.listdir(self.profile_dir):
+                if not name.endswith(".json"):
+                    continue
+                pid = name[:-5]
+                profile = self.get(pid)
+                try:
+                    size = os.stat(self._path(pid)).st_size
+                except OSError:
+                    continue
+                if profile is not None and self.profile_max_age:
+                    # 最近一次被客户端下载（输出文件的访问时间）或被保存的时间；定时重新生成不算
+                    last_read = self._last_read(self.output_path(pid)) or 0
+                    if now - max(last_read, profile.get("updated_at") or 0) > self.profile_max_age:
+                        self.delete(pid)
+                        result["profiles_expired"] += 1
+                        continue
+                sizes[pid] = size  # 订阅的 JSON 也计入配额
+            total = sum(sizes.values())
+
+            orphans = []
+            for name in os.listdir(self.static_dir):
+                path = os.path.join(self.static_dir, name)
+                if name.endswith(".tmp"):
+                    # 写到一半崩溃留下的临时文件
+                    try:
+                        if now - os.stat(path).st_mtime > TMP_MAX_AGE:
+                            os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                m = OUTPUT_RE.match(name)
+                if m is None:
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                # 最近一次被读或被写的时间（文件系统开了 noatime 时只有写入时间）
+                used = max(st.st_atime, st.st_mtime)
+                if m.group("id") in sizes:
+                    sizes[m.group("id")] += st.st_size  # .yaml 和 .gz / .br 都算在订阅名下
+                elif now - used > self.max_age:
+                    self._remove(path)
+                    result["expired"] += 1
+                    continue
+                else:
+                    orphans.append((used, st.st_size, path))
+                total += st.st_size
+
+            if total > self.max_bytes:
+                for _, size, path in sorted(orphans):
+                    if total <= self.max_bytes:
+                        break
+                    self._remove(path)
+                    total -= size
+                    result["evicted"] += 1
+            if total > self.max_bytes:
+                # 最久没有保存过的订阅先淘汰
+                profiles = sorted(
+                    (p for p in (self.get(pid) for pid in sizes) if p is not None),
+                    key=lambda p: p.get("updated_at") or 0,
+                )
+                for p in profiles:
+                    if total <= self.max_bytes:
+                        break
+                    self.delete(p["id"])
+                    total -= sizes[p["id"]]
+                    result["profiles_evicted"] += 1
+        result["bytes"] = total
+        return result
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class ProfileScheduler:
+    """
+    Daemon thread: every `tick` seconds regenerates due profiles, then runs
+    the janitor. `render_kwargs` (cache, memo, timeouts) go to ProfileStore.render.
+    """
+
+    def __init__(self, store, tick=SCHEDULER_TICK, **render_kwargs):
+        self.store = store
+        self.tick = tick
+        self.render_kwargs = render_kwargs
+        self.last_sweep = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="clashsub-profiles", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def run_once(self):
+        refreshed = self.store.refresh_due(**self.render_kwargs)
+        self.last_sweep = self.store.sweep()
+        return refreshed
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                # 调度线程不能因为单次失败退出
+                print(f"⚠️ 订阅定时刷新失败：{e}", flush=True)
+            self._stop.wait(self.tick)
@@ -0,0 +1,410 @@
+"""
+Typed proxy records, one slotted class per protocol.
+
+Compared with the old per-node dicts (10-15 string keys, plus nested dicts
+for ws / reality options) a record only stores its values, and the values
+that repeat across a subscription (server, sni, host, path, network, ...)
+are interned so every node shares one copy. Each class knows its own field
+set, so emit() writes the Clash YAML entry without probing for keys; the
+output is byte-identical to the old dict emitter. to_dict() rebuilds the
+old dict shape for code that still wants it.
+
+identity() is the endpoint key used for semantic dedup: two records with
+the same identity connect to the same server the same way, whatever their
+names or the order of the original query parameters.
+"""
+import json
+import sys
+
+
+def intern_value(v):
+    """sys.intern for strings; other values (vmess JSON may hold anything) pass through."""
+    return sys.intern(v) if type(v) is str else v
+
+
+def _scalar(v):
+    # 与旧实现一致：布尔值输出 true / false，其它原样
+    return str(v).lower() if isinstance(v, bool) else v
+
+
+class WsOpts:
+    __slots__ = ("path", "host")
+
+    def __init__(self, path, host):
+        self.path = intern_value(path)
+        self.host = intern_value(host)
+
+    def __eq__(self, other):
+        return type(other) is WsOpts and (self.path, self.host) == (other.path, other.host)
+
+    def emit(self, field):
+        return f'{field}ws-opts:\n{field}  path: "{self.path}"\n{field}  headers:\n{field}    Host: {self.host}\n'
+
+    def to_dict(self):
+        return {"path": self.path, "headers": {"Host": self.host}}
+
+
+class RealityOpts:
+    __slots__ = ("public_key", "short_id")
+
+    def __init__(self, public_key, short_id=None):
+        self.public_key = intern_value(public_key)
+        self.short_id = intern_value(short_id)
+
+    def __eq__(self, other):
+        return type(other) is RealityOpts and (self.public_key, self.short_id) == (other.public_key, other.short_id)
+
+    def emit(self, field):
+        out = f"{field}reality-opts:\n{field}  public-key: {self.public_key}\n"
+        if self.short_id is not None:
+            out += f"{field}  short-id: {self.short_id}\n"
+        return out
+
+    def to_dict(self):
+        d = {"public-key": self.public_key}
+        if self.short_id is not None:
+            d["short-id"] = self.short_id
+        return d
+
+
+class ProxyRecord:
+    """Common fields; subclasses add their own and define `type` and emit()."""
+
+    # line_key: 来自 ParseMemo 时为原始行的摘要，用来复用已经生成好的 YAML 片段；不参与比较
+    # 记录建好之后不再修改（改名用 renamed()），所以可以在多个请求之间共享
+    __slots__ = ("name", "server", "port", "line_key")
+    type = None
+
+    def __eq__(self, other):
+        return type(other) is type(self) and all(
+            getattr(self, k) == getattr(other, k) for k in self._fields
+        )
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.name!r}, {self.server!r}, {self.port!r})"
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # 参与比较 / 复制的字段（line_key 除外）
+        cls._fields = ("name", "server", "port") + cls.__slots__
+
+    def renamed(self, name):
+        """
+        Copy with another name, or self if the name is unchanged. Records are
+        never mutated once built, so ParseMemo can share them between requests.
+        """
+        if name == self.name:
+            return self
+        cls = type(self)
+        new = object.__new__(cls)
+        for k in cls._fields:
+            setattr(new, k, getattr(self, k))
+        new.name = name
+        new.line_key = getattr(self, "line_key", None)
+        return new
+
+    def identity(self):
+        """(type, server, port, credential, network, path, sni, ...); equal keys mean the same endpoint."""
+        raise NotImplementedError
+
+    def _server_key(self):
+        return self.server.lower() if type(self.server) is str else self.server
+
+    def _head(self, indent, field):
+        return f'{indent}- name: "{self.name}"\n{field}type: {self.type}\n{field}server: {self.server}\n{field}port: {self.port}\n'
+
+    def emit(self, indent="  "):
+        raise NotImplementedError
+
+    def to_dict(self):
+        raise NotImplementedError
+
+
+class VmessProxy(ProxyRecord):
+    __slots__ = ("uuid", "alter_id", "cipher", "network", "tls", "skip_cert_verify", "ws")
+    type = "vmess"
+
+    def __init__(self, name, server, port, uuid, alter_id, cipher, network, tls, skip_cert_verify, ws=None):
+        self.name = name
+        self.server = intern_value(server)
+        self.port = port
+        self.uuid = uuid
+        self.alter_id = alter_id
+        self.cipher = intern_value(cipher)
+        self.network = intern_value(network)
+        self.tls = tls
+        self.skip_cert_verify = skip_cert_verify
+        self.ws = ws
+
+    def emit(self, indent="  "):
+        field = indent + "  "
+        out = (
+            self._head(indent, field)
+            + f"{field}uuid: {_scalar(self.uuid)}\n"
+            + f"{field}udp: true\n"
+            + f"{field}tls: {_scalar(self.tls)}\n"
+            + f"{field}network: {_scalar(self.network)}\n"
+            + f"{field}alterId: {self.alter_id}\n"
+            + f"{field}cipher: {_scalar(self.cipher)}\n"
+            + f"{field}skip-cert-verify: {_scalar(self.skip_cert_verify)}\n"
+        )
+        if self.ws is not None:
+            out += self.ws.emit(field)
+        return out
+
+    def identity(self):
+        # vmess 没有 sni，用 ws 的 Host 代替
+        ws = self.ws
+        path, host = (ws.path, ws.host) if ws else (None, None)
+        return ("vmess", self._server_key(), self.port, self.uuid, self.network, path, host, self.tls)
+
+    def to_dict(self):
+        d = {
+            "name": self.name,
+            "type": "vmess",
+            "server": self.server,
+            "port": self.port,
+            "uuid": self.uuid,
+            "alterId": self.alter_id,
+            "cipher": self.cipher,
+            "network": self.network,
+            "tls": self.tls,
+            "udp": True,
+            "skip-cert-verify": self.skip_cert_verify,
+        }
+        if self.ws is not None:
+            d["ws-opts"] = self.ws.to_dict()
+        return d
+
+
+class VlessProxy(ProxyRecord):
+    __slots__ = ("uuid", "network", "servername", "skip_cert_verify", "flow", "client_fingerprint", "ws", "reality", "tls")
+    type = "vless"
+
+    def __init__(
+        self,
+        name,
+        server,
+        port,
+        uuid,
+        network,
+        servername,
+        skip_cert_verify,
+        client_fingerprint,
+        flow=None,
+        ws=None,
+        reality=None,
+        tls=True,
+    ):
+        self.name = name
+        self.server = intern_value(server)
+        self.port = port
+        self.uuid = uuid
+        self.network = intern_value(network)
+        self.servername = intern_value(servername)
+        self.skip_cert_verify = skip_cert_verify
+        self.client_fingerprint = intern_value(client_fingerprint)
+        self.flow = intern_value(flow)
+        self.ws = ws
+        self.reality = reality
+        # security=none 的明文节点为 False
+        self.tls = tls
+
+    def emit(self, indent="  "):
+        field = indent + "  "
+        out = self._head(indent, field) + f"{field}uuid: {self.uuid}\n{field}udp: true\n{field}tls: {_scalar(self.tls)}\n"
+        if self.flow is not None:
+            out += f"{field}flow: {self.flow}\n"
+        out += (
+            f"{field}servername: {self.servername}\n"
+            f"{field}client-fingerprint: {self.client_fingerprint}\n"
+            f"{field}network: {self.network}\n"
+            f"{field}skip-cert-verify: {_scalar(self.skip_cert_verify)}\n"
+        )
+        if self.ws is not None:
+            out += self.ws.emit(field)
+        if self.reality is not None:
+            out += self.reality.emit(field)
+        return out
+
+    def identity(self):
+        ws = self.ws
+        path, host = (ws.path, ws.host) if ws else (None, None)
+        return ("vless", self._server_key(), self.port, self.uuid, self.network, path, self.servername, host)
+
+    def to_dict(self):
+        d = {
+            "name": self.name,
+            "type": "vless",
+            "server": self.server,
+            "port": self.port,
+            "uuid": self.uuid,
+            "udp": True,
+            "tls": self.tls,
+            "network": self.network,
+            "servername": self.servername,
+            "skip-cert-verify": self.skip_cert_verify,
+        }
+        if self.ws is not None:
+            d["ws-opts"] = self.ws.to_dict()
+        if self.flow is not None:
+            d["flow"] = self.flow
+        d["client-fingerprint"] = self.client_fingerprint
+        if self.reality is not None:
+            d["reality-opts"] = self.reality.to_dict()
+        return d
+
+
+class Hysteria2Proxy(ProxyRecord):
+    __slots__ = ("password", "sni", "skip_cert_verify")
+    type = "hysteria2"
+
+    def __init__(self, name, server, port, password, sni, skip_cert_verify):
+        self.name = name
+        self.server = intern_value(server)
+        self.port = port
+        self.password = password
+        self.sni = intern_value(sni)
+        self.skip_cert_verify = skip_cert_verify
+
+    def emit(self, indent="  "):
+        field = indent + "  "
+        return (
+            self._head(indent, field)
+            + f"{field}password: {self.password}\n"
+            + f"{field}udp: true\n"
+            + f"{field}sni: {self.sni}\n"
+            + f"{field}skip-cert-verify: {_scalar(self.skip_cert_verify)}\n"
+        )
+
+    def identity(self):
+        return ("hysteria2", self._server_key(), self.port, self.password, None, None, self.sni)
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            "type": "hysteria2",
+            "server": self.server,
+            "port": self.port,
+            "password": self.password,
+            "sni": self.sni,
+            "skip-cert-verify": self.skip_cert_verify,
+            "udp": True,
+        }
+
+
+class TuicProxy(ProxyRecord):
+    __slots__ = ("uuid", "password", "sni", "congestion_controller", "skip_cert_verify", "alpn")
+    type = "tuic"
+
+    def __init__(self, name, server, port, uuid, password, sni, congestion_controller, skip_cert_verify, alpn=None):
+        self.name = name
+        self.server = intern_value(server)
+        self.port = port
+        self.uuid = uuid
+        self.password = password
+        self.sni = intern_value(sni)
+        self.congestion_controller = intern_value(congestion_controller)
+        self.skip_cert_verify = skip_cert_verify
+        # alpn 只有一个值（与旧实现一致），存成 tuple 以便共享
+        self.alpn = tuple(intern_value(a) for a in alpn) if alpn is not None else None
+
+    @property
+    def disable_sni(self):
+        return not self.sni
+
+    def emit(self, indent="  "):
+        field = indent + "  "
+        out = (
+            self._head(indent, field)
+            + f"{field}uuid: {self.uuid}\n"
+            + f"{field}password: {self.password}\n"
+            + f"{field}udp: true\n"
+            + f"{field}sni: {self.sni}\n"
+            + f"{field}skip-cert-verify: {_scalar(self.skip_cert_verify)}\n"
+            + f"{field}udp-relay-mode: native\n"
+            + f"{field}congestion-controller: {self.congestion_controller}\n"
+            + f"{field}disable-sni: {_scalar(self.disable_sni)}\n"
+        )
+        if self.alpn is not None:
+            out += f"{field}alpn:\n" + "".join(f"{field}  - {a}\n" for a in self.alpn)
+        return out
+
+    def identity(self):
+        return ("tuic", self._server_key(), self.port, (self.uuid, self.password), None, None, self.sni)
+
+    def to_dict(self):
+        d = {
+            "name": self.name,
+            "type": "tuic",
+            "server": self.server,
+            "port": self.port,
+            "uuid": self.uuid,
+            "password": self.password,
+            "sni": self.sni,
+            "udp-relay-mode": "native",
+            "congestion-controller": self.congestion_controller,
+            "skip-cert-verify": self.skip_cert_verify,
+            "udp": True,
+            "disable-sni": self.disable_sni,
+        }
+        if self.alpn is not None:
+            d["alpn"] = list(self.alpn)
+        return d
+
+
+def _quoted(v):
+    # 密码里可能有 : # 引号等，输出成 YAML 双引号字符串（JSON 字符串是合法的 YAML）
+    return json.dumps(str(v), ensure_ascii=False)
+
+
+class ShadowsocksProxy(ProxyRecord):
+    """
+    Shadowsocks, only reachable through structured inputs (SIP008 JSON,
+    Clash YAML); ss:// lines are still treated as unsupported.
+    plugin_opts is a tuple of (key, value) pairs in Clash's plugin-opts naming.
+    """
+
+    __slots__ = ("cipher", "password", "plugin", "plugin_opts")
+    type = "ss"
+
+    def __init__(self, name, server, port, cipher, password, plugin=None, plugin_opts=()):
+        self.name = name
+        self.server = intern_value(server)
+        self.port = port
+        self.cipher = intern_value(cipher)
+        self.password = password
+        self.plugin = intern_value(plugin)
+        self.plugin_opts = tuple((intern_value(k), intern_value(v)) for k, v in plugin_opts)
+
+    def emit(self, indent="  "):
+        field = indent + "  "
+        out = (
+            self._head(indent, field)
+            + f"{field}cipher: {self.cipher}\n"
+            + f"{field}password: {_quoted(self.password)}\n"
+            + f"{field}udp: true\n"
+        )
+        if self.plugin is not None:
+            out += f"{field}plugin: {self.plugin}\n"
+            if self.plugin_opts:
+                out += f"{field}plugin-opts:\n" + "".join(f"{field}  {k}: {_scalar(v)}\n" for k, v in self.plugin_opts)
+        return out
+
+    def identity(self):
+        return ("ss", self._server_key(), self.port, (self.cipher, self.password), self.plugin, self.plugin_opts, None)
+
+    def to_dict(self):
+        d = {
+            "name": self.name,
+            "type": "ss",
+            "server": self.server,
+            "port": self.port,
+            "cipher": self.cipher,
+            "password": self.password,
+            "udp": True,
+        }
+        if self.plugin is not None:
+            d["plugin"] = self.plugin
+            d["plugin-opts"] = dict(self.plugin_opts)
+        return d
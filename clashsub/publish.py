@@ -0,0 +1,141 @@
+"""
+Writing files into the static directory served to Clash clients.
+
+publish() writes a file together with precompressed siblings (<name>.gz,
+and <name>.br when the optional brotli package is installed) for
+nginx gzip_static / brotli_static style serving, so a client refresh
+downloads the compressed body without the web server compressing it on
+every request. Every file goes through a temp file + os.replace, siblings
+before the main file.
+
+Outputs keep stable names (sub_<id>.yaml is the URL a client polls, so
+it cannot change with the content); the content digest only decides
+whether anything has to be written: when it equals the one recorded for
+the previous write and all files are still there, nothing is written.
+The compressed files are deterministic (gzip mtime 0), so the same
+content always yields the same bytes.
+"""
+import gzip
+import hashlib
+import importlib.util
+import os
+import threading
+from collections import namedtuple
+
+from clashsub.metrics import STATIC_BYTES, STATIC_WRITES
+
+COMPRESS_FORMATS = ("gz", "br")
+STATIC_COMPRESS = ("gz",)
+# 网页 / 定时刷新写的静态文件和命令行输出用同一种编码，同样的输入得到同样的字节；
+# 不带 BOM：YAML 两者都认，JSON（sing-box）不允许 BOM
+OUTPUT_ENCODING = "utf-8"
+
+# digest: 内容摘要；written: 这次是否真的写了文件；sizes: {"raw": n, "gz": n, "br": n}
+Published = namedtuple("Published", ["digest", "written", "sizes"])
+
+
+def brotli_available():
+    return importlib.util.find_spec("brotli") is not None
+
+
+def compress_formats(value):
+    """
+    Parses "gz,br" into a tuple of formats; br is left out when brotli is
+    not installed. An empty string disables precompression.
+    """
+    formats = []
+    for fmt in (v.strip() for v in value.split(",")):
+        if not fmt:
+            continue
+        if fmt not in COMPRESS_FORMATS:
+            raise ValueError(f"预压缩只支持 {' / '.join(COMPRESS_FORMATS)}：{fmt}")
+        if fmt == "br" and not brotli_available():
+            continue
+        if fmt not in formats:
+            formats.append(fmt)
+    return tuple(formats)
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def compress(data: bytes, fmt: str) -> bytes:
+    if fmt == "gz":
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if fmt == "br":
+        import brotli
+
+        return brotli.compress(data, mode=brotli.MODE_TEXT)
+    raise ValueError(f"unknown compression format: {fmt}")
+
+
+def write_bytes_atomic(path, data: bytes):
+    """Writes via a temp file in the same directory + os.replace."""
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def sibling_paths(path):
+    """{format: path} of every possible precompressed sibling."""
+    return {fmt: f"{path}.{fmt}" for fmt in COMPRESS_FORMATS}
+
+
+def publish(path, data: bytes, formats=STATIC_COMPRESS, previous_digest=None):
+    """
+    Writes `data` to `path` plus one sibling per format, unless
+    `previous_digest` shows the same content is already in place. Siblings
+    of formats no longer requested are removed. Returns Published.
+    """
+    digest = content_digest(data)
+    siblings = sibling_paths(path)
+    if digest == previous_digest:
+        try:
+            sizes = {"raw": os.stat(path).st_size}
+            for fmt in formats:
+                sizes[fmt] = os.stat(siblings[fmt]).st_size
+        except OSError:
+            # 文件被删了（清理、手动删除），重新写
+            pass
+        else:
+            _remove_unused(siblings, formats)
+            STATIC_WRITES.inc(result="unchanged")
+            return Published(digest, False, sizes)
+
+    sizes = {"raw": len(data)}
+    for fmt in formats:
+        packed = compress(data, fmt)
+        write_bytes_atomic(siblings[fmt], packed)
+        sizes[fmt] = len(packed)
+        STATIC_BYTES.inc(len(packed), format=fmt)
+    write_bytes_atomic(path, data)
+    STATIC_BYTES.inc(len(data), format="raw")
+    STATIC_WRITES.inc(result="written")
+    _remove_unused(siblings, formats)
+    return Published(digest, True, sizes)
+
+
+def _remove_unused(siblings, formats):
+    # 关掉某种预压缩之后，旧的兄弟文件不能留着，否则会被当成最新内容返回
+    for fmt, sibling in siblings.items():
+        if fmt not in formats:
+            try:
+                os.remove(sibling)
+            except OSError:
+                pass
+
+
+def saved_ratio(sizes, fmt="gz"):
+    """Fraction of the raw size saved by the `fmt` sibling, or None."""
+    if not sizes.get("raw") or fmt not in sizes:
+        return None
+    return 1 - sizes[fmt] / sizes["raw"]
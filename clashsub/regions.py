@@ -0,0 +1,105 @@
+"""
+Region of a node from its name, for group_mode="region".
+
+Every keyword of every region (flag emoji, Chinese country / city names,
+English names, ISO codes) is compiled into one alternation with a named
+group per region, so classifying a name is a single regex search; the
+leftmost match wins ("香港-日本 IPLC" is a Hong Kong entry node).
+ASCII keywords only match as whole words: "US" matches "US-01" but not
+"BUS" or "USDT", "India" does not match "Indiana". The regex is compiled
+on first use, so importing the module stays cheap.
+"""
+import os
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# code: ISO 3166 代码（旗帜由它算出）；names: 中文 / 英文关键字，英文不区分大小写；codes: 只匹配大写
+Region = namedtuple("Region", ["code", "label", "names", "codes"])
+
+REGIONS = (
+    Region("HK", "香港", ("香港", "Hong Kong", "HongKong"), ("HK", "HKG")),
+    Region("TW", "台湾", ("台湾", "臺灣", "台北", "新北", "彰化", "Taiwan", "Taipei"), ("TW", "TWN")),
+    Region("JP", "日本", ("日本", "东京", "東京", "大阪", "埼玉", "Japan", "Tokyo", "Osaka"), ("JP", "JPN")),
+    Region("SG", "新加坡", ("新加坡", "狮城", "獅城", "Singapore"), ("SG", "SGP")),
+    Region(
+        "US",
+        "美国",
+        ("美国", "美國", "洛杉矶", "圣何塞", "硅谷", "西雅图", "纽约", "芝加哥", "达拉斯", "凤凰城",
+         "United States", "Los Angeles", "San Jose", "Silicon Valley", "Seattle", "New York", "Chicago", "Dallas"),
+        ("US", "USA"),
+    ),
+    Region("KR", "韩国", ("韩国", "韓國", "首尔", "首爾", "春川", "Korea", "Seoul"), ("KR", "KOR")),
+    Region("GB", "英国", ("英国", "英國", "伦敦", "United Kingdom", "Britain", "London"), ("UK", "GB", "GBR")),
+    Region("DE", "德国", ("德国", "德國", "法兰克福", "Germany", "Frankfurt"), ("DE", "DEU")),
+    Region("FR", "法国", ("法国", "法國", "巴黎", "France", "Paris"), ("FR", "FRA")),
+    Region("NL", "荷兰", ("荷兰", "荷蘭", "阿姆斯特丹", "Netherlands", "Amsterdam"), ("NL", "NLD")),
+    Region("RU", "俄罗斯", ("俄罗斯", "俄羅斯", "莫斯科", "Russia", "Moscow"), ("RU", "RUS")),
+    Region("CA", "加拿大", ("加拿大", "多伦多", "温哥华", "Canada", "Toronto", "Vancouver"), ("CA", "CAN")),
+    Region("AU", "澳大利亚", ("澳大利亚", "澳洲", "悉尼", "Australia", "Sydney"), ("AU", "AUS")),
+    Region("IN", "印度", ("印度", "孟买", "India", "Mumbai"), ("IND",)),
+    Region("TR", "土耳其", ("土耳其", "伊斯坦布尔", "Turkey", "Türkiye", "Istanbul"), ("TR", "TUR")),
+)
+
+OTHER_GROUP = "🌐 其他地区"
+REGION_GROUP_TYPES = ("url-test", "fallback")
+# 地区分组的类型：url-test 选延迟最低的，fallback 按顺序用第一个可用的（配合测速排序）
+REGION_GROUP_TYPE = os.getenv("CLASHSUB_REGION_GROUP_TYPE", "url-test")
+
+
+def flag(code):
+    """Flag emoji of a two-letter ISO code."""
+    return "".join(chr(0x1F1E6 + ord(c) - ord("A")) for c in code)
+
+
+def group_name(region):
+    return f"{flag(region.code)} {region.label}节点"
+
+
+def _ascii_word(word, ignore_case):
+    body = re.escape(word)
+    if ignore_case:
+        body = f"(?i:{body})"
+    return rf"(?<![A-Za-z]){body}(?![A-Za-z])"
+
+
+def _pattern(region):
+    parts = [re.escape(flag(region.code))]
+    for name in region.names:
+        parts.append(_ascii_word(name, True) if name.isascii() else re.escape(name))
+    parts.extend(_ascii_word(code, False) for code in region.codes)
+    return f"(?P<{region.code}>{'|'.join(parts)})"
+
+
+@lru_cache(maxsize=None)
+def _region_re():
+    return re.compile("|".join(_pattern(r) for r in REGIONS))
+
+
+_BY_CODE = {r.code: r for r in REGIONS}
+
+
+def classify(name):
+    """Region of a node name, or None."""
+    m = _region_re().search(name)
+    return _BY_CODE[m.lastgroup] if m is not None else None
+
+
+def group_by_region(names):
+    """
+    [(group name, [node names])] in REGIONS order, names keeping their
+    input order; unmatched names go to OTHER_GROUP, last. Empty regions
+    are left out (Clash rejects a group without proxies).
+    """
+    buckets = {}
+    other = []
+    for name in names:
+        region = classify(name)
+        if region is None:
+            other.append(name)
+        else:
+            buckets.setdefault(region.code, []).append(name)
+    groups = [(group_name(r), buckets[r.code]) for r in REGIONS if r.code in buckets]
+    if other:
+        groups.append((OTHER_GROUP, other))
+    return groups
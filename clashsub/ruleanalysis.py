@@ -0,0 +1,286 @@
+"""
+Conflict / shadowing analysis for manual rules appended after the defaults.
+
+Clash stops at the first matching rule, so a manual rule placed after the
+defaults never fires when an earlier rule already matches everything it
+matches, and only partly fires when an earlier rule with another target
+matches some of it. Earlier rules are indexed once (a reversed-label suffix
+trie for DOMAIN / DOMAIN-SUFFIX, a keyword table, and sorted intervals for
+IP-CIDR / IP-CIDR6); each manual rule is then checked against the index.
+
+Only DOMAIN*, IP-CIDR* and MATCH are analyzed. GEOIP, PROCESS-NAME and
+logical rules are ignored: they would flag almost everything as overlapping.
+"""
+import bisect
+import re
+from functools import lru_cache
+
+from clashsub.rulecompiler import parse_rules
+
+UNREACHABLE = "unreachable"
+REDUNDANT = "redundant"
+PARTIAL = "partial"
+
+# 部分覆盖最多列出几条
+MAX_OVERLAPS = 5
+
+
+class _Node:
+    __slots__ = ("children", "domain", "suffix")
+
+    def __init__(self):
+        self.children = {}
+        self.domain = None
+        self.suffix = None
+
+
+class DomainTrie:
+    """Reversed-label trie: "www.example.com" is stored as com -> example -> www."""
+
+    def __init__(self):
+        self.root = _Node()
+
+    def add(self, r):
+        node = self.root
+        for label in reversed(r.value.split(".")):
+            node = node.children.setdefault(label, _Node())
+        # 每个节点只保留最早的一条，后面的同值规则本来就不会命中
+        if r.kind == "DOMAIN":
+            node.domain = node.domain or r
+        else:
+            node.suffix = node.suffix or r
+
+    def first_match(self, host):
+        """Earliest DOMAIN / DOMAIN-SUFFIX rule matching `host`, or None."""
+        best = None
+        node = self.root
+        labels = host.split(".")
+        for label in reversed(labels):
+            node = node.children.get(label)
+            if node is None:
+                return best
+            if node.suffix is not None and (best is None or node.suffix.pos < best.pos):
+                best = node.suffix
+        if node.domain is not None and (best is None or node.domain.pos < best.pos):
+            best = node.domain
+        return best
+
+    def first_suffix_cover(self, domain):
+        """Earliest DOMAIN-SUFFIX rule equal to or a parent of `domain`."""
+        best = None
+        node = self.root
+        for label in reversed(domain.split(".")):
+            node = node.children.get(label)
+            if node is None:
+                break
+            if node.suffix is not None and (best is None or node.suffix.pos < best.pos):
+                best = node.suffix
+        return best
+
+    def subtree(self, domain):
+        """All rules for `domain` and its subdomains (DOMAIN and DOMAIN-SUFFIX)."""
+        node = self.root
+        for label in reversed(domain.split(".")):
+            node = node.children.get(label)
+            if node is None:
+                return []
+        out = []
+        stack = [node]
+        while stack:
+            n = stack.pop()
+            if n.domain is not None:
+                out.append(n.domain)
+            if n.suffix is not None:
+                out.append(n.suffix)
+            stack.extend(n.children.values())
+        return out
+
+
+class CidrIndex:
+    """CIDRs of one IP version as sorted [start, end] intervals (CIDRs nest or are disjoint)."""
+
+    def __init__(self):
+        self.starts = []
+        self.entries = []
+        self.by_net = {}
+        # 出现过的 (前缀长度, 网络掩码)，按前缀长度排序
+        self.masks = []
+
+    def add(self, r):
+        start = int(r.net.network_address)
+        bits = r.net.max_prefixlen
+        prefix = r.net.prefixlen
+        i = bisect.bisect_right(self.starts, start)
+        self.starts.insert(i, start)
+        self.entries.insert(i, (start, start | ((1 << (bits - prefix)) - 1), r))
+        self.by_net.setdefault((start, prefix), []).append(r)
+        mask = ((1 << bits) - 1) >> (bits - prefix) << (bits - prefix)
+        if (prefix, mask) not in self.masks:
+            bisect.insort(self.masks, (prefix, mask))
+
+    def containing(self, net):
+        """Rules whose network contains `net`."""
+        if not self.by_net:
+            return []
+        # 只试索引里出现过的前缀长度，直接在整数上截断，比 ipaddress 的 supernet() 快得多
+        addr = int(net.network_address)
+        out = []
+        for prefix, mask in self.masks:
+            if prefix > net.prefixlen:
+                break
+            rules = self.by_net.get((addr & mask, prefix))
+            if rules:
+                out.extend(rules)
+        return out
+
+    def inside(self, net):
+        """Rules whose network lies inside `net` (net itself included)."""
+        lo = int(net.network_address)
+        hi = int(net.broadcast_address)
+        i = bisect.bisect_left(self.starts, lo)
+        out = []
+        while i < len(self.entries) and self.entries[i][0] <= hi:
+            if self.entries[i][1] <= hi:
+                out.append(self.entries[i][2])
+            i += 1
+        return out
+
+
+class RuleIndex:
+    """
+    Index of earlier rules. `upcoming` are rules that will be add()ed
+    later (the manual rules, checked one by one): their keywords go into
+    the keyword prefilter up front, so it is compiled once.
+    """
+
+    def __init__(self, rules=(), upcoming=()):
+        self.trie = DomainTrie()
+        self.keywords = []
+        # 关键词 -> 最早的一条，以及出现过的关键词长度：正则命中后按子串查表，不用逐条扫描
+        self._keyword_first = {}
+        self._keyword_lengths = set()
+        self.domain_rules = []
+        self.cidrs = {4: CidrIndex(), 6: CidrIndex()}
+        self.match = None
+        rules = list(rules)
+        self._filter_values = {r.value for r in rules + list(upcoming) if r.kind == "DOMAIN-KEYWORD" and r.target is not None}
+        self._keyword_re = None
+        # 不在预过滤正则里的关键词（没有提前告知就 add 的），线性扫描
+        self._unfiltered = []
+        for r in rules:
+            self.add(r)
+
+    def add(self, r):
+        if r.target is None:
+            return
+        if r.kind in ("DOMAIN", "DOMAIN-SUFFIX"):
+            self.trie.add(r)
+            self.domain_rules.append(r)
+        elif r.kind == "DOMAIN-KEYWORD":
+            self.keywords.append(r)
+            self._keyword_first.setdefault(r.value, r)
+            self._keyword_lengths.add(len(r.value))
+            if r.value not in self._filter_values:
+                self._unfiltered.append(r)
+        elif r.net is not None:
+            self.cidrs[r.net.version].add(r)
+        elif r.kind == "MATCH":
+            self.match = self.match or r
+
+    def _first_keyword_in(self, value):
+        # 先用一个合并了所有关键词（包括之后才 add 的手动规则）的正则判断有没有可能命中，
+        # 绝大多数规则到这里就结束；命中了才按顺序找最早的那条。
+        # 没提前告知的关键词先线性扫描，攒多了再并进正则重新编译
+        if len(self._unfiltered) > max(32, len(self._filter_values) // 2):
+            self._filter_values.update(k.value for k in self._unfiltered)
+            self._keyword_re = None
+            self._unfiltered = []
+        if self._keyword_re is None and self._filter_values:
+            self._keyword_re = re.compile("|".join(re.escape(v) for v in sorted(self._filter_values)))
+        if self._keyword_re is not None and self._keyword_re.search(value):
+            first = self._keyword_first
+            found = [
+                first[value[i : i + n]]
+                for n in self._keyword_lengths
+                for i in range(len(value) - n + 1)
+                if value[i : i + n] in first
+            ]
+            return min(found, key=lambda k: k.pos) if found else None
+        for k in self._unfiltered:
+            if k.value in value:
+                return k
+        return None
+
+    def first_cover(self, m):
+        """Earliest indexed rule matching everything `m` matches."""
+        cands = [self.match]
+        if m.kind == "DOMAIN":
+            cands.append(self.trie.first_match(m.value))
+            cands.append(self._first_keyword_in(m.value))
+        elif m.kind == "DOMAIN-SUFFIX":
+            cands.append(self.trie.first_suffix_cover(m.value))
+            cands.append(self._first_keyword_in(m.value))
+        elif m.kind == "DOMAIN-KEYWORD":
+            cands.append(self._first_keyword_in(m.value))
+        elif m.net is not None:
+            no_resolve = "no-resolve" in m.options
+            for r in self.cidrs[m.net.version].containing(m.net):
+                if no_resolve or "no-resolve" not in r.options:
+                    cands.append(r)
+        cands = [c for c in cands if c is not None]
+        return min(cands, key=lambda c: c.pos) if cands else None
+
+    def overlaps(self, m):
+        """Indexed rules matching part (not all) of what `m` matches, different target."""
+        out = []
+        if m.kind == "DOMAIN-SUFFIX":
+            out = [r for r in self.trie.subtree(m.value) if not (r.kind == "DOMAIN-SUFFIX" and r.value == m.value)]
+        elif m.kind == "DOMAIN-KEYWORD":
+            out = [r for r in self.domain_rules + self.keywords if m.value in r.value]
+        elif m.net is not None:
+            out = [r for r in self.cidrs[m.net.version].inside(m.net) if r.net != m.net]
+        return sorted((r for r in out if r.target != m.target), key=lambda r: r.pos)
+
+
+@lru_cache(maxsize=8)
+def build_index(rules_text: str):
+    """Index over an already-merged rule text (cached: the defaults rarely change)."""
+    rules = [r for r in parse_rules(rules_text) if not isinstance(r, str)]
+    return RuleIndex(rules), len(rules)
+
+
+def analyze_manual_rules(base_rules_text: str, manual_rules_text: str):
+    """
+    Checks each manual rule against the rules before it (all of
+    `base_rules_text`, then the earlier manual rules).
+    Returns a list of {"rule", "status", "by", "target"} for problem rules only:
+    status "unreachable" (never fires, traffic goes to another target),
+    "redundant" (never fires, same target anyway) or "partial"
+    (part of its traffic is taken by earlier rules with other targets).
+    """
+    base_index, offset = build_index(base_rules_text)
+    items = parse_rules(manual_rules_text, offset)
+    manual_index = RuleIndex(upcoming=[r for r in items if not isinstance(r, str)])
+    findings = []
+    for m in items:
+        if isinstance(m, str) or m.target is None:
+            continue
+
+        # 默认规则都排在手动规则前面，默认规则里有覆盖的就不用再查手动规则
+        by = base_index.first_cover(m) or manual_index.first_cover(m)
+        if by is not None:
+            status = REDUNDANT if by.target == m.target else UNREACHABLE
+            findings.append({"rule": m.text, "status": status, "by": [by.text], "target": by.target})
+        else:
+            overlaps = base_index.overlaps(m) + manual_index.overlaps(m)
+            if overlaps:
+                findings.append(
+                    {
+                        "rule": m.text,
+                        "status": PARTIAL,
+                        "by": [r.text for r in overlaps[:MAX_OVERLAPS]],
+                        "target": None,
+                    }
+                )
+        manual_index.add(m)
+    return findings
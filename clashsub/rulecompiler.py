@@ -0,0 +1,400 @@
+"""
+Rule-set compiler: parses rule lines into typed records and drops the ones
+that can never change the outcome.
+
+Clash evaluates rules top to bottom and stops at the first match, so a rule
+is redundant when
+- an EARLIER rule with the same target already matches everything it
+  matches (exact duplicates included), or
+- another rule in the same contiguous block of same-target rules matches
+  everything it matches (order inside such a block does not matter).
+Overlapping / adjacent IP-CIDR rules inside a block are merged as well.
+Rules whose target differs are never dropped here; see ruleanalysis for that.
+
+It can also split large same-target blocks into rule-providers
+(domain / ipcidr behavior) so clients download and cache them once.
+"""
+import hashlib
+import ipaddress
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+from clashsub.publish import publish
+
+DOMAIN_TYPES = ("DOMAIN", "DOMAIN-SUFFIX", "DOMAIN-KEYWORD")
+CIDR_TYPES = ("IP-CIDR", "IP-CIDR6")
+# 逻辑规则里的逗号不能简单切分，只做整行去重
+LOGICAL_TYPES = ("AND", "OR", "NOT", "SUB-RULE")
+
+Rule = namedtuple("Rule", ["pos", "kind", "value", "target", "options", "text", "net"])
+Rule.__doc__ = """
+One parsed rule line. `text` is the stripped line ("- DOMAIN,a.com,DIRECT"),
+`net` the ip_network for IP-CIDR / IP-CIDR6, `target` None for rules whose
+target cannot be determined (logical or malformed lines).
+"""
+
+CompiledRules = namedtuple("CompiledRules", ["items", "dropped"])
+
+PROVIDER_MIN_SIZE = 8
+PROVIDER_INTERVAL = 86400
+
+
+def parse_rule_line(line: str, pos: int = 0):
+    """Returns a Rule, or None for blank / comment lines."""
+    s = line.strip()
+    if not s or s.startswith("#"):
+        return None
+    body = s[1:].strip() if s.startswith("-") else s
+    kind, _, rest = body.partition(",")
+    kind = kind.strip().upper()
+
+    if kind in LOGICAL_TYPES:
+        return Rule(pos, kind, rest, None, (), s, None)
+    parts = [p.strip() for p in rest.split(",")]
+    if kind == "MATCH":
+        return Rule(pos, kind, "", parts[0], tuple(parts[1:]), s, None)
+    if len(parts) < 2 or not parts[1]:
+        return Rule(pos, kind, rest, None, (), s, None)
+
+    value, target, options = parts[0], parts[1], tuple(o.lower() for o in parts[2:])
+    net = None
+    if kind in CIDR_TYPES:
+        try:
+            net = ipaddress.ip_network(value, strict=False)
+        except ValueError:
+            return Rule(pos, kind, rest, None, (), s, None)
+    elif kind in DOMAIN_TYPES:
+        value = value.lower()
+    return Rule(pos, kind, value, target, options, s, net)
+
+
+def parse_rules(text: str, start: int = 0):
+    """
+    Splits rules text into a list of Rule records and comment strings, in
+    order; rule positions count from `start`.
+    """
+    items = []
+    pos = start
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped:
+            continue
+        rule = parse_rule_line(stripped, pos)
+        if rule is None:
+            items.append(stripped)
+        else:
+            items.append(rule)
+            pos += 1
+    return items
+
+
+def rule_key(r):
+    return (r.kind, r.net if r.net is not None else r.value, r.target, r.options)
+
+
+def _parent_suffixes(domain):
+    # a.b.com -> a.b.com, b.com, com
+    yield domain
+    i = domain.find(".")
+    while i != -1:
+        domain = domain[i + 1:]
+        yield domain
+        i = domain.find(".")
+
+
+class CoverIndex:
+    """
+    Rules of one target, indexed so that "is there a rule matching a
+    superset of what `r` matches?" is answered without a pairwise scan.
+    """
+
+    def __init__(self):
+        self.exact = {}
+        self.domains = {}
+        self.suffixes = {}
+        self.keywords = {}
+        self.nets = {}
+        self.match = None
+
+    def add(self, r):
+        self.exact.setdefault(rule_key(r), r)
+        if r.kind == "MATCH":
+            self.match = self.match or r
+        elif r.kind == "DOMAIN":
+            self.domains.setdefault(r.value, r)
+        elif r.kind == "DOMAIN-SUFFIX":
+            self.suffixes.setdefault(r.value, r)
+        elif r.kind == "DOMAIN-KEYWORD":
+            self.keywords.setdefault(r.value, r)
+        elif r.net is not None:
+            self.nets.setdefault(r.net, []).append(r)
+
+    def find(self, r, exclude=None):
+        """A rule (other than `exclude`) matching everything `r` matches, or None."""
+        if self.match is not None and self.match is not exclude:
+            return self.match
+        same = self.exact.get(rule_key(r))
+        if same is not None and same is not exclude:
+            return same
+        if r.target is None:
+            return None
+
+        if r.kind in ("DOMAIN", "DOMAIN-SUFFIX"):
+            for suffix in _parent_suffixes(r.value):
+                cand = self.suffixes.get(suffix)
+                if cand is not None and cand is not exclude:
+                    return cand
+            return self._keyword_in(r.value, exclude)
+        if r.kind == "DOMAIN-KEYWORD":
+            return self._keyword_in(r.value, exclude)
+        if r.net is not None and self.nets:
+            no_resolve = "no-resolve" in r.options
+            for prefix in range(r.net.prefixlen, -1, -1):
+                for cand in self.nets.get(r.net.supernet(new_prefix=prefix), ()):
+                    if cand is exclude:
+                        continue
+                    # 没有 no-resolve 的规则还会匹配解析后的域名，不能被带 no-resolve 的覆盖
+                    if no_resolve or "no-resolve" not in cand.options:
+                        return cand
+        return None
+
+    def _keyword_in(self, value, exclude):
+        for keyword, cand in self.keywords.items():
+            if keyword in value and cand is not exclude:
+                return cand
+        return None
+
+
+def iter_blocks(items):
+    """
+    Yields lists of Rule records that form contiguous same-target blocks
+    (comments do not break a block, rules without a known target do).
+    """
+    block = []
+    for item in items:
+        if isinstance(item, str):
+            continue
+        if block and (item.target is None or item.target != block[-1].target):
+            yield block
+            block = []
+        if item.target is not None:
+            block.append(item)
+    if block:
+        yield block
+
+
+def _merge_cidrs(block, dropped):
+    """Collapses overlapping / adjacent CIDRs of one block. Returns {pos: [new rules]}."""
+    groups = {}
+    for r in block:
+        if r.net is not None:
+            groups.setdefault((r.kind, r.net.version, r.options), []).append(r)
+
+    replacements = {}
+    for (kind, _, options), members in groups.items():
+        if len(members) < 2:
+            continue
+        collapsed = list(ipaddress.collapse_addresses(m.net for m in members))
+        if len(collapsed) == len(members):
+            continue
+        first = members[0]
+        tail = "".join(f",{o}" for o in options)
+        merged = [
+            Rule(first.pos, kind, str(net), first.target, options, f"- {kind},{net},{first.target}{tail}", net)
+            for net in collapsed
+        ]
+        summary = ", ".join(str(n) for n in collapsed)
+        for m in members:
+            dropped.append({"rule": m.text, "reason": "merged", "by": summary})
+        replacements[first.pos] = merged
+        for m in members[1:]:
+            replacements[m.pos] = []
+    return replacements
+
+
+@lru_cache(maxsize=8)
+def compile_rules(text: str) -> CompiledRules:
+    """
+    Returns CompiledRules(items, dropped): `items` keeps comments and the
+    surviving rules in order, `dropped` lists {"rule", "reason", "by"} dicts
+    with reason "duplicate", "shadowed" or "merged".
+    """
+    items = parse_rules(text)
+    dropped = []
+    removed = set()
+
+    # 1) 被更早的同目标规则覆盖
+    indexes = {}
+    seen_opaque = set()
+    for item in items:
+        if isinstance(item, str):
+            continue
+        if item.target is None:
+            if item.text in seen_opaque:
+                dropped.append({"rule": item.text, "reason": "duplicate", "by": item.text})
+                removed.add(item.pos)
+            seen_opaque.add(item.text)
+            continue
+        idx = indexes.setdefault(item.target, CoverIndex())
+        cover = idx.find(item)
+        if cover is not None:
+            reason = "duplicate" if rule_key(cover) == rule_key(item) else "shadowed"
+            dropped.append({"rule": item.text, "reason": reason, "by": cover.text})
+            removed.add(item.pos)
+        else:
+            idx.add(item)
+
+    # 2) 同一个同目标规则块内，被其它（更靠后的）规则覆盖；3) 合并 CIDR
+    live = [i for i in items if isinstance(i, str) or i.pos not in removed]
+    replacements = {}
+    for block in iter_blocks(live):
+        if len(block) < 2:
+            continue
+        idx = CoverIndex()
+        for r in block:
+            idx.add(r)
+        for r in block:
+            cover = idx.find(r, exclude=r)
+            if cover is not None:
+                dropped.append({"rule": r.text, "reason": "shadowed", "by": cover.text})
+                removed.add(r.pos)
+        replacements.update(_merge_cidrs([r for r in block if r.pos not in removed], dropped))
+
+    out = []
+    for item in live:
+        if isinstance(item, str):
+            out.append(item)
+        elif item.pos in replacements:
+            out.extend(replacements[item.pos])
+        elif item.pos not in removed:
+            out.append(item)
+    return CompiledRules(out, dropped)
+
+
+def render_rules(items) -> str:
+    """Same layout as normalize_rules_text: two-space indent, trailing newline."""
+    lines = [f"  {item if isinstance(item, str) else item.text}" for item in items]
+    return "\n".join(lines) + "\n" if lines else ""
+
+
+def summarize_dropped(dropped):
+    counts = {"duplicate": 0, "shadowed": 0, "merged": 0}
+    for d in dropped:
+        counts[d["reason"]] += 1
+    return counts
+
+
+# ---------- rule-providers ----------
+
+def _provider_payload(kind, r):
+    if kind == "domain":
+        return r.value if r.kind == "DOMAIN" else f"+.{r.value}"
+    return str(r.net)
+
+
+def build_rule_providers(items, min_size=PROVIDER_MIN_SIZE):
+    """
+    Moves large same-target groups of DOMAIN / DOMAIN-SUFFIX rules and of
+    IP-CIDR rules into providers. Returns (providers, items) where
+    providers maps name -> {"behavior", "payload", "target", "no_resolve"}
+    and items has a RULE-SET line in place of each provider's rules.
+    Order inside a same-target block does not matter, so each block is
+    rewritten in place as: domain provider, remaining rules, ipcidr providers.
+    """
+    providers = {}
+    rewritten = {}
+    skip = set()
+    for n, block in enumerate(iter_blocks(items)):
+        buckets = {}
+        for r in block:
+            if r.kind in ("DOMAIN", "DOMAIN-SUFFIX") and not r.options:
+                buckets.setdefault(("domain", False), []).append(r)
+            elif r.net is not None and set(r.options) <= {"no-resolve"}:
+                buckets.setdefault(("ipcidr", "no-resolve" in r.options), []).append(r)
+
+        head, tail = [], []
+        for (behavior, no_resolve), members in buckets.items():
+            if len(members) < min_size:
+                continue
+            payload = [_provider_payload(behavior, r) for r in members]
+            digest = hashlib.sha1("\n".join(payload).encode("utf-8")).hexdigest()[:8]
+            name = f"rules-{n:03d}-{behavior}{'-nr' if no_resolve else ''}-{digest}"
+            providers[name] = {
+                "behavior": behavior,
+                "payload": payload,
+                "target": block[0].target,
+                "no_resolve": no_resolve,
+            }
+            text = f"- RULE-SET,{name},{block[0].target}{',no-resolve' if no_resolve else ''}"
+            rule = Rule(members[0].pos, "RULE-SET", name, block[0].target, (), text, None)
+            (head if behavior == "domain" else tail).append(rule)
+            skip.update(r.pos for r in members)
+
+        if head or tail:
+            rewritten[block[0].pos] = (head, tail, {r.pos for r in block})
+
+    out = []
+    pending_tail = {}
+    for item in items:
+        if isinstance(item, str):
+            out.append(item)
+            continue
+        if item.pos in rewritten:
+            head, tail, members = rewritten.pop(item.pos)
+            out.extend(head)
+            pending_tail[max(members)] = tail
+        if item.pos not in skip:
+            out.append(item)
+        if item.pos in pending_tail:
+            out.extend(pending_tail.pop(item.pos))
+    return providers, out
+
+
+def render_provider_file(provider) -> str:
+    lines = ["payload:\n"]
+    lines.extend(f"  - '{value}'\n" for value in provider["payload"])
+    return "".join(lines)
+
+
+def render_rule_providers(providers, url_prefix: str) -> str:
+    """`rule-providers:` block for the config; files live at {url_prefix}/{name}.yaml."""
+    if not providers:
+        return ""
+    url_prefix = url_prefix.rstrip("/")
+    out = ["rule-providers:\n"]
+    for name, p in providers.items():
+        out.append(
+            f"  {name}:\n"
+            "    type: http\n"
+            f"    behavior: {p['behavior']}\n"
+            "    format: yaml\n"
+            f"    url: {url_prefix}/{name}.yaml\n"
+            f"    path: ./ruleset/{name}.yaml\n"
+            f"    interval: {PROVIDER_INTERVAL}\n"
+        )
+    return "".join(out)
+
+
+def split_rule_providers(rules_text: str, min_size: int = PROVIDER_MIN_SIZE):
+    """Normalized rules text -> (providers, rules text with RULE-SET lines)."""
+    providers, items = build_rule_providers(parse_rules(rules_text), min_size)
+    return providers, render_rules(items)
+
+
+def write_rule_provider_files(providers, out_dir: str, compress=()):
+    """
+    Writes {name}.yaml for each provider, plus precompressed siblings for the
+    `compress` formats (see clashsub.publish). Names contain a content hash,
+    so an existing file is already up to date and is left alone.
+    Returns the number of files written.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = 0
+    for name, provider in providers.items():
+        path = os.path.join(out_dir, f"{name}.yaml")
+        if os.path.exists(path) and all(os.path.exists(f"{path}.{fmt}") for fmt in compress):
+            continue
+        publish(path, render_provider_file(provider).encode("utf-8"), compress)
+        written += 1
+    return written
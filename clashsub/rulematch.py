@@ -0,0 +1,202 @@
+"""
+In-process rule matcher: "which rule / policy group does host X hit?".
+
+The merged rule list is compiled once into per-type indexes, each of which
+answers "earliest rule of this type matching X":
+- DOMAIN: a dict (exact host)
+- DOMAIN-SUFFIX: the reversed-label trie from ruleanalysis
+- DOMAIN-KEYWORD: an Aho-Corasick automaton (one pass over the host)
+- IP-CIDR / IP-CIDR6: the CIDRs flattened into sorted disjoint ranges, each
+  mapped to the earliest rule covering it (one bisect per lookup)
+The overall answer is the earliest of those and MATCH.
+
+Rules that need information a host query does not have (GEOIP, logical
+rules, ports, ...) are not evaluated; the earliest such rule before the hit
+is reported as `uncertain`. PROCESS-* rules never match a bare host.
+"""
+import bisect
+import heapq
+import ipaddress
+from collections import namedtuple
+from functools import lru_cache
+
+from clashsub.ruleanalysis import DomainTrie
+from clashsub.rulecompiler import parse_rules
+
+# rule: 命中的 Rule（None 表示没有任何规则命中）；uncertain: 命中之前无法判断的第一条规则
+MatchResult = namedtuple("MatchResult", ["host", "rule", "target", "uncertain"])
+
+# 主机名查询里没有进程信息，这些规则一定不会命中
+NEVER_MATCH_TYPES = ("PROCESS-NAME", "PROCESS-PATH")
+
+
+class KeywordAutomaton:
+    """Aho-Corasick over DOMAIN-KEYWORD values; `first(text)` is the earliest rule found."""
+
+    def __init__(self, rules=()):
+        self.goto = [{}]
+        self.fail = [0]
+        # 每个状态上能命中的最早规则（已沿 fail 链合并）
+        self.best = [None]
+        for r in rules:
+            self._insert(r)
+        self._build()
+
+    def _insert(self, r):
+        state = 0
+        for ch in r.value:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.best.append(None)
+            state = nxt
+        if self.best[state] is None or r.pos < self.best[state].pos:
+            self.best[state] = r
+
+    def _build(self):
+        queue = list(self.goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self.goto[state].items():
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                inherited = self.best[self.fail[nxt]]
+                if inherited is not None and (self.best[nxt] is None or inherited.pos < self.best[nxt].pos):
+                    self.best[nxt] = inherited
+                queue.append(nxt)
+
+    def first(self, text):
+        best = None
+        state = 0
+        goto, fail, found = self.goto, self.fail, self.best
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            hit = found[state]
+            if hit is not None and (best is None or hit.pos < best.pos):
+                best = hit
+        return best
+
+
+class RangeTable:
+    """CIDR rules of one IP version flattened into sorted disjoint ranges."""
+
+    def __init__(self, rules=()):
+        spans = sorted((int(r.net.network_address), int(r.net.broadcast_address), r) for r in rules)
+        bounds = sorted({s for s, _, _ in spans} | {e + 1 for _, e, _ in spans})
+        self.starts = []
+        self.rules = []
+        active = []
+        i = 0
+        for b in bounds:
+            while i < len(spans) and spans[i][0] <= b:
+                heapq.heappush(active, (spans[i][2].pos, spans[i][1], spans[i][2]))
+                i += 1
+            # 已经结束的区间懒删除
+            while active and active[0][1] < b:
+                heapq.heappop(active)
+            top = active[0][2] if active else None
+            if self.rules and self.rules[-1] is top:
+                continue
+            self.starts.append(b)
+            self.rules.append(top)
+
+    def lookup(self, ip_int):
+        i = bisect.bisect_right(self.starts, ip_int) - 1
+        return self.rules[i] if i >= 0 else None
+
+
+class RuleMatcher:
+    def __init__(self, rules_text: str):
+        rules = [r for r in parse_rules(rules_text) if not isinstance(r, str)]
+        self.domains = {}
+        self.suffixes = DomainTrie()
+        keywords = []
+        cidrs = {4: [], 6: []}
+        self.match = None
+        # 无法判断的规则，按顺序
+        self.opaque = []
+        for r in rules:
+            if r.target is None:
+                self.opaque.append(r)
+            elif r.kind == "DOMAIN":
+                self.domains.setdefault(r.value, r)
+            elif r.kind == "DOMAIN-SUFFIX":
+                self.suffixes.add(r)
+            elif r.kind == "DOMAIN-KEYWORD":
+                keywords.append(r)
+            elif r.net is not None:
+                cidrs[r.net.version].append(r)
+            elif r.kind == "MATCH":
+                self.match = self.match or r
+            elif r.kind not in NEVER_MATCH_TYPES:
+                self.opaque.append(r)
+        self.keywords = KeywordAutomaton(keywords)
+        # 域名查询只用没有 no-resolve 的 IP 规则（需要解析出的 IP），IP 查询用全部
+        self.ranges = {v: RangeTable(rs) for v, rs in cidrs.items()}
+        self.resolve_ranges = {v: RangeTable(r for r in rs if "no-resolve" not in r.options) for v, rs in cidrs.items()}
+        self.opaque_pos = [r.pos for r in self.opaque]
+        self.rule_count = len(rules)
+
+    def _opaque_before(self, pos, is_ip, has_ip):
+        end = bisect.bisect_left(self.opaque_pos, pos) if pos is not None else len(self.opaque)
+        for r in self.opaque[:end]:
+            # 域名查询、没给 IP 时，带 no-resolve 的 GEOIP 一定不命中
+            if r.kind == "GEOIP" and not is_ip and not has_ip and "no-resolve" in r.options:
+                continue
+            return r
+        return None
+
+    def match_host(self, host: str, ip: str = None) -> MatchResult:
+        """
+        First rule matching `host` (a domain or an IP literal). For a domain,
+        `ip` is the address it resolves to, used by IP rules without
+        no-resolve; without it those rules are skipped (no DNS lookups here).
+        """
+        query = host.strip().lower().rstrip(".")
+        cands = [self.match]
+        addr = _parse_ip(query)
+        if addr is not None:
+            cands.append(self.ranges[addr.version].lookup(int(addr)))
+        else:
+            cands.append(self.domains.get(query))
+            cands.append(self.suffixes.first_suffix_cover(query))
+            cands.append(self.keywords.first(query))
+            resolved = _parse_ip(ip) if ip else None
+            if resolved is not None:
+                cands.append(self.resolve_ranges[resolved.version].lookup(int(resolved)))
+        cands = [c for c in cands if c is not None]
+        hit = min(cands, key=lambda c: c.pos) if cands else None
+        uncertain = self._opaque_before(hit.pos if hit else None, addr is not None, bool(ip))
+        return MatchResult(host, hit, hit.target if hit else None, uncertain)
+
+
+def _parse_ip(s):
+    try:
+        return ipaddress.ip_address(s.strip("[]"))
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8)
+def build_matcher(rules_text: str) -> RuleMatcher:
+    """Matcher over an already-merged rule text (cached per text)."""
+    return RuleMatcher(rules_text)
+
+
+def match_host(rules_text: str, host: str, ip: str = None) -> MatchResult:
+    return build_matcher(rules_text).match_host(host, ip)
+
+
+def match_hosts(rules_text: str, hosts):
+    """Batch form of match_host; blank entries are skipped."""
+    matcher = build_matcher(rules_text)
+    return [matcher.match_host(h) for h in hosts if h.strip()]
@@ -0,0 +1,91 @@
+"""
+Precompiled rule blocks.
+
+The default rules file is read and normalized once per process and kept as a
+ready-to-emit block with its line count; it is reloaded only when the file's
+mtime/size change AND its content hash differs. Per request, only the manual
+rules still need normalizing. With optimize=True the block is additionally
+run through rulecompiler (redundant rules dropped, CIDRs merged).
+"""
+import hashlib
+import os
+import threading
+from collections import namedtuple
+from functools import lru_cache
+
+from clashsub.core import MANDATORY_RULES, normalize_rules_text
+from clashsub.metrics import span
+from clashsub.rulecompiler import compile_rules, render_rules
+
+# dropped: rulecompiler 的丢弃明细（仅 optimize=True 时非空）
+RuleBlock = namedtuple("RuleBlock", ["text", "line_count", "dropped"], defaults=((),))
+
+EMPTY_BLOCK = RuleBlock("", 0)
+
+_file_cache = {}
+_file_lock = threading.Lock()
+
+
+@lru_cache(maxsize=16)
+def compile_rules_text(text: str, optimize: bool = False) -> RuleBlock:
+    if optimize:
+        compiled = compile_rules(text)
+        normalized = render_rules(compiled.items)
+        return RuleBlock(normalized, normalized.count("\n"), tuple(compiled.dropped))
+    normalized = normalize_rules_text(text)
+    return RuleBlock(normalized, normalized.count("\n"))
+
+
+MANDATORY_BLOCK = compile_rules_text(MANDATORY_RULES)
+
+
+def load_default_rules(path: str, optimize: bool = False) -> RuleBlock:
+    """Compiled block for a rules file; EMPTY_BLOCK if it cannot be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return EMPTY_BLOCK
+    stamp = (st.st_mtime_ns, st.st_size)
+
+    key = (path, optimize)
+    cached = _file_cache.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[2]
+
+    with _file_lock:
+        cached = _file_cache.get(key)
+        if cached is not None and cached[0] == stamp:
+            return cached[2]
+        try:
+            with open(path, "rb") as f:
+                raw = f.read()
+            text = raw.decode("utf-8")
+        except (OSError, UnicodeDecodeError):
+            return EMPTY_BLOCK
+        digest = hashlib.sha256(raw).hexdigest()
+        if cached is not None and cached[1] == digest:
+            # 只是 touch 了一下，内容没变
+            block = cached[2]
+        else:
+            block = compile_rules_text(text, optimize)
+        _file_cache[key] = (stamp, digest, block)
+        return block
+
+
+def assemble_rules(default_block: RuleBlock, manual_rules: str, use_default: bool = True) -> RuleBlock:
+    """
+    Same result as core.merge_rules, but reuses the compiled blocks:
+    MANDATORY_RULES, then the default rules (unless `use_default` is False),
+    then the manual rules.
+    """
+    with span("rules"):
+        manual_block = compile_rules_text(manual_rules.strip()) if manual_rules and manual_rules.strip() else EMPTY_BLOCK
+    blocks = [MANDATORY_BLOCK]
+    if use_default:
+        blocks.append(default_block)
+    blocks.append(manual_block)
+    return RuleBlock(
+        "".join(b.text for b in blocks),
+        sum(b.line_count for b in blocks),
+        default_block.dropped if use_default else (),
+    )
@@ -0,0 +1,213 @@
+"""
+Headless conversion endpoint for Clash clients, independent of Streamlit:
+
+    GET /sub?url=<订阅链接>&url=<订阅链接2>&rules=default
+
+`url` may be repeated or joined with "|"; earlier URLs have higher priority.
+`rules` is "default" (MANDATORY_RULES + rules.txt), "optimized" (the same with
+redundant rules dropped, see rulecompiler) or "none" (MANDATORY_RULES only).
+`groups` is "inline" (default, every node listed in every group), "provider"
+(nodes in one inline proxy-provider, groups reference it with `use:`) or
+"region" (per-region url-test groups, the other groups list those).
+`format` is "clash" (default, Clash Meta YAML), "sing-box" (JSON config) or
+"uri" (base64 URI list); see clashsub.emitters.
+`probe` is "tcp" or "tls" to connect to every node first, drop the dead ones
+and sort the rest by latency (see clashsub.probe). The hosts come from a
+subscription the caller picks and the result shows which ones answered, so
+it would work as a port scanner: only allowed with CLASHSUB_ALLOW_PROBE=1,
+otherwise 403.
+
+`/metrics` serves Prometheus-style counters and per-stage timing histograms
+(see clashsub.metrics); with several worker processes each reports its own.
+
+Plain WSGI, so any multi-worker server can host it:
+
+    gunicorn -w 4 -b 0.0.0.0:8502 clashsub.server:app
+
+or, without extra dependencies:
+
+    python -m clashsub.server --port 8502
+"""
+import argparse
+import os
+import threading
+import urllib.parse
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, make_server
+
+from clashsub.cache import SubscriptionCache
+from clashsub.core import (
+    DEDUPE_MODES,
+    DEFAULT_RULES_FILE,
+    GROUP_MODES,
+    NODE_DEDUPE,
+    build_nodes,
+    iter_nodes,
+)
+from clashsub.emitters import EMITTERS
+from clashsub.fetch import FETCH_DEADLINE, FETCH_TIMEOUT, fetch_subscriptions
+from clashsub.ingest import iter_source_lines, max_source_bytes
+from clashsub.memo import ParseMemo
+from clashsub.metrics import CONVERSIONS, REGISTRY, render_metrics
+from clashsub.probe import PROBE_MODES, ProbeCache, probe_proxies
+from clashsub.rules import EMPTY_BLOCK, assemble_rules, load_default_rules
+
+RULES_MODES = ("default", "optimized", "none")
+# /sub?probe= 会连接调用方给的订阅里的任意 host:port，默认不开放
+ALLOW_PROBE = os.getenv("CLASHSUB_ALLOW_PROBE", "0") == "1"
+
+_cache = None
+_memo = None
+_probe_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SubscriptionCache.from_env()
+    return _cache
+
+
+def get_memo():
+    global _memo
+    if _memo is None:
+        with _cache_lock:
+            if _memo is None:
+                _memo = ParseMemo.from_env()
+    return _memo
+
+
+def get_probe_cache():
+    global _probe_cache
+    if _probe_cache is None:
+        with _cache_lock:
+            if _probe_cache is None:
+                _probe_cache = ProbeCache.from_env()
+    return _probe_cache
+
+
+@REGISTRY.collect
+def _cache_gauges():
+    sizes = [(name, len(obj)) for name, obj in (("subscription", _cache), ("memo", _memo), ("probe", _probe_cache)) if obj is not None]
+    return [("clashsub_cache_entries", "Entries held by the in-process caches", [({"cache": n}, size) for n, size in sizes])]
+
+
+def _respond(start_response, status, body, content_type="text/plain; charset=utf-8", extra_headers=()):
+    data = body.encode("utf-8")
+    headers = [
+        ("Content-Type", content_type),
+        ("Content-Length", str(len(data))),
+        ("Cache-Control", "no-store"),
+    ]
+    headers.extend(extra_headers)
+    start_response(status, headers)
+    return [data]
+
+
+def handle_sub(environ, start_response):
+    params = urllib.parse.parse_qs(environ.get("QUERY_STRING", ""))
+    urls = []
+    for value in params.get("url", []):
+        urls.extend(u.strip() for u in value.split("|") if u.strip())
+    if not urls:
+        return _respond(start_response, "400 Bad Request", "缺少参数 url\n")
+
+    rules_mode = params.get("rules", ["default"])[0]
+    if rules_mode not in RULES_MODES:
+        return _respond(start_response, "400 Bad Request", f"rules 只支持 {' / '.join(RULES_MODES)}\n")
+    group_mode = params.get("groups", ["inline"])[0]
+    if group_mode not in GROUP_MODES:
+        return _respond(start_response, "400 Bad Request", f"groups 只支持 {' / '.join(GROUP_MODES)}\n")
+    dedupe = params.get("dedupe", [NODE_DEDUPE])[0]
+    if dedupe not in DEDUPE_MODES:
+        return _respond(start_response, "400 Bad Request", f"dedupe 只支持 {' / '.join(DEDUPE_MODES)}\n")
+    fmt = params.get("format", ["clash"])[0]
+    if fmt not in EMITTERS:
+        return _respond(start_response, "400 Bad Request", f"format 只支持 {' / '.join(EMITTERS)}\n")
+    probe = params.get("probe", [None])[0]
+    if probe is not None and probe not in PROBE_MODES:
+        return _respond(start_response, "400 Bad Request", f"probe 只支持 {' / '.join(PROBE_MODES)}\n")
+    if probe is not None and not ALLOW_PROBE:
+        return _respond(start_response, "403 Forbidden", "服务端未开启连通性测试（CLASHSUB_ALLOW_PROBE=1）\n")
+
+    fetched = fetch_subscriptions(
+        urls,
+        timeout=float(os.getenv("CLASHSUB_FETCH_TIMEOUT", FETCH_TIMEOUT)),
+        deadline=float(os.getenv("CLASHSUB_FETCH_DEADLINE", FETCH_DEADLINE)),
+        cache=get_cache(),
+        decode=iter_source_lines,
+        max_bytes=max_source_bytes(),
+    )
+    sources = []
+    contents = []
+    errors = []
+    for url, text, err, _ in fetched:
+        if err is not None:
+            errors.append(f"{url}: {err}")
+        elif text.strip():
+            sources.append(url)
+            contents.append(text)
+
+    if rules_mode != "none":
+        rules_path = os.getenv("CLASHSUB_RULES_FILE", DEFAULT_RULES_FILE)
+        rules_content = assemble_rules(load_default_rules(rules_path, rules_mode == "optimized"), "").text
+    else:
+        rules_content = assemble_rules(EMPTY_BLOCK, "", use_default=False).text
+
+    memo = get_memo()
+    proxies, _ = build_nodes(iter_nodes(contents), dedupe=dedupe, memo=memo)
+    if not proxies:
+        CONVERSIONS.inc(entry="sub", result="empty")
+        detail = "\n".join(errors)
+        return _respond(start_response, "502 Bad Gateway", f"未识别到有效节点\n{detail}\n")
+    if probe is not None:
+        proxies, _, _ = probe_proxies(proxies, probe, cache=get_probe_cache())
+
+    # 分块直接写给客户端，不在内存里拼完整的配置
+    emitter = EMITTERS[fmt]
+    start_response(
+        "200 OK",
+        [
+            ("Content-Type", emitter.content_type),
+            ("Cache-Control", "no-store"),
+            ("Content-Disposition", f'inline; filename="clash_config{emitter.suffix}"'),
+        ],
+    )
+    CONVERSIONS.inc(entry="sub", result="ok")
+    chunks = emitter.iter_chunks(proxies, rules_content, source_url=" | ".join(sources), group_mode=group_mode, memo=memo)
+    return (chunk.encode("utf-8") for chunk in chunks)
+
+
+def app(environ, start_response):
+    path = environ.get("PATH_INFO", "/")
+    if environ.get("REQUEST_METHOD", "GET") not in ("GET", "HEAD"):
+        return _respond(start_response, "405 Method Not Allowed", "仅支持 GET\n", extra_headers=[("Allow", "GET, HEAD")])
+    if path == "/sub":
+        return handle_sub(environ, start_response)
+    if path == "/metrics":
+        return _respond(start_response, "200 OK", render_metrics(), "text/plain; version=0.0.4; charset=utf-8")
+    if path == "/healthz":
+        return _respond(start_response, "200 OK", "ok\n")
+    return _respond(start_response, "404 Not Found", "not found\n")
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="clashsub 无界面订阅转换服务")
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=8502)
+    args = ap.parse_args(argv)
+
+    with make_server(args.host, args.port, app, server_class=ThreadingWSGIServer) as httpd:
+        print(f"Serving on http://{args.host}:{args.port}/sub")
+        httpd.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
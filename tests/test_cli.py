@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_is_lazy():
+    # 启动时只导入 core / ingest，规则、输出、发布相关的模块在子命令里才导入
+    code = (
+        "import sys, clashsub.cli; "
+        "print(' '.join(m for m in ('clashsub.emitters', 'clashsub.rulematch', 'clashsub.ruleanalysis', "
+        "'clashsub.rulecompiler', 'clashsub.publish', 'requests') if m in sys.modules))"
+    )
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True, stdout=subprocess.PIPE, text=True).stdout
+    assert out.strip() == ""
+
@@ -0,0 +1,69 @@
+import base64
+import json
+import os
+import subprocess
+import sys
+
+from clashsub.core import parse_node_line
+from clashsub.emitters import missing_fields, proxy_uri, render
+from clashsub.formats import iter_clash_nodes
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+UUID = "00000000-0000-0000-0000-000000000001"
+RULES = "  - MATCH,🚀 节点选择\n"
+
+GOOD = [
+    f"vless://{UUID}@v.example.com:443?type=tcp&security=tls&sni=v.example.com#vless",
+    "hysteria2://secret@h.example.com:8443?sni=h.example.com#hy2",
+]
+# 链接里没有用户信息：解析出来的 uuid / password 是 None
+NO_CREDENTIALS = [
+    "vless://v2.example.com:443?type=tcp&security=tls#vless-nouser",
+    "hysteria2://h2.example.com:8443?sni=h2.example.com#hy2-nouser",
+]
+
+
+def uri_lines(text):
+    return base64.b64decode(text).decode("utf-8").splitlines()
+
+
+def test_uri_skips_records_without_credentials():
+    proxies = [parse_node_line(line) for line in GOOD + NO_CREDENTIALS]
+    assert [missing_fields(p) for p in proxies] == [[], [], ["uuid"], ["password"]]
+    assert [proxy_uri(p) is None for p in proxies] == [False, False, True, True]
+
+    lines = uri_lines(render("uri", proxies, RULES))
+    assert len(lines) == 2
+    assert not any("None" in line for line in lines)
+
+
+def test_singbox_skips_records_without_credentials():
+    proxies = [parse_node_line(line) for line in GOOD + NO_CREDENTIALS]
+    config = json.loads(render("sing-box", proxies, RULES))
+    tags = [o["tag"] for o in config["outbounds"] if o["type"] in ("vless", "hysteria2")]
+    assert tags == ["vless", "hy2"]
+
+
+def test_clash_null_password_is_skipped():
+    lines = ["proxies:", "  - {name: a, type: hysteria2, server: h.example.com, port: 443, password: }"]
+    (record,) = iter_clash_nodes(lines)
+    # 以前会变成密码 "None"
+    assert isinstance(record, str)
+
+
+def test_convert_formats(tmp_path):
+    src = tmp_path / "nodes.txt"
+    src.write_text("\n".join(GOOD + NO_CREDENTIALS) + "\n", encoding="utf-8")
+    out = tmp_path / "out.yaml"
+    proc = subprocess.run(
+        [sys.executable, "-m", "clashsub", "convert", "--in", str(src), "-o", str(out), "--format", "clash,sing-box,uri"],
+        cwd=ROOT,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+    assert out.exists()
+    assert len(json.loads((tmp_path / "out.json").read_text(encoding="utf-8"))["outbounds"]) > 0
+    assert len(uri_lines((tmp_path / "out.txt").read_text(encoding="utf-8"))) == 2
+    assert "uri：2 个节点缺少凭据" in proc.stderr
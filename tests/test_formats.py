@@ -0,0 +1,134 @@
+from clashsub.formats import iter_clash_proxies, sniff_format
+from clashsub.ingest import iter_source_nodes
+from clashsub.proxies import Hysteria2Proxy, ShadowsocksProxy, TuicProxy, VlessProxy, VmessProxy
+
+UUID = "00000000-0000-0000-0000-000000000001"
+
+# 一份按 Clash / mihomo 常见写法写的完整配置：注释、引号、流式映射、块标量都有
+CONFIG = f"""\
+# 机场导出的配置
+mixed-port: 7890
+allow-lan: false
+mode: rule
+dns:
+  enable: true
+  nameserver:
+    - 223.5.5.5
+proxies:
+  - name: "香港 01"
+    type: vmess
+    server: hk.example.com
+    port: 443
+    uuid: {UUID}
+    alterId: 0
+    cipher: auto
+    tls: true
+    network: ws
+    ws-opts:
+      path: /ws  # 路径
+      headers:
+        Host: cdn.example.com
+
+  - {{name: 日本 reality, type: vless, server: "2001:db8::1", port: 443, uuid: {UUID}, network: tcp,
+      flow: xtls-rprx-vision, servername: www.example.com,
+      reality-opts: {{public-key: pk, short-id: "0123"}}}}
+  - name: 'hy2 folded'
+    type: hysteria2
+    server: hy.example.com
+    port: 8443
+    password: >-
+      abc
+      def
+    sni: hy.example.com
+  - name: tuic literal
+    type: tuic
+    server: tuic.example.com
+    port: 443
+    uuid: {UUID}
+    password: |
+      #not-a-comment
+
+      p@ss
+    alpn: [h3]
+  - name: ss keep
+    type: ss
+    server: 1.2.3.4
+    port: 8388
+    cipher: aes-256-gcm
+    password: |2-
+        indented
+proxy-groups:
+  - name: 节点选择
+    type: select
+    proxies: [香港 01]
+rules:
+  - MATCH,节点选择
+"""
+
+
+def records(text):
+    return list(iter_source_nodes([text.encode()]))
+
+
+def test_sniff_clash_config():
+    assert sniff_format(CONFIG) == "clash"
+
+
+def test_real_config_records():
+    vmess, vless, hy2, tuic, ss = records(CONFIG)
+
+    assert isinstance(vmess, VmessProxy)
+    assert (vmess.name, vmess.server, vmess.port, vmess.tls) == ("香港 01", "hk.example.com", 443, True)
+    assert (vmess.ws.path, vmess.ws.host) == ("/ws", "cdn.example.com")
+
+    assert isinstance(vless, VlessProxy)
+    assert (vless.server, vless.flow, vless.servername) == ("2001:db8::1", "xtls-rprx-vision", "www.example.com")
+    assert (vless.reality.public_key, vless.reality.short_id) == ("pk", "0123")
+
+    assert isinstance(hy2, Hysteria2Proxy)
+    assert hy2.password == "abc def"
+    assert hy2.sni == "hy.example.com"
+
+    assert isinstance(tuic, TuicProxy)
+    # 字面块标量保留换行，"#" 开头的行和空行都是内容，默认 clip 保留一个结尾换行
+    assert tuic.password == "#not-a-comment\n\np@ss\n"
+    assert tuic.alpn == ("h3",)
+
+    assert isinstance(ss, ShadowsocksProxy)
+    # 缩进指示符 2：比所属映射多缩进两格的部分才是内容，"-" 去掉结尾换行
+    assert ss.password == "  indented"
+
+
+def test_block_scalar_chomping_and_folding():
+    lines = """\
+proxies:
+  - name: a
+    keep: |+
+      k
+
+    folded: >
+      f1
+      f2
+
+      f3
+        more
+      f4
+    items:
+      - |
+        item
+      - plain
+    after: v
+""".splitlines()
+    (d,) = iter_clash_proxies(lines)
+    assert d["keep"] == "k\n\n"
+    assert d["folded"] == "f1 f2\nf3\n  more\nf4\n"
+    assert d["items"] == ["item\n", "plain"]
+    assert d["after"] == "v"
+
+
+def test_block_scalar_header_is_not_a_value():
+    # 以前 "password: >-" 会被读成字面量 ">-"
+    lines = ["proxies:", "  - name: x", "    password: >-", "      secret", "    sni: s"]
+    (d,) = iter_clash_proxies(lines)
+    assert d["password"] == "secret"
+    assert d["sni"] == "s"
@@ -0,0 +1,19 @@
+from clashsub.memo import ParseMemo
+
+
+def test_sources_are_bounded():
+    memo = ParseMemo(max_sources=2)
+    for i in range(10):
+        memo.source_changed(f"https://example.com/{i}", "body")
+    assert len(memo._sources) == 2
+
+
+def test_recently_used_source_is_kept():
+    memo = ParseMemo(max_sources=2)
+    memo.source_changed("a", "1")
+    memo.source_changed("b", "1")
+    assert not memo.source_changed("a", "1")
+    memo.source_changed("c", "1")
+    # b 最久没用，被淘汰；a 还记得上次的内容
+    assert not memo.source_changed("a", "1")
+    assert memo.source_changed("b", "1")
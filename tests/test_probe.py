@@ -0,0 +1,65 @@
+import socket
+import threading
+
+import pytest
+
+from clashsub.core import parse_node_line
+from clashsub.probe import probe_proxies, probe_target
+from clashsub.proxies import ShadowsocksProxy
+
+UUID = "00000000-0000-0000-0000-000000000001"
+
+
+@pytest.fixture
+def plain_port():
+    # 只接受 TCP 连接、从不说 TLS 的监听端口
+    srv = socket.socket()
+    srv.bind(("127.0.0.1", 0))
+    srv.listen(16)
+    stop = threading.Event()
+
+    def accept():
+        while not stop.is_set():
+            try:
+                conn, _ = srv.accept()
+            except OSError:
+                return
+            conn.close()
+
+    threading.Thread(target=accept, daemon=True).start()
+    yield srv.getsockname()[1]
+    stop.set()
+    srv.close()
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_tls_mode_only_handshakes_tls_nodes():
+    plain = parse_node_line(f"vless://{UUID}@a.example.com:443?security=none&type=tcp#plain")
+    tls = parse_node_line(f"vless://{UUID}@a.example.com:443?security=tls&sni=s.example.com#tls")
+    ss = ShadowsocksProxy("ss", "a.example.com", 8388, cipher="aes-128-gcm", password="pw")
+    assert probe_target(plain, "tls")[2] == "tcp"
+    assert probe_target(tls, "tls")[2:] == ("tls", "s.example.com")
+    assert probe_target(ss, "tls")[2] == "tcp"
+
+
+def test_plain_nodes_survive_tls_probe(plain_port):
+    nodes = [
+        parse_node_line(f"vless://{UUID}@127.0.0.1:{plain_port}?security=none&type=tcp#vless-plain"),
+        ShadowsocksProxy("ss-plain", "127.0.0.1", plain_port, cipher="aes-128-gcm", password="pw"),
+        parse_node_line(f"vless://{UUID}@127.0.0.1:{closed_port()}?security=none&type=tcp#dead"),
+    ]
+    ranked, dropped, stats = probe_proxies(nodes, "tls", timeout=2, deadline=5)
+    assert sorted(p.name for p in ranked) == ["ss-plain", "vless-plain"]
+    assert [p.name for p in dropped] == ["dead"]
+
+
+def test_vless_security_none_is_plain():
+    p = parse_node_line(f"vless://{UUID}@a.example.com:443?security=none&type=tcp#plain")
+    assert p.tls is False
+    assert "tls: false" in p.emit()
+    assert parse_node_line(f"vless://{UUID}@a.example.com:443?type=tcp#legacy").tls is True
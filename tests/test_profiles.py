@@ -0,0 +1,110 @@
+import os
+
+import pytest
+
+from clashsub.profiles import ProfileLocked, ProfileStore, make_profile
+
+NODE = "hysteria2://pw@hy.example.com:443?sni=hy.example.com#hy"
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProfileStore(str(tmp_path / "profiles"), str(tmp_path / "static"), compress=())
+
+
+def test_new_profile_has_token_and_no_schedule(store):
+    saved = store.save(make_profile(inputs=[("manual", NODE)]))
+    assert saved["edit_token"]
+    assert saved["interval"] == 0
+    assert store.due() == []
+
+
+def test_overwrite_requires_token(store):
+    owner = store.save(make_profile(inputs=[("manual", NODE)], profile_id="mysub"))
+    hijack = make_profile(inputs=[("manual", "hysteria2://x@evil.example.com:443#evil")], profile_id="mysub")
+    with pytest.raises(ProfileLocked):
+        store.save(hijack)
+    with pytest.raises(ProfileLocked):
+        store.save(hijack, token="wrong")
+    with pytest.raises(ProfileLocked):
+        store.check_edit("mysub", None)
+    assert store.get("mysub")["inputs"] == [["manual", NODE]]
+
+    store.check_edit("mysub", owner["edit_token"])
+    saved = store.save(hijack, token=owner["edit_token"])
+    assert saved["inputs"][0][1].startswith("hysteria2://x@evil")
+    assert saved["edit_token"] == owner["edit_token"]
+
+
+def test_same_inputs_without_token_keep_settings(store):
+    owner = store.save(make_profile(inputs=[("manual", NODE)], interval=3600))
+    again = store.save(make_profile(inputs=[("manual", NODE)], interval=0))
+    assert again["id"] == owner["id"]
+    assert again["interval"] == 3600
+    assert again["edit_token"] == owner["edit_token"]
+    assert again["created_at"] == owner["created_at"]
+
+
+def test_sweep_expires_unread_profiles(store):
+    store.profile_max_age = 100
+    old = store.write_output(store.save(make_profile(inputs=[("manual", NODE)])), "proxies: []\n")
+    fresh = store.write_output(store.save(make_profile(inputs=[("manual", NODE + "2")])), "proxies: []\n")
+    now = old["updated_at"] + 1000
+    # fresh 的配置刚被客户端下载过
+    os.utime(store.output_path(fresh["id"]), (now - 10, old["updated_at"]))
+    result = store.sweep(now=now)
+    assert result["profiles_expired"] == 1
+    assert store.get(old["id"]) is None and not os.path.exists(store.output_path(old["id"]))
+    assert store.get(fresh["id"]) is not None
+
+
+def test_rewrite_keeps_last_read_time(store):
+    profile = store.write_output(store.save(make_profile(inputs=[("manual", NODE)])), "a: 1\n")
+    path = store.output_path(profile["id"])
+    os.utime(path, (1000, 1000))
+    store.write_output(profile, "a: 2\n")
+    assert os.stat(path).st_atime == 1000
+
+
+def test_profile_json_counts_toward_quota(store):
+    store.max_bytes = 1
+    store.save(make_profile(inputs=[("manual", NODE)]))
+    result = store.sweep()
+    assert result["profiles_evicted"] == 1
+    assert store.list() == []
+
+
+def refresh_while(store, profile, action):
+    # 在生成配置的过程中执行 action（模拟用户保存修改 / 清理任务删除订阅）
+    render = store.render
+
+    def racing_render(p, **kwargs):
+        conv = render(p, **kwargs)
+        action()
+        return conv
+
+    store.render = racing_render
+    return store.refresh(profile)
+
+
+def test_refresh_keeps_edit_saved_meanwhile(store):
+    owner = store.save(make_profile(inputs=[("manual", NODE)], profile_id="mysub", interval=3600))
+    edited = make_profile(inputs=[("manual", NODE)], profile_id="mysub", interval=86400, manual_rules="- DOMAIN,a.com,DIRECT")
+    refresh_while(store, owner, lambda: store.save(edited, token=owner["edit_token"]))
+    stored = store.get("mysub")
+    assert stored["interval"] == 86400
+    assert stored["manual_rules"] == "- DOMAIN,a.com,DIRECT"
+
+
+def test_refresh_does_not_resurrect_deleted_profile(store):
+    profile = store.save(make_profile(inputs=[("manual", NODE)]))
+    assert refresh_while(store, profile, lambda: store.delete(profile["id"])) is None
+    assert store.get(profile["id"]) is None
+    assert not os.path.exists(store.output_path(profile["id"]))
+
+
+def test_refresh_records_build_fields(store):
+    profile = store.save(make_profile(inputs=[("manual", NODE)]))
+    refreshed = store.refresh(profile)
+    assert refreshed["built_at"] and refreshed["output_digest"]
+    assert store.get(profile["id"]) == refreshed
@@ -0,0 +1,39 @@
+import os
+
+from clashsub.cli import main
+from clashsub.profiles import ProfileStore, make_profile
+from clashsub.publish import publish
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RULES = os.path.join(ROOT, "rules.txt")
+NODES = (
+    "hysteria2://pw@hy.example.com:443?sni=hy.example.com#🇭🇰 香港 01\n"
+    "vless://00000000-0000-0000-0000-000000000001@v.example.com:443?security=tls&sni=v.example.com#日本 02\n"
+)
+
+
+def test_cli_and_profile_write_the_same_bytes(tmp_path):
+    nodes = tmp_path / "nodes.txt"
+    nodes.write_text(NODES, encoding="utf-8")
+    out = tmp_path / "cli.yaml"
+    assert main(["convert", "--in", str(nodes), "--rules", RULES, "-o", str(out)]) == 0
+
+    store = ProfileStore(str(tmp_path / "profiles"), str(tmp_path / "static"), rules_file=RULES, compress=())
+    profile = store.save(make_profile(inputs=[(str(nodes), NODES)]))
+    conv = store.render(profile)
+    store.write_output(profile, conv.yaml)
+    with open(store.output_path(profile["id"]), "rb") as f:
+        published = f.read()
+    assert not published.startswith(b"\xef\xbb\xbf")
+    assert published == out.read_bytes()
+
+
+def test_publish_skips_unchanged_content(tmp_path):
+    path = str(tmp_path / "out.yaml")
+    first = publish(path, b"a: 1\n", ("gz",))
+    assert first.written and os.path.exists(path + ".gz")
+    again = publish(path, b"a: 1\n", ("gz",), first.digest)
+    assert not again.written and again.digest == first.digest
+    # 关掉预压缩后旧的 .gz 要删掉
+    publish(path, b"a: 1\n", (), first.digest)
+    assert not os.path.exists(path + ".gz")
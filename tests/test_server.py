@@ -0,0 +1,22 @@
+from clashsub import server
+
+
+def call(query):
+    seen = {}
+
+    def start_response(status, headers):
+        seen["status"] = status
+
+    body = b"".join(server.app({"PATH_INFO": "/sub", "QUERY_STRING": query}, start_response))
+    return seen["status"], body.decode("utf-8")
+
+
+def test_probe_is_forbidden_by_default():
+    # 不能让任何人借 /sub?probe= 扫描订阅里写的内网地址
+    status, _ = call("url=http://127.0.0.1:1/sub&probe=tcp")
+    assert status.startswith("403")
+
+
+def test_probe_mode_still_validated():
+    status, _ = call("url=http://127.0.0.1:1/sub&probe=udp")
+    assert status.startswith("400")